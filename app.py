@@ -11,11 +11,23 @@ import traceback
 from pathlib import Path
 from logger import logger
 from typing import Optional, Union, Any
-from memory import MemoryManager
+from memory import get_memory_shards
+from ids import new_id
+from ingest_cache import get_ingest_cache
+from document_loaders import decode_text, pdf_pages_text, temp_file, PYPDF_AVAILABLE
+from ingest import (
+    process_document, process_batch, merge_into_corpus, _OCR_LANGS, PYMUPDF_AVAILABLE,
+)
+from ingest_jobs import get_ingest_queue
+from web_retrieval import get_web_search
 from auth import init_admin_session, is_admin_authenticated, show_admin_login, admin_logout
 from ui_theme import apply_jarvis_theme, render_central_sphere, render_loading_animation
 from multi_lang import get_lang_manager, detect_language, translate_text
 from knowledge_base import get_kb_manager, KBDocument
+from config import CONFIG
+from reranker import get_reranker, gather_candidates, group_by_source
+from prompt_builder import PromptBuilder, ContextItem
+from history import ConversationHistory, llm_summarizer
 
 # Try to use Windows certificate store for Requests (corporate CA support)
 try:
@@ -278,7 +290,6 @@ try:
         _groq_client = None
         GROQ_PY_AVAILABLE = False
     from langchain_google_genai import ChatGoogleGenerativeAI
-    from langchain_community.utilities import SerpAPIWrapper
     from langchain_community.document_loaders import PyPDFLoader, TextLoader
     from langchain_text_splitters import RecursiveCharacterTextSplitter
     from langchain_huggingface import HuggingFaceEmbeddings
@@ -300,7 +311,6 @@ except ImportError as e:
     AgentType = None
     ChatGroq = None
     ChatGoogleGenerativeAI = None
-    SerpAPIWrapper = None
     PyPDFLoader = None
     TextLoader = None
     RecursiveCharacterTextSplitter = None
@@ -339,97 +349,6 @@ except ImportError:
     wave = None
     MICROPHONE_AVAILABLE = False
 
-# === Optional OCR / document parsing tools (best-effort imports) ===
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except Exception:
-    easyocr = None
-    EASYOCR_AVAILABLE = False
-
-try:
-    import pytesseract
-    PYTESSERACT_AVAILABLE = True
-except Exception:
-    pytesseract = None
-    PYTESSERACT_AVAILABLE = False
-
-try:
-    import fitz  # PyMuPDF
-    PYMUPDF_AVAILABLE = True
-except Exception:
-    fitz = None
-    PYMUPDF_AVAILABLE = False
-
-try:
-    import docx
-    PYDOCX_AVAILABLE = True
-except Exception:
-    docx = None
-    PYDOCX_AVAILABLE = False
-
-try:
-    import pptx
-    PYTTHON_PPTX_AVAILABLE = True
-except Exception:
-    pptx = None
-    PYTTHON_PPTX_AVAILABLE = False
-
-# Default OCR languages (comma-separated env var)
-_OCR_LANGS = os.getenv('OCR_LANGS', 'en,hi').split(',')
-
-def _ocr_image_bytes(raw_bytes, langs=None):
-    """Extract text from image bytes using EasyOCR (preferred) then pytesseract fallback.
-    Returns the extracted Unicode text.
-    """
-    # Allow runtime override via Streamlit session state if available
-    try:
-        if 'ocr_langs_text' in st.session_state and st.session_state.get('ocr_langs_text'):
-            langs = [l.strip() for l in st.session_state.get('ocr_langs_text', '').split(',') if l.strip()]
-        else:
-            langs = langs or _OCR_LANGS
-    except Exception:
-        langs = langs or _OCR_LANGS
-    text_parts = []
-    # Try EasyOCR first
-    if EASYOCR_AVAILABLE:
-        try:
-            # initialize reader lazily for performance
-            reader = easyocr.Reader(langs, gpu=False)
-            import io
-            from PIL import Image
-            im = Image.open(io.BytesIO(raw_bytes)).convert('RGB')
-            results = reader.readtext(im)
-            # results: list of (bbox, text, confidence) or (bbox, text)
-            for r in results:
-                # r[1] is the text
-                if isinstance(r, (list, tuple)) and len(r) >= 2:
-                    text_parts.append(r[1])
-            if text_parts:
-                return '\n'.join(text_parts)
-        except Exception:
-            pass
-
-    # Fallback to pytesseract if available
-    if PYTESSERACT_AVAILABLE:
-        try:
-            from PIL import Image
-            import io
-            im = Image.open(io.BytesIO(raw_bytes)).convert('RGB')
-            # pytesseract expects language codes like 'eng'/'hin' — default to eng
-            t_lang = 'eng'
-            if langs:
-                # map first lang heuristically
-                first = langs[0].strip()
-                if first == 'hi':
-                    t_lang = 'hin'
-            return pytesseract.image_to_string(im, lang=t_lang)
-        except Exception:
-            pass
-
-    # Last resort: return empty string
-    return ''
-
 # === Configuration ===
 load_dotenv()
 
@@ -522,9 +441,12 @@ class APIConfig:
 config = APIConfig()
 
 # === Memory Management (A.K.A.S.H.A. Long-Term Memory) ===
-memory_manager = MemoryManager()
-"""Global MemoryManager instance for storing and retrieving conversation memories.
-Used to augment chat prompts with relevant past context (RAG-style).
+memory_shards = get_memory_shards()
+"""Global registry of per-session MemoryManager shards for storing and retrieving
+conversation memories. Used to augment chat prompts with relevant past context
+(RAG-style). Each browser session reads and writes only its own shard; related
+episodic memories are consolidated on a shared background worker. The registry
+is a module singleton, so it survives Streamlit reruns.
 """
 
 # === Knowledge Base Management ===
@@ -533,6 +455,20 @@ kb_manager = get_kb_manager()
 Only admins can modify KB; everyone can search it.
 """
 
+# === Document Ingestion Queue ===
+ingest_queue = get_ingest_queue()
+"""Shared worker pool for document processing (size: INGEST_WORKERS).
+Uploads are processed off the script thread and polled by job ID.
+"""
+
+# KB admin listing: page size and sort choices (label -> (sort key, descending))
+KB_PAGE_SIZE = 20
+KB_SORT_OPTIONS = {
+    "Recently updated": ("updated_at", True),
+    "Title (A-Z)": ("title", False),
+    "Recently created": ("created_at", True),
+}
+
 # === Avatar Management ===
 class AvatarManager:
     """Manage user and bot avatars with fallbacks"""
@@ -1097,59 +1033,6 @@ class OfflineBot:
         
         return type('Response', (), {'content': response})()
 
-def _looks_like_pdf(header: bytes) -> bool:
-    return header.startswith(b"%PDF")
-
-def _looks_like_text(sample: bytes) -> bool:
-    if not sample:
-        return False
-    try:
-        text = sample.decode("utf-8", errors="ignore")
-    except Exception:
-        return False
-    # Heuristic: > 85% printable characters
-    printable = sum(1 for c in text if c.isprintable() or c in "\n\r\t")
-    ratio = printable / max(1, len(text))
-    return ratio >= 0.85
-
-def _detect_file_kind(name: str, data: bytes) -> Optional[str]:
-    n = (name or "").lower()
-    head = data[:8]
-    if n.endswith(".pdf") or _looks_like_pdf(head):
-        return "pdf"
-    if n.endswith(".txt") or _looks_like_text(data[:4096]):
-        return "txt"
-    # Common image extensions
-    if n.endswith(('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.bmp')):
-        return "image"
-    # OneNote types by extension (content is binary; we'll use best-effort extraction)
-    if n.endswith(".one"):
-        return "one"
-    if n.endswith(".onepkg"):
-        return "onepkg"
-    if n.endswith(".onetoc2"):
-        return "onetoc2"
-    return None
-
-def _strings_from_bytes(data: bytes, min_len: int = 5) -> str:
-    try:
-        text = data.decode("utf-8", errors="ignore")
-    except Exception:
-        return ""
-    out = []
-    buf = []
-    for ch in text:
-        if ch.isprintable() or ch in "\n\r\t":
-            buf.append(ch)
-        else:
-            if len(buf) >= min_len:
-                out.append("".join(buf))
-            buf = []
-    if len(buf) >= min_len:
-        out.append("".join(buf))
-    return "\n".join(out)
-
-
 def get_response_text(llm_result: Any) -> str:
     """Safely extract text from various LLM response shapes.
 
@@ -1202,258 +1085,21 @@ def _try_export_onenote_to_pdf(one_path: Path, pdf_path: Path) -> bool:
             pass
         return False
 
-# === Document Processing ===
-def process_document(uploaded_file):
-    """Wrapper for document processing that extracts raw bytes and filename
-    and delegates to a cached helper which accepts primitive types (bytes,str).
-    This avoids Streamlit cache hashing issues with file-like objects.
-    """
-    if not uploaded_file:
-        return None
-
-    try:
-        raw = uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file.getbuffer()
-        raw_bytes = bytes(raw)
-        filename = getattr(uploaded_file, 'name', 'uploaded') or 'uploaded'
-        return _process_document_bytes(raw_bytes, filename)
-    except Exception as e:
-        try:
-            st.error(f"❌ Error processing document: {e}")
-        except Exception:
-            pass
-        try:
-            logger.error("Document processing wrapper error", error=str(e))
-        except Exception:
-            pass
-        return None
-
-
-@st.cache_data
-def _process_document_bytes(raw_bytes: bytes, filename: str):
-    """Cached core document processing which operates on raw bytes and filename.
-    Returns the same structure as the original `process_document`.
-    """
-    try:
-        kind = _detect_file_kind(filename, raw_bytes)
-        if not kind:
-            try:
-                logger.warning("Upload rejected: unknown kind", filename=filename, size=len(raw_bytes))
-            except Exception:
-                pass
-            return None
-
-        safe_name = filename
-        if kind == "pdf" and not safe_name.lower().endswith(".pdf"):
-            safe_name += ".pdf"
-        if kind == "txt" and not safe_name.lower().endswith(".txt"):
-            safe_name += ".txt"
-        temp_path = UPLOADS_DIR / safe_name
-        with open(temp_path, "wb") as f:
-            f.write(raw_bytes)
-
-        # Choose loader & splitter
-        try:
-            # Only use LangChain loaders for PDF or text files; images should go
-            # through the manual/OCR fallback path to avoid trying to load binary
-            # images with TextLoader.
-            if (LANGCHAIN_AVAILABLE and PyPDFLoader and TextLoader and RecursiveCharacterTextSplitter
-                    and kind in ("pdf", "txt")):
-                if kind == "pdf":
-                    loader = PyPDFLoader(str(temp_path))
-                else:
-                    loader = TextLoader(str(temp_path), encoding='utf-8')
-
-                documents = loader.load()
-                try:
-                    temp_path.unlink(missing_ok=True)  # type: ignore[arg-type]
-                except Exception:
-                    pass
-
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=1000,
-                    chunk_overlap=200,
-                    length_function=len
-                )
-                chunks_objs = text_splitter.split_documents(documents)
-                chunk_texts = [c.page_content for c in chunks_objs]
-
-                # If LangChain produced no chunks (e.g. scanned PDF with no extractable
-                # text), fall back to manual extraction/OCR so we still return at least
-                # one chunk.
-                if not chunk_texts:
-                    try:
-                        raw_text = _strings_from_bytes(raw_bytes)
-                    except Exception:
-                        raw_text = ""
-
-                    if not raw_text:
-                        ext = temp_path.suffix.lower()
-                        if ext == '.pdf' and PYMUPDF_AVAILABLE:
-                            try:
-                                texts = []
-                                doc = fitz.open(str(temp_path))
-                                for page in doc:
-                                    try:
-                                        pix = page.get_pixmap(dpi=150)
-                                        img_bytes = pix.tobytes(output='png')
-                                        t = _ocr_image_bytes(img_bytes)
-                                        if t:
-                                            texts.append(t)
-                                    except Exception:
-                                        continue
-                                raw_text = "\n\n".join(texts)
-                            except Exception:
-                                raw_text = ""
-
-                    # Ensure non-empty fallback
-                    if not raw_text or len(raw_text.strip()) == 0:
-                        raw_text = _strings_from_bytes(raw_bytes) or '(no extractable text found)'
-
-                    # Create at least one chunk (plain strings)
-                    chunk_size = 1000
-                    overlap = 200
-                    chunk_texts = []
-                    i = 0
-                    while i < len(raw_text):
-                        part = raw_text[i:i+chunk_size]
-                        chunk_texts.append(part)
-                        i += (chunk_size - overlap)
-
-                # Vector store (best effort)
-                # Return simple, pickleable structures (lists of strings)
-                return {
-                    "type": "simple",
-                    "chunks": chunk_texts,
-                    "text_content": chunk_texts
-                }
-            else:
-                # Simple fallback: try multiple extractors (text, office, OCR)
-                try:
-                    raw_text = _strings_from_bytes(raw_bytes)
-                except Exception:
-                    raw_text = ""
-
-                # If no plain text found, try format-specific extraction
-                if not raw_text:
-                    ext = temp_path.suffix.lower()
-                    # Office documents (docx)
-                    if ext in ('.docx',) and PYDOCX_AVAILABLE:
-                        try:
-                            doc = docx.Document(str(temp_path))
-                            raw_text = "\n".join([p.text for p in doc.paragraphs if p.text])
-                        except Exception:
-                            raw_text = ""
-                    # PowerPoint
-                    elif ext in ('.pptx',) and PYTTHON_PPTX_AVAILABLE:
-                        try:
-                            from pptx import Presentation
-                            prs = Presentation(str(temp_path))
-                            paras = []
-                            for slide in prs.slides:
-                                for shape in slide.shapes:
-                                    try:
-                                        if hasattr(shape, 'text') and shape.text:
-                                            paras.append(shape.text)
-                                    except Exception:
-                                        continue
-                            raw_text = "\n".join(paras)
-                        except Exception:
-                            raw_text = ""
-                    # PDF: try to extract using PyMuPDF rendering + OCR if needed
-                    elif ext == '.pdf' and PYMUPDF_AVAILABLE:
-                        try:
-                            texts = []
-                            doc = fitz.open(str(temp_path))
-                            for page in doc:
-                                try:
-                                    pix = page.get_pixmap(dpi=150)
-                                    img_bytes = pix.tobytes(output='png')
-                                    t = _ocr_image_bytes(img_bytes)
-                                    if t:
-                                        texts.append(t)
-                                except Exception:
-                                    continue
-                            raw_text = "\n\n".join(texts)
-                        except Exception:
-                            raw_text = ""
-                    # Images - attempt OCR
-                    elif ext in ('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.bmp'):
-                        try:
-                            raw_text = _ocr_image_bytes(raw_bytes)
-                        except Exception:
-                            raw_text = ""
-                    else:
-                        try:
-                            raw_text = temp_path.read_text(encoding='utf-8', errors='ignore')
-                        except Exception:
-                            raw_text = ""
-
-                # Remove temp file
-                try:
-                    temp_path.unlink(missing_ok=True)  # type: ignore[arg-type]
-                except Exception:
-                    pass
-
-                # Ensure at least one chunk exists (avoid empty-chunk bug)
-                if not raw_text or len(raw_text.strip()) == 0:
-                    # Try extracting printable strings as a last resort
-                    fallback = _strings_from_bytes(raw_bytes)
-                    if fallback and fallback.strip():
-                        raw_text = fallback
-                    else:
-                        # For images or binary PDFs where OCR is unavailable,
-                        # provide a helpful placeholder indicating why no text
-                        if kind == 'image':
-                            raw_text = '(image file - no OCR backend installed or OCR returned empty)'
-                        else:
-                            raw_text = '(no extractable text found)'
-
-                chunk_size = 1000
-                overlap = 200
-                chunk_texts = []
-                i = 0
-                while i < len(raw_text):
-                    part = raw_text[i:i+chunk_size]
-                    chunk_texts.append(part)
-                    i += (chunk_size - overlap)
-
-                return {
-                    "type": "simple",
-                    "chunks": chunk_texts,
-                    "text_content": chunk_texts
-                }
-        except Exception as e:
-            try:
-                st.warning(f"Document processing fallback error: {e}")
-            except Exception:
-                pass
-            return None
-    except Exception as e:
-        try:
-            st.error(f"❌ Error processing document: {e}")
-        except Exception:
-            pass
-        try:
-            logger.error("Document processing error", error=str(e))
-        except Exception:
-            pass
-        return None
-
 # === Search Functions ===
-def search_documents(query, doc_data):
-    """Search documents with fallback methods"""
+def retrieve_document_chunks(query, doc_data, k=3):
+    """Return up to `k` relevant document chunks (untruncated) for prompt assembly"""
     if not doc_data:
-        return "No documents available to search."
+        return []
     
     query_lower = query.lower()
     
     if doc_data["type"] == "vectorstore":
         try:
             # Use vector search
-            retriever = doc_data["store"].as_retriever(search_kwargs={"k": 3})
+            retriever = doc_data["store"].as_retriever(search_kwargs={"k": k})
             relevant_docs = retriever.get_relevant_documents(query)
             if relevant_docs:
-                return "\n\n".join([doc.page_content[:500] + "..." for doc in relevant_docs])
+                return [doc.page_content for doc in relevant_docs]
         except Exception:
             pass
     
@@ -1461,25 +1107,23 @@ def search_documents(query, doc_data):
     results = []
     for text in doc_data.get("text_content", []):
         if any(term in text.lower() for term in query_lower.split()):
-            results.append(text[:400] + "...")
-            if len(results) >= 3:
+            results.append(text)
+            if len(results) >= k:
                 break
-    
-    return "\n\n".join(results) if results else "No relevant information found in documents."
+    return results
+
+def start_web_search(query):
+    """Start a background web search for the chat context (None when disabled or offline)"""
+    if not (CONFIG.web_search_enabled and config.has_serpapi):
+        return None
+    if mode_manager.get_current_mode() == "offline":
+        return None
+    return get_web_search().start_search(query)
 
-@st.cache_data
-def web_search(query):
-    """Web search with error handling"""
-    if not config.has_serpapi:
-        return "Web search unavailable - SerpAPI key not configured"
-    
-    try:
-        if SerpAPIWrapper is None:
-            return "Web search unavailable - SerpAPI wrapper not installed"
-        search = SerpAPIWrapper(serpapi_api_key=config.serpapi_key)
-        return search.run(query)
-    except Exception as e:
-        return f"Web search error: {e}"
+
+def collect_web_results(pending):
+    """Web results of `start_web_search`, waiting at most WEB_SEARCH_BUDGET_MS"""
+    return get_web_search().collect(pending, CONFIG.web_search_budget_ms / 1000) if pending else []
 
 # === Enhanced Voice Functions ===
 def text_to_speech(text):
@@ -1628,10 +1272,76 @@ def show_welcome_screen():
         with col3:
             st.metric("Voice Features", "Available" if VOICE_AVAILABLE else "Limited")
 
+def show_kb_warming_status():
+    """Show KB load progress while the knowledge base opens in the background"""
+    if kb_manager.ready:
+        return
+    status = kb_manager.load_status()
+    if status['total']:
+        st.progress(
+            min(1.0, status['loaded'] / status['total']),
+            text=f"📚 KB warming… {status['loaded']}/{status['total']} documents",
+        )
+    else:
+        st.caption("📚 KB warming… answers may miss KB content for a moment")
+
+
+def _show_ingest_jobs():
+    """Poll this session's background ingestion jobs"""
+    job_ids = st.session_state.get("ingest_jobs") or []
+    if not job_ids:
+        return
+    pending = []
+    for job in ingest_queue.jobs(job_ids):
+        # Read the state before draining: anything emitted before the job
+        # finished is then guaranteed to be in this drain
+        state = job.state
+        # Batch jobs emit each file's result as soon as it is ready
+        for item in job.drain():
+            if item.ok:
+                st.session_state.doc_data = merge_into_corpus(
+                    st.session_state.doc_data, item.name, item.result)
+                st.caption(f"✅ {item.name} ({item.elapsed_s:.1f}s)")
+            else:
+                st.error(f"❌ {item.name}: {item.error}")
+        if state == "done":
+            if hasattr(job.result, "summary"):
+                st.success(f"✅ {job.name}: {job.result.summary()}")
+            elif job.result:
+                st.session_state.doc_data = merge_into_corpus(
+                    st.session_state.doc_data, job.name, job.result)
+                st.success(f"✅ Document processed: {job.name}")
+            else:
+                st.error(f"❌ Failed to process document: {job.name}")
+        elif state == "failed":
+            st.error(f"❌ Failed to process document: {job.name} ({job.error})")
+        elif state == "cancelled":
+            st.info(f"🚫 Processing cancelled: {job.name}")
+        else:
+            pending.append(job.job_id)
+            col_progress, col_cancel = st.columns([6, 1])
+            with col_progress:
+                label = "waiting for a worker" if state == "queued" else job.stage
+                st.progress(job.progress, text=f"📖 {job.name}: {label}…")
+            with col_cancel:
+                if st.button("✖", key=f"cancel_{job.job_id}", help="Cancel processing"):
+                    ingest_queue.cancel(job.job_id)
+    st.session_state.ingest_jobs = pending
+
+
+# Re-poll job progress every second without rerunning the whole page
+# (st.fragment needs Streamlit >= 1.37; older versions refresh on interaction)
+if hasattr(st, "fragment"):
+    show_ingest_jobs = st.fragment(run_every=1.0)(_show_ingest_jobs)
+else:
+    show_ingest_jobs = _show_ingest_jobs
+
+
 def show_sidebar():
     """Enhanced sidebar with better organization, language support, and admin gating"""
     with st.sidebar:
         st.title("🤖 A.K.A.S.H.A.")
+        show_kb_warming_status()
 
         # Language Selection (always visible)
         st.subheader("🌍 Language")
@@ -1694,9 +1404,10 @@ def show_sidebar():
 
         # Document upload
         st.subheader("📄 Document Upload")
-        uploaded_file = st.file_uploader(
-            "Upload document:",
-            help="Upload PDF or text files. OneNote users: export as PDF or paste text. Mislabeled files are auto-detected."
+        uploaded_files = st.file_uploader(
+            "Upload documents:",
+            accept_multiple_files=True,
+            help="Upload PDF, Word, PowerPoint, Excel or text files. OneNote users: export as PDF or paste text. Mislabeled files are auto-detected. Several files are processed in parallel."
         )
 
         st.divider()
@@ -1799,11 +1510,14 @@ def show_sidebar():
         if st.button("🗑️ Clear Cache"):
             st.cache_data.clear()
             st.cache_resource.clear()
+            get_ingest_cache().clear()
             st.success("Cache cleared!")
 
         # Clear chat history button
         if st.button("🧹 Clear Chat History", help="Remove all chat messages from this session"):
             st.session_state.messages = []
+            if "memory_namespace" in st.session_state:
+                memory_shards.drop(st.session_state.memory_namespace)
             st.success("Chat history cleared.")
             st.rerun()
 
@@ -2003,6 +1717,10 @@ def show_sidebar():
             # === KNOWLEDGE BASE MANAGEMENT (ADMIN ONLY) ===
             st.subheader("📚 Knowledge Base Management")
             
+            kb_status = kb_manager.load_status()
+            if kb_status['state'] == 'failed':
+                st.error(f"❌ KB failed to load: {kb_status['error']}")
+            
             kb_stats = kb_manager.get_stats()
             col_kb1, col_kb2, col_kb3 = st.columns(3)
             with col_kb1:
@@ -2043,15 +1761,13 @@ def show_sidebar():
                 if kb_file:
                     try:
                         if kb_file.type == "application/pdf":
-                            try:
-                                import PyPDF2
-                                pdf_reader = PyPDF2.PdfReader(kb_file)
-                                kb_content = "\n".join([page.extract_text() for page in pdf_reader.pages])
+                            if PYPDF_AVAILABLE or PYMUPDF_AVAILABLE:
+                                kb_content = "\n".join(pdf_pages_text(kb_file.getvalue()))
                                 st.success(f"✅ PDF loaded: {len(kb_content)} characters")
-                            except ImportError:
-                                st.error("❌ PyPDF2 not installed. Use text input instead.")
+                            else:
+                                st.error("❌ pypdf not installed. Use text input instead.")
                         else:
-                            kb_content = kb_file.read().decode('utf-8')
+                            kb_content = decode_text(kb_file.getvalue())
                             st.success(f"✅ File loaded: {len(kb_content)} characters")
                     except Exception as e:
                         st.error(f"❌ Error reading file: {e}")
@@ -2064,28 +1780,91 @@ def show_sidebar():
             
             if st.button("➕ Add to Knowledge Base", key="add_kb_doc"):
                 if kb_title and kb_content:
+                    duplicate = kb_manager.find_duplicate(kb_content)
                     doc_id = kb_manager.add_from_text(
                         title=kb_title,
                         content=kb_content,
                         category=kb_category,
-                        tags=kb_tags
+                        tags=kb_tags,
+                        on_duplicate="merge"
                     )
-                    st.success(f"✅ Document added! (ID: {doc_id})")
+                    if duplicate:
+                        st.info(f"ℹ️ Near-duplicate of '{duplicate[0].title}' "
+                                f"({duplicate[1]:.0%} similar) — tags merged, no new document (ID: {doc_id})")
+                    else:
+                        st.success(f"✅ Document added! (ID: {doc_id})")
                 else:
                     st.error("⚠️ Please enter both title and content")
             
+            # Bulk import a help-center export (zip/tar of TXT/MD/HTML/PDF)
+            with st.expander("📦 Bulk Import Archive"):
+                kb_archive = st.file_uploader(
+                    "Upload archive",
+                    type=["zip", "tar", "gz", "tgz"],
+                    help="Folder names become categories; duplicates are skipped",
+                    key="kb_bulk_upload"
+                )
+                if kb_archive and st.button("📦 Import Archive", key="kb_bulk_import"):
+                    try:
+                        # The importer needs a path; the spilled archive is removed afterwards
+                        with temp_file(kb_archive.getbuffer(), suffix=f"_{os.path.basename(kb_archive.name)}",
+                                       directory=str(UPLOADS_DIR)) as archive_path:
+                            progress_text = st.empty()
+                            with st.spinner("Importing documents..."):
+                                stats = kb_manager.import_path(
+                                    str(archive_path),
+                                    progress=lambda s: progress_text.caption(
+                                        f"{s.imported} imported · {s.files_per_second:.1f} files/s"
+                                    ),
+                                )
+                        st.success(f"✅ {stats.summary()}")
+                        for error in stats.errors[:5]:
+                            st.warning(error)
+                    except Exception as e:
+                        st.error(f"❌ Import failed: {e}")
+            
             st.divider()
             
-            # List and manage existing KB documents
+            # List and manage existing KB documents, one page at a time
             st.caption("📖 Manage Documents")
-            kb_filter_category = st.selectbox(
-                "Filter by category",
-                ["All"] + kb_manager.store.get_categories(),
-                key="kb_filter_cat"
-            )
+            kb_search = st.text_input("Search titles/tags", key="kb_list_search", placeholder="e.g. 'setup'")
+            col_f1, col_f2, col_f3 = st.columns(3)
+            with col_f1:
+                kb_filter_category = st.selectbox(
+                    "Category",
+                    ["All"] + kb_manager.store.get_categories(),
+                    key="kb_filter_cat"
+                )
+            with col_f2:
+                kb_filter_tag = st.selectbox(
+                    "Tag",
+                    ["All"] + kb_manager.store.get_tags(),
+                    key="kb_filter_tag"
+                )
+            with col_f3:
+                kb_sort_label = st.selectbox("Sort", list(KB_SORT_OPTIONS), key="kb_sort")
             
             category_filter = None if kb_filter_category == "All" else kb_filter_category
-            kb_docs = kb_manager.list_all(category=category_filter)
+            tag_filter = None if kb_filter_tag == "All" else kb_filter_tag
+            sort_key, descending = KB_SORT_OPTIONS[kb_sort_label]
+            
+            # Cursor stack for back/forward; reset whenever the filters change
+            filter_state = (kb_search, category_filter, tag_filter, kb_sort_label)
+            if st.session_state.get("kb_page_filters") != filter_state:
+                st.session_state.kb_page_filters = filter_state
+                st.session_state.kb_page_cursors = [None]
+            cursors = st.session_state.kb_page_cursors
+            
+            page = kb_manager.list_page(
+                cursor=cursors[-1],
+                limit=KB_PAGE_SIZE,
+                sort=sort_key,
+                descending=descending,
+                category=category_filter,
+                tag=tag_filter,
+                query=kb_search or None,
+            )
+            kb_docs = page['items']
             
             if kb_docs:
                 for doc in kb_docs:
@@ -2105,22 +1884,37 @@ def show_sidebar():
                                 st.rerun()
                             else:
                                 st.error("Failed to delete")
+                
+                col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+                with col_p1:
+                    if st.button("⬅️ Prev", key="kb_prev_page", disabled=len(cursors) <= 1):
+                        cursors.pop()
+                        st.rerun()
+                with col_p2:
+                    total = page['total']
+                    st.caption(f"Page {len(cursors)}" + (f" of {max(1, -(-total // KB_PAGE_SIZE))}" if total is not None else ""))
+                with col_p3:
+                    if st.button("Next ➡️", key="kb_next_page", disabled=not page['next_cursor']):
+                        cursors.append(page['next_cursor'])
+                        st.rerun()
             else:
-                st.info("No documents in this category yet")
+                st.info("No documents match these filters")
             
             st.divider()
             
             # KB Backup/Export
             col_backup1, col_backup2 = st.columns(2)
             with col_backup1:
-                if st.button("💾 Save KB Backup"):
+                # Saving mid-warm-up would persist a partial KB
+                if st.button("💾 Save KB Backup", disabled=not kb_manager.ready):
+                    kb_manager.wait_until_ready()
                     if kb_manager.store.save_to_disk():
-                        st.success("✅ KB backed up to kb/kb_backup.json")
+                        st.success("✅ KB backed up to kb/kb_snapshot.akb")
                     else:
                         st.error("❌ Backup failed")
             
             with col_backup2:
-                if st.button("🔄 Load KB from Backup"):
+                if st.button("🔄 Load KB from Backup", disabled=not kb_manager.ready):
                     if kb_manager.store.load_from_disk():
                         st.success("✅ KB loaded from backup")
                         st.rerun()
@@ -2130,7 +1924,7 @@ def show_sidebar():
             # Not authenticated - show login prompt
             show_admin_login()
 
-    return provider, model, uploaded_file, use_voice, max_tokens
+    return provider, model, uploaded_files, use_voice, max_tokens
 
 
 def main():
@@ -2148,13 +1942,28 @@ def main():
         st.session_state.messages = []
     if "doc_data" not in st.session_state:
         st.session_state.doc_data = None
+    if "ingest_jobs" not in st.session_state:
+        st.session_state.ingest_jobs = []
+    if "seen_uploads" not in st.session_state:
+        st.session_state.seen_uploads = set()
     if "show_welcome" not in st.session_state:
         st.session_state.show_welcome = True
     if "current_language" not in st.session_state:
         st.session_state.current_language = "en"
+    if "memory_namespace" not in st.session_state:
+        st.session_state.memory_namespace = new_id("s")
+    if "conversation_history" not in st.session_state:
+        st.session_state.conversation_history = ConversationHistory(
+            max_turns=CONFIG.max_history_length,
+            window_tokens=CONFIG.history_window_tokens,
+            summary_tokens=CONFIG.history_summary_tokens,
+        )
+    
+    # This session's memory shard
+    memory_manager = memory_shards.shard(st.session_state.memory_namespace)
     
     # Show sidebar
-    provider, model, uploaded_file, use_voice, max_tokens = show_sidebar()
+    provider, model, uploaded_files, use_voice, max_tokens = show_sidebar()
     
     # Main content area
     if st.session_state.show_welcome and not st.session_state.messages:
@@ -2170,16 +1979,27 @@ def main():
     if not st.session_state.messages:
         render_central_sphere()
     
-    # Process uploaded document
-    if uploaded_file and uploaded_file != st.session_state.get("last_file"):
-        with st.spinner("📖 Processing document..."):
-            doc_data = process_document(uploaded_file)
-            if doc_data:
-                st.session_state.doc_data = doc_data
-                st.session_state.last_file = uploaded_file
-                st.success(f"✅ Document processed: {uploaded_file.name}")
-            else:
-                st.error("❌ Failed to process document")
+    # Queue uploaded documents for background processing; chat keeps working
+    # against already-processed documents while jobs run. Several new files
+    # go to one batch job that extracts them in parallel worker processes.
+    new_files = []
+    for f in uploaded_files or []:
+        upload_id = getattr(f, "file_id", None) or (f.name, f.size)
+        if upload_id not in st.session_state.seen_uploads:
+            st.session_state.seen_uploads.add(upload_id)
+            new_files.append(f)
+    ocr_langs = st.session_state.get('ocr_langs')
+    if len(new_files) == 1:
+        job = ingest_queue.submit(new_files[0].name, process_document, new_files[0], ocr_langs=ocr_langs)
+        st.session_state.ingest_jobs.append(job.job_id)
+    elif new_files:
+        job = ingest_queue.submit(
+            f"{len(new_files)} files", process_batch,
+            [(f.name, f.getvalue()) for f in new_files],
+            ocr_langs=ocr_langs, partial=True,
+        )
+        st.session_state.ingest_jobs.append(job.job_id)
+    show_ingest_jobs()
     
     # Display chat history with custom avatars
     user_avatar, bot_avatar = avatar_manager.get_avatars()
@@ -2218,11 +2038,12 @@ def main():
             st.markdown(prompt)
         
         # Store user message in memory for future retrieval
+        prompt_memory_ids = []
         try:
-            memory_manager.insert_memory(
+            prompt_memory_ids.append(memory_manager.insert_memory(
                 content=prompt,
                 metadata={"role": "user", "timestamp": datetime.now().isoformat()}
-            )
+            ).id)
         except Exception as e:
             try:
                 logger.debug("Memory insert failed", error=str(e))
@@ -2253,14 +2074,79 @@ def main():
                         st.caption("📚 From cache")
                         
                     else:
-                        # Search Knowledge Base first
-                        kb_context = ""
-                        kb_results = kb_manager.search(prompt, top_k=3)
-                        if kb_results:
-                            kb_context = "📚 **Knowledge Base Results:**\n\n"
-                            for i, result in enumerate(kb_results, 1):
-                                kb_context += f"{i}. **{result['title']}** (Relevance: {result['relevance']})\n"
-                                kb_context += f"   {result['content'][:150]}...\n\n"
+                        # Start the web search (cached, coalesced; off unless
+                        # WEB_SEARCH_ENABLED) so it runs during local retrieval
+                        web_pending = start_web_search(prompt)
+
+                        # Optional second stage: rerank a wide candidate set from
+                        # KB, memory, document chunks and the web and keep only the best few
+                        reranked = None
+                        if CONFIG.rerank_enabled:
+                            try:
+                                reranker = get_reranker()
+                                candidates = gather_candidates(
+                                    prompt, kb_manager, memory_manager, st.session_state.doc_data,
+                                    limit=CONFIG.rerank_candidates,
+                                    web_results=lambda: collect_web_results(web_pending),
+                                    exclude_memory_ids=prompt_memory_ids,
+                                )
+                                reranked = group_by_source(
+                                    reranker.rerank(prompt, candidates, top_n=CONFIG.rerank_top_n)
+                                )
+                                try:
+                                    logger.debug("Context reranked", **reranker.last_stats)
+                                except Exception:
+                                    pass
+                            except Exception as e:
+                                reranked = None
+                                try:
+                                    logger.warning("Reranking failed; using first-stage results", error=str(e))
+                                except Exception:
+                                    pass
+
+                        # Collect ranked context per section (reranked or first-stage).
+                        # The prompt builder decides how much of it fits the window.
+                        if reranked is not None:
+                            kb_items = [
+                                ContextItem(
+                                    text=c.text, source="kb", title=c.metadata.get('title'),
+                                    score=round(c.rerank_score if c.rerank_score is not None else c.first_stage_score, 2),
+                                )
+                                for c in reranked['kb']
+                            ]
+                            doc_items = [ContextItem(text=c.text, source="document") for c in reranked['document']]
+                            memory_items = [
+                                ContextItem(text=c.text, source="memory") for c in reranked['memory']
+                            ]
+                            web_items = [
+                                ContextItem(text=c.text, source="web", title=c.metadata.get('title'),
+                                            url=c.metadata.get('url'))
+                                for c in reranked['web']
+                            ]
+                        else:
+                            kb_items = [
+                                ContextItem(text=r['passage'], source="kb", title=r['title'], score=r['relevance'])
+                                for r in kb_manager.search(prompt, top_k=3)
+                            ]
+                            doc_items = []
+                            if st.session_state.doc_data:
+                                doc_items = [
+                                    ContextItem(text=t, source="document")
+                                    for t in retrieve_document_chunks(prompt, st.session_state.doc_data)
+                                ]
+                            # Retrieve relevant memories (A.K.A.S.H.A.'s long-term context);
+                            # skip the prompt itself, which was just inserted above
+                            try:
+                                memory_items = [
+                                    ContextItem(text=m.content, source="memory")
+                                    for m in memory_manager.query(prompt, top_k=4) if m.content != prompt
+                                ][:3]
+                            except Exception:
+                                memory_items = []
+                            web_items = [
+                                ContextItem(text=r.snippet or r.title, source="web", title=r.title, url=r.url)
+                                for r in collect_web_results(web_pending)[:3]
+                            ]
                         
                         # Create LLM with smart auto-fallback
                         force_offline = (provider == "offline" or mode_manager.get_current_mode() == "offline")
@@ -2276,35 +2162,50 @@ def main():
                                 st.info("🔄 Using offline mode")
                         
                         # Generate response with augmented context
-                        if st.session_state.doc_data:
-                            # Include document search
-                            doc_results = search_documents(prompt, st.session_state.doc_data)
-                            
-                            if isinstance(llm, OfflineBot):
-                                response = f"{get_response_text(llm.invoke(prompt))}\n\n📄 **From your document:**\n{doc_results}"
-                            else:
-                                enhanced_prompt = f"{prompt}\n\nRelevant document content:\n{doc_results}"
-                                if kb_context:
-                                    enhanced_prompt += f"\n\n{kb_context}"
-                                response = get_response_text(llm.invoke(enhanced_prompt))
+                        if st.session_state.doc_data and isinstance(llm, OfflineBot):
+                            doc_results = "\n\n".join(
+                                [i.text[:400] + "..." for i in doc_items]
+                            ) or "No relevant information found in documents."
+                            response = f"{get_response_text(llm.invoke(prompt))}\n\n📄 **From your document:**\n{doc_results}"
                         else:
-                            # Retrieve relevant memories (A.K.A.S.H.A.'s long-term context)
+                            # Recent turns verbatim plus a rolling summary of older ones
+                            # (the last message is the prompt being answered)
+                            summarizer = None
+                            if CONFIG.history_llm_summary and not isinstance(llm, OfflineBot):
+                                summarizer = llm_summarizer(llm, get_response_text)
                             try:
-                                retrieved_memories = memory_manager.query(prompt, top_k=3)
-                                memory_context = ""
-                                if retrieved_memories:
-                                    memory_context = "\n\nRelevant past context:\n" + "\n".join(
-                                        [f"• {m.content}" for m in retrieved_memories[:3]]
-                                    )
-                            except Exception:
-                                memory_context = ""
-                            
-                            # Augment prompt with KB context and memory (RAG-style)
-                            final_prompt = prompt + memory_context
-                            if kb_context:
-                                final_prompt += f"\n\n{kb_context}"
+                                history_block = st.session_state.conversation_history.build_context(
+                                    st.session_state.messages[:-1], summarizer=summarizer
+                                )
+                            except Exception as e:
+                                history_block = ""
+                                try:
+                                    logger.debug("History window failed", error=str(e))
+                                except Exception:
+                                    pass
                             
-                            response = get_response_text(llm.invoke(final_prompt))
+                            # Pack KB, document and memory context into the token budget (RAG-style)
+                            builder = PromptBuilder(
+                                provider=provider,
+                                model=model,
+                                max_output_tokens=max_tokens,
+                                context_budget=CONFIG.prompt_context_tokens,
+                            )
+                            built = builder.build(
+                                prompt, kb=kb_items, documents=doc_items, memory=memory_items,
+                                preamble=history_block, web=web_items,
+                            )
+                            try:
+                                logger.debug(
+                                    "Prompt assembled",
+                                    tokens=built.tokens,
+                                    budget=built.budget,
+                                    dropped=built.dropped,
+                                    duplicates=built.duplicates,
+                                )
+                            except Exception:
+                                pass
+                            response = get_response_text(llm.invoke(built.text))
                         
                         # Display response
                         st.markdown(response)
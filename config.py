@@ -14,6 +14,10 @@ class ChatbotConfig:
     default_temperature: float = 0.7
     max_tokens: int = 2048
     max_history_length: int = 50
+    prompt_context_tokens: int = 3000  # retrieved-context budget per prompt
+    history_window_tokens: int = 1500  # recent turns sent verbatim
+    history_summary_tokens: int = 300  # rolling summary of older turns
+    history_llm_summary: bool = False  # summarize with the chat LLM instead of extractively
     
     # File upload limits
     max_file_size_mb: int = 50
@@ -24,6 +28,29 @@ class ChatbotConfig:
     chunk_overlap: int = 200
     embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
     
+    # Reranking settings (second-stage cross-encoder, disabled by default)
+    rerank_enabled: bool = False
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 50
+    rerank_top_n: int = 5
+    rerank_batch_size: int = 16
+    rerank_budget_ms: int = 400
+    
+    # Web search settings (SerpAPI; needs SERPAPI_API_KEY)
+    web_search_enabled: bool = False  # add web results to chat context
+    web_search_results: int = 5
+    web_search_ttl_hours: int = 6  # how long cached results are served
+    web_search_timeout_s: float = 8.0
+    web_search_budget_ms: int = 1500  # max wait per turn; slower results only fill the cache
+    
+    # Memory settings
+    memory_consolidate_every: int = 20  # inserts between background consolidations (0 = off)
+    memory_capacity: int = 2000  # bounded ring buffer size (0 = unbounded)
+    dedup_threshold: float = 0.85  # near-duplicate similarity for KB/memory ingestion (0 = off)
+    ingest_workers: int = 2  # concurrent background document-processing jobs
+    ingest_processes: int = 0  # worker processes for multi-file uploads (0 = all cores)
+    ocr_binarize: bool = False  # Otsu-binarize rendered PDF pages before OCR
+    
     # Voice settings
     voice_timeout: int = 5
     tts_language: str = "en"
@@ -47,11 +74,33 @@ class ChatbotConfig:
             default_temperature=float(os.getenv("DEFAULT_TEMPERATURE", "0.7")),
             max_tokens=int(os.getenv("MAX_TOKENS", "2048")),
             max_history_length=int(os.getenv("MAX_HISTORY_LENGTH", "50")),
+            prompt_context_tokens=int(os.getenv("PROMPT_CONTEXT_TOKENS", "3000")),
+            history_window_tokens=int(os.getenv("HISTORY_WINDOW_TOKENS", "1500")),
+            history_summary_tokens=int(os.getenv("HISTORY_SUMMARY_TOKENS", "300")),
+            history_llm_summary=os.getenv("HISTORY_LLM_SUMMARY", "false").lower() == "true",
             max_file_size_mb=int(os.getenv("MAX_FILE_SIZE_MB", "50")),
             chunk_size=int(os.getenv("CHUNK_SIZE", "1000")),
             chunk_overlap=int(os.getenv("CHUNK_OVERLAP", "200")),
+            rerank_enabled=os.getenv("RERANK_ENABLED", "false").lower() == "true",
+            rerank_model=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+            rerank_candidates=int(os.getenv("RERANK_CANDIDATES", "50")),
+            rerank_top_n=int(os.getenv("RERANK_TOP_N", "5")),
+            rerank_batch_size=int(os.getenv("RERANK_BATCH_SIZE", "16")),
+            rerank_budget_ms=int(os.getenv("RERANK_BUDGET_MS", "400")),
+            web_search_enabled=os.getenv("WEB_SEARCH_ENABLED", "false").lower() == "true",
+            web_search_results=int(os.getenv("WEB_SEARCH_RESULTS", "5")),
+            web_search_ttl_hours=int(os.getenv("WEB_SEARCH_TTL_HOURS", "6")),
+            web_search_timeout_s=float(os.getenv("WEB_SEARCH_TIMEOUT_S", "8")),
+            web_search_budget_ms=int(os.getenv("WEB_SEARCH_BUDGET_MS", "1500")),
+            memory_consolidate_every=int(os.getenv("MEMORY_CONSOLIDATE_EVERY", "20")),
+            memory_capacity=int(os.getenv("MEMORY_CAPACITY", "2000")),
+            dedup_threshold=float(os.getenv("DEDUP_THRESHOLD", "0.85")),
+            ingest_workers=int(os.getenv("INGEST_WORKERS", "2")),
+            ingest_processes=int(os.getenv("INGEST_PROCESSES", "0")),
+            ocr_binarize=os.getenv("OCR_BINARIZE", "false").lower() == "true",
             voice_timeout=int(os.getenv("VOICE_TIMEOUT", "5")),
             cache_ttl_hours=int(os.getenv("CACHE_TTL_HOURS", "1")),
+            max_cache_size_mb=int(os.getenv("MAX_CACHE_SIZE_MB", "100")),
             max_input_length=int(os.getenv("MAX_INPUT_LENGTH", "4000")),
             enable_debug_mode=os.getenv("DEBUG_MODE", "false").lower() == "true"
         )
@@ -0,0 +1,230 @@
+"""dedup.py
+Near-duplicate detection for KB and memory ingestion.
+
+Texts are reduced to MinHash signatures over word 3-shingles and bucketed
+with locality-sensitive hashing (banded signatures), so a lookup only
+compares against the few entries sharing a band instead of the whole store.
+
+Signatures use one-permutation hashing with rotation densification: each
+shingle is hashed once and assigned to one of `num_perm` bins, which keeps
+signing linear in the text length (sub-millisecond for chat-sized texts)
+while estimating Jaccard similarity like classic k-permutation MinHash.
+"""
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_MAX_HASH = (1 << 64) - 1
+# Offset added per bin when densifying, keeps borrowed values distinguishable
+_DENSIFY_OFFSET = 1 << 58
+
+Signature = Tuple[int, ...]
+
+
+def _shingle_hashes(text: str, size: int) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return set()
+    if len(words) < size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return {
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+        for s in shingles
+    }
+
+
+def minhash_signature(text: str, num_perm: int = 128, shingle_size: int = 3) -> Optional[Signature]:
+    """Return the MinHash signature of `text`, or None if it has no words"""
+    hashes = _shingle_hashes(text, shingle_size)
+    if not hashes:
+        return None
+    bins = [_MAX_HASH] * num_perm
+    for h in hashes:
+        i = h % num_perm
+        v = h // num_perm
+        if v < bins[i]:
+            bins[i] = v
+    # Densify: empty bins borrow from the next non-empty bin (circularly)
+    if _MAX_HASH in bins:
+        filled = bins[:]
+        for i in range(num_perm):
+            if filled[i] != _MAX_HASH:
+                continue
+            for step in range(1, num_perm):
+                j = (i + step) % num_perm
+                if filled[j] != _MAX_HASH:
+                    bins[i] = filled[j] + step * _DENSIFY_OFFSET
+                    break
+    return tuple(bins)
+
+
+def estimate_similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    if not a or not b or len(a) != len(b):
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def _choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """Pick (bands, rows) whose LSH S-curve midpoint sits just below `threshold`
+    so true near-duplicates are almost always candidates."""
+    target = threshold - 0.05
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if (1.0 / bands) ** (1.0 / rows) <= target:
+            best = (bands, rows)
+    return best
+
+
+class NearDuplicateIndex:
+    """Thread-safe MinHash/LSH index from keys (document or memory IDs) to signatures.
+
+    `find` returns the most similar indexed key whose estimated Jaccard
+    similarity is at least `threshold`. Only signatures are persisted; the
+    LSH buckets are rebuilt on load.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 3):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = _choose_bands(num_perm, threshold)
+        self._signatures: Dict[str, Signature] = {}
+        self._buckets: List[Dict[Signature, set]] = [{} for _ in range(self.bands)]
+        self._lock = threading.Lock()
+        # Signatures compared by `find`; LSH keeps this far below len(self) per lookup
+        self.candidates_examined = 0
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._signatures
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._signatures)
+
+    def signature(self, text: str) -> Optional[Signature]:
+        return minhash_signature(text, self.num_perm, self.shingle_size)
+
+    def _band_keys(self, sig: Signature) -> Iterable[Tuple[int, Signature]]:
+        r = self.rows
+        for b in range(self.bands):
+            yield b, sig[b * r:(b + 1) * r]
+
+    def _remove_locked(self, key: str) -> bool:
+        sig = self._signatures.pop(key, None)
+        if sig is None:
+            return False
+        for b, band in self._band_keys(sig):
+            bucket = self._buckets[b].get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[b][band]
+        return True
+
+    def add(self, key: str, text: str = "", signature: Optional[Signature] = None) -> None:
+        """Index `key` by the signature of `text` (or a precomputed signature)"""
+        sig = signature if signature is not None else self.signature(text)
+        if sig is None:
+            return
+        with self._lock:
+            self._remove_locked(key)
+            self._signatures[key] = sig
+            for b, band in self._band_keys(sig):
+                self._buckets[b].setdefault(band, set()).add(key)
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            return self._remove_locked(key)
+
+    def find(self, text: str = "", signature: Optional[Signature] = None,
+             exclude: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """Return (key, similarity) of the closest near-duplicate, or None"""
+        sig = signature if signature is not None else self.signature(text)
+        if sig is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for b, band in self._band_keys(sig):
+                bucket = self._buckets[b].get(band)
+                if bucket:
+                    candidates.update(bucket)
+            candidates.discard(exclude)
+            self.candidates_examined += len(candidates)
+            best: Optional[Tuple[str, float]] = None
+            for key in candidates:
+                sim = estimate_similarity(sig, self._signatures[key])
+                if sim >= self.threshold and (best is None or sim > best[1]):
+                    best = (key, sim)
+        return best
+
+    def retain(self, keys: Iterable[str]) -> int:
+        """Drop every indexed key not in `keys`; returns how many were dropped"""
+        keep = set(keys)
+        with self._lock:
+            stale = [k for k in self._signatures if k not in keep]
+            for key in stale:
+                self._remove_locked(key)
+        return len(stale)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'threshold': self.threshold,
+                'num_perm': self.num_perm,
+                'shingle_size': self.shingle_size,
+                'signatures': {k: list(v) for k, v in self._signatures.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> NearDuplicateIndex:
+        index = cls(
+            threshold=data.get('threshold', 0.85),
+            num_perm=data.get('num_perm', 128),
+            shingle_size=data.get('shingle_size', 3),
+        )
+        for key, sig in data.get('signatures', {}).items():
+            index.add(key, signature=tuple(sig))
+        return index
+
+    def save(self, filepath: str) -> bool:
+        """Atomically write the signatures to `filepath`"""
+        try:
+            Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{filepath}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, filepath)
+            return True
+        except Exception as e:
+            print(f"Error saving dedup index: {e}")
+            return False
+
+    @classmethod
+    def load(cls, filepath: str, threshold: Optional[float] = None) -> Optional[NearDuplicateIndex]:
+        """Load an index saved with `save`; None if missing or unreadable"""
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if threshold is not None:
+            data['threshold'] = threshold
+        return cls.from_dict(data)
+
+
+__all__ = ["NearDuplicateIndex", "minhash_signature", "estimate_similarity"]
@@ -0,0 +1,136 @@
+"""history.py
+Conversation history window for A.K.A.S.H.A.
+
+Keeps multi-turn continuity without letting prompts grow linearly with chat
+length: the most recent turns are included verbatim up to a token budget, and
+turns that slide out of that window are folded into a rolling summary. The
+summary is updated incrementally — each turn is summarized exactly once, when
+it falls off the window — so long chats cost a bounded number of tokens.
+"""
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Callable
+import re
+
+from prompt_builder import TokenCounter
+
+# summarizer(previous_summary, turns_falling_off) -> new_summary
+Summarizer = Callable[[str, List[Dict[str, Any]]], str]
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+ROLE_LABELS = {"user": "User", "assistant": "Assistant"}
+
+
+def extractive_summarizer(max_words: int = 30) -> Summarizer:
+    """Build a cheap, LLM-free summarizer that keeps the lead sentence of each turn"""
+    def summarize(previous: str, turns: List[Dict[str, Any]]) -> str:
+        lines = [previous] if previous else []
+        for turn in turns:
+            content = (turn.get("content") or "").strip()
+            if not content:
+                continue
+            lead = _SENTENCE_RE.split(content, maxsplit=1)[0]
+            words = lead.split()
+            if len(words) > max_words:
+                lead = " ".join(words[:max_words]) + "..."
+            verb = "asked" if turn.get("role") == "user" else "answered"
+            lines.append(f"- {ROLE_LABELS.get(turn.get('role'), 'User')} {verb}: {lead}")
+        return "\n".join(lines)
+    return summarize
+
+
+def llm_summarizer(llm: Any, get_text: Callable[[Any], str]) -> Summarizer:
+    """Build a summarizer that asks the chat LLM to update the running summary"""
+    def summarize(previous: str, turns: List[Dict[str, Any]]) -> str:
+        transcript = "\n".join(
+            f"{ROLE_LABELS.get(t.get('role'), 'User')}: {t.get('content', '')}" for t in turns
+        )
+        prompt = (
+            "Update the running summary of a conversation with the new turns below. "
+            "Keep names, facts, decisions and open questions; be concise.\n\n"
+            f"Current summary:\n{previous or '(empty)'}\n\nNew turns:\n{transcript}\n\nUpdated summary:"
+        )
+        return get_text(llm.invoke(prompt)).strip()
+    return summarize
+
+
+class ConversationHistory:
+    """Recent-turn window plus a rolling summary of everything older.
+
+    Intended to live in `st.session_state` so each browser session keeps its
+    own summary and high-water mark across Streamlit reruns.
+    """
+
+    def __init__(self, max_turns: int = 50, window_tokens: int = 1500, summary_tokens: int = 300,
+                 refill_ratio: float = 0.6, counter: Optional[TokenCounter] = None):
+        self.max_turns = max_turns
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.refill_ratio = refill_ratio
+        self.counter = counter or TokenCounter()
+        self.summary = ""
+        # Number of leading messages already folded into `summary`
+        self.summarized_upto = 0
+
+    def _format_turn(self, turn: Dict[str, Any]) -> str:
+        return f"{ROLE_LABELS.get(turn.get('role'), 'User')}: {turn.get('content', '')}"
+
+    def _window_start(self, messages: List[Dict[str, Any]], budget: int) -> int:
+        used = 0
+        start = len(messages)
+        lower = max(self.summarized_upto, len(messages) - self.max_turns)
+        for i in range(len(messages) - 1, lower - 1, -1):
+            cost = self.counter.count(self._format_turn(messages[i])) + 1
+            if used + cost > budget:
+                break
+            used += cost
+            start = i
+        return start
+
+    def _fold(self, turns: List[Dict[str, Any]], summarizer: Optional[Summarizer]) -> None:
+        fallback = extractive_summarizer()
+        try:
+            summary = (summarizer or fallback)(self.summary, turns)
+        except Exception:
+            summary = fallback(self.summary, turns)
+        if self.counter.count(summary) > self.summary_tokens:
+            # Keep the newest part of the summary; older details age out
+            lines = summary.splitlines()
+            while len(lines) > 1 and self.counter.count("\n".join(lines)) > self.summary_tokens:
+                lines.pop(0)
+            summary = self.counter.truncate("\n".join(lines), self.summary_tokens)
+        self.summary = summary
+
+    def build_context(self, messages: List[Dict[str, Any]], summarizer: Optional[Summarizer] = None) -> str:
+        """Return the history block for the next prompt.
+
+        `messages` are prior turns (excluding the prompt being answered). Only
+        messages between the previous high-water mark and the new window start
+        are passed to `summarizer`.
+        """
+        if len(messages) < self.summarized_upto:
+            # Chat was cleared; start over
+            self.summary = ""
+            self.summarized_upto = 0
+
+        start = self._window_start(messages, self.window_tokens)
+        if start > self.summarized_upto:
+            # Shrink the window below the budget when folding so the next few
+            # turns fit without another summarizer call
+            start = max(start, self._window_start(messages, int(self.window_tokens * self.refill_ratio)))
+            self._fold(messages[self.summarized_upto:start], summarizer)
+            self.summarized_upto = start
+
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation:\n{self.summary}")
+        recent = messages[start:]
+        if recent:
+            parts.append("Recent conversation:\n" + "\n".join(self._format_turn(t) for t in recent))
+        if not parts:
+            return ""
+        parts.append("Current question:")
+        return "\n\n".join(parts)
+
+
+__all__ = ["ConversationHistory", "extractive_summarizer", "llm_summarizer"]
@@ -0,0 +1,90 @@
+"""ids.py
+Collision-free, time-sortable identifiers for memory and KB entries.
+
+IDs are ULIDs: a 48-bit millisecond timestamp followed by 80 random bits,
+encoded as 26 Crockford base32 characters so string order equals creation
+order. Within a single millisecond the random part is incremented instead of
+redrawn, which keeps IDs strictly monotonic per process even under bursts of
+inserts from several threads. The random part is redrawn after `fork()`, so
+worker processes never continue the parent's sequence.
+"""
+from __future__ import annotations
+from typing import Optional
+import os
+import threading
+import time
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def _decode(text: str) -> int:
+    value = 0
+    for ch in text.upper():
+        value = (value << 5) | _CROCKFORD.index(ch)
+    return value
+
+
+class ULIDGenerator:
+    """Thread-safe monotonic ULID generator"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_rand = 0
+        self._pid = os.getpid()
+
+    def new(self) -> str:
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                # Forked child: don't continue the parent's random sequence
+                self._pid = pid
+                self._last_ms = -1
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms <= self._last_ms:
+                # Same millisecond (or clock stepped back): stay monotonic
+                now_ms = self._last_ms
+                rand = self._last_rand + 1
+                if rand > _RANDOM_MAX:
+                    now_ms += 1
+                    rand = int.from_bytes(os.urandom(10), "big") >> 1
+            else:
+                # Leave headroom so increments within the millisecond never overflow
+                rand = int.from_bytes(os.urandom(10), "big") >> 1
+            self._last_ms = now_ms
+            self._last_rand = rand
+        return _encode(now_ms, 10) + _encode(rand, 16)
+
+
+def ulid_timestamp(ulid: str) -> float:
+    """Return the creation time (seconds since epoch) encoded in a ULID"""
+    return _decode(ulid[:10]) / 1000.0
+
+
+# Global singleton instance
+_generator: Optional[ULIDGenerator] = None
+_generator_lock = threading.Lock()
+
+
+def new_id(prefix: str = "") -> str:
+    """Return a new monotonic ULID, optionally as `<prefix>_<ulid>`"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = ULIDGenerator()
+    ulid = _generator.new()
+    return f"{prefix}_{ulid}" if prefix else ulid
+
+
+__all__ = ["ULIDGenerator", "new_id", "ulid_timestamp"]
@@ -0,0 +1,709 @@
+"""ingest.py
+Document ingestion pipeline for A.K.A.S.H.A. uploads.
+
+Detects the upload's kind from its content, extracts text (PDF text layer
+with selective OCR, DOCX/PPTX/XLSX sections, streamed plain text, image
+OCR, printable-strings fallback), chunks it and caches the result by
+content hash. It has no Streamlit dependency, so it runs equally in the
+app's script thread, the background job queue and worker processes.
+
+`process_batch` fans a batch of uploads out across a process pool and
+hands each file's result back as soon as it completes.
+"""
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Callable, Tuple
+from concurrent.futures import ProcessPoolExecutor, Future, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+import functools
+import io
+import multiprocessing
+import os
+import threading
+import time
+
+from config import CONFIG
+from logger import logger
+from ingest_cache import get_ingest_cache, cache_key, content_digest
+from document_loaders import (
+    decode_text, iter_blocks, file_digest, iter_text_segments, iter_chunks,
+    printable_strings, looks_like_text, pdf_pages_text, pdf_extract_pages,
+    PYPDF_AVAILABLE, PIL_AVAILABLE,
+)
+from office_loaders import ZIP_MAGIC, OFFICE_KINDS, detect_office_kind, iter_office_sections
+
+try:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+except Exception:
+    RecursiveCharacterTextSplitter = None
+
+try:
+    import easyocr
+    EASYOCR_AVAILABLE = True
+except Exception:
+    easyocr = None
+    EASYOCR_AVAILABLE = False
+
+try:
+    import pytesseract
+    PYTESSERACT_AVAILABLE = True
+except Exception:
+    pytesseract = None
+    PYTESSERACT_AVAILABLE = False
+
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except Exception:
+    fitz = None
+    PYMUPDF_AVAILABLE = False
+
+# Default OCR languages (comma-separated env var)
+_OCR_LANGS = os.getenv('OCR_LANGS', 'en,hi').split(',')
+
+# EasyOCR readers load their models on construction; keep one per language set
+_easyocr_readers = {}
+_easyocr_lock = threading.Lock()
+
+
+def _get_easyocr_reader(langs):
+    key = tuple(langs)
+    with _easyocr_lock:
+        reader = _easyocr_readers.get(key)
+        if reader is None:
+            reader = easyocr.Reader(list(langs), gpu=False)
+            _easyocr_readers[key] = reader
+        return reader
+
+
+def _ocr_image_bytes(raw_bytes, langs=None):
+    """Extract text from encoded image bytes (PNG, JPEG, ...); see `_ocr_image`"""
+    try:
+        from PIL import Image
+        im = Image.open(io.BytesIO(raw_bytes)).convert('RGB')
+    except Exception:
+        return ''
+    return _ocr_image(im, langs)
+
+
+def _ocr_image(im, langs=None):
+    """Extract text from a PIL image using EasyOCR (preferred) then pytesseract fallback.
+    Returns the extracted Unicode text. Grayscale images are passed through as-is.
+    """
+    langs = langs or _OCR_LANGS
+    text_parts = []
+    # Try EasyOCR first
+    if EASYOCR_AVAILABLE:
+        try:
+            import numpy as np
+            reader = _get_easyocr_reader(langs)
+            # EasyOCR takes numpy arrays, not PIL images
+            results = reader.readtext(np.asarray(im))
+            # results: list of (bbox, text, confidence) or (bbox, text)
+            for r in results:
+                # r[1] is the text
+                if isinstance(r, (list, tuple)) and len(r) >= 2:
+                    text_parts.append(r[1])
+            if text_parts:
+                return '\n'.join(text_parts)
+        except Exception:
+            pass
+
+    # Fallback to pytesseract if available
+    if PYTESSERACT_AVAILABLE:
+        try:
+            # pytesseract expects language codes like 'eng'/'hin' — default to eng
+            t_lang = 'eng'
+            if langs:
+                # map first lang heuristically
+                first = langs[0].strip()
+                if first == 'hi':
+                    t_lang = 'hin'
+            return pytesseract.image_to_string(im, lang=t_lang)
+        except Exception:
+            pass
+
+    # Last resort: return empty string
+    return ''
+
+
+def _looks_like_pdf(header: bytes) -> bool:
+    return header.startswith(b"%PDF")
+
+def _looks_like_text(sample: bytes) -> bool:
+    # Heuristic: >= 85% printable characters
+    return looks_like_text(sample, threshold=0.85)
+
+def _detect_file_kind(name: str, data: bytes) -> Optional[str]:
+    n = (name or "").lower()
+    head = data[:8]
+    if n.endswith(".pdf") or _looks_like_pdf(head):
+        return "pdf"
+    # DOCX/PPTX/XLSX by content (zip magic + parts), whatever the extension
+    if head.startswith(ZIP_MAGIC):
+        office = detect_office_kind(data)
+        if office:
+            return office
+    if n.endswith(".txt") or _looks_like_text(data[:4096]):
+        return "txt"
+    # Common image extensions
+    if n.endswith(('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.bmp')):
+        return "image"
+    # OneNote types by extension (content is binary; we'll use best-effort extraction)
+    if n.endswith(".one"):
+        return "one"
+    if n.endswith(".onepkg"):
+        return "onepkg"
+    if n.endswith(".onetoc2"):
+        return "onetoc2"
+    return None
+
+def _strings_from_bytes(data: bytes, min_len: int = 5) -> str:
+    try:
+        return printable_strings(data, min_len=min_len)
+    except Exception:
+        return ""
+
+
+def _no_progress(stage: str, progress: float = 0.0) -> None:
+    pass
+
+
+def process_document(uploaded_file, progress=None, ocr_langs=None):
+    """Wrapper for document processing that extracts raw bytes and filename
+    and delegates to a cached helper which accepts primitive types (bytes,str).
+    This avoids Streamlit cache hashing issues with file-like objects.
+
+    `progress(stage, fraction)` is called as the pipeline moves through its
+    stages (it is the job's report callback when run from the ingest queue).
+    `ocr_langs` overrides the default OCR languages (OCR_LANGS).
+    """
+    if not uploaded_file:
+        return None
+
+    try:
+        filename = getattr(uploaded_file, 'name', 'uploaded') or 'uploaded'
+        # Plain text is streamed in bounded blocks; only formats whose parsers
+        # need random access (PDF, Office, images) are read whole.
+        if hasattr(uploaded_file, "seek") and hasattr(uploaded_file, "read"):
+            uploaded_file.seek(0)
+            header = uploaded_file.read(4096)
+            uploaded_file.seek(0)
+            if _detect_file_kind(filename, header) == "txt":
+                return _process_text_stream(uploaded_file, filename, progress, ocr_langs)
+        raw = uploaded_file.getvalue() if hasattr(uploaded_file, "getvalue") else uploaded_file.getbuffer()
+        raw_bytes = raw if isinstance(raw, bytes) else bytes(raw)
+        return _process_document_bytes(raw_bytes, filename, progress, ocr_langs)
+    except Exception as e:
+        try:
+            logger.error("Document processing wrapper error", error=str(e))
+        except Exception:
+            pass
+        return None
+
+
+# Chunking used by every extraction path (part of the ingestion cache key)
+DOC_CHUNK_SIZE = 1000
+DOC_CHUNK_OVERLAP = 200
+
+
+def _ingestion_config(filename: str, ocr_langs=None) -> Dict[str, Any]:
+    """Everything besides the bytes that can change extraction output"""
+    return {
+        'ext': Path(filename or '').suffix.lower(),
+        'chunk_size': DOC_CHUNK_SIZE,
+        'chunk_overlap': DOC_CHUNK_OVERLAP,
+        'ocr_binarize': CONFIG.ocr_binarize,
+        'ocr_langs': list(ocr_langs or _OCR_LANGS),
+        'backends': {
+            'langchain': bool(RecursiveCharacterTextSplitter is not None),
+            'pypdf': PYPDF_AVAILABLE,
+            'pymupdf': PYMUPDF_AVAILABLE,
+            'easyocr': EASYOCR_AVAILABLE,
+            'tesseract': PYTESSERACT_AVAILABLE,
+        },
+    }
+
+
+def _process_document_bytes(raw_bytes: bytes, filename: str, progress=None, ocr_langs=None):
+    """Process raw upload bytes through the persistent ingestion cache.
+
+    The key is the SHA-256 of the bytes plus the pipeline version and
+    `_ingestion_config`, so a re-upload in any session, or after a restart,
+    skips extraction entirely. Returns the same structure as the original
+    `process_document`.
+    """
+    cache = get_ingest_cache()
+    key = cache_key(content_digest(raw_bytes), _ingestion_config(filename, ocr_langs))
+    cached = cache.get(key)
+    if cached is not None:
+        try:
+            logger.info("Ingestion cache hit", filename=filename, chunks=len(cached.get("chunks", [])))
+        except Exception:
+            pass
+        return cached
+    result = _extract_document_bytes(raw_bytes, filename, progress, ocr_langs)
+    if result is not None:
+        cache.put(key, result)
+    return result
+
+
+def iter_text_chunks(fileobj, progress=None):
+    """Yield the non-empty chunks of a text upload as they are produced.
+
+    Blocks are decoded and split incrementally, so the decoded text is never
+    materialized as one string and a consumer can index each chunk as soon
+    as it is yielded. The source bytes are only read block by block from
+    `fileobj`; whether they are resident (a Streamlit `UploadedFile` is an
+    in-memory buffer) is up to the caller.
+    """
+    splitter = None
+    if RecursiveCharacterTextSplitter is not None:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=DOC_CHUNK_SIZE,
+            chunk_overlap=DOC_CHUNK_OVERLAP,
+            length_function=len
+        )
+    report = progress or _no_progress
+    total = getattr(fileobj, 'size', None) or 0
+
+    def blocks():
+        done = 0
+        for block in iter_blocks(fileobj):
+            done += len(block)
+            report("chunk", done / total if total else 0.0)
+            yield block
+
+    segments = iter_text_segments(blocks())
+    for chunk in iter_chunks(segments, DOC_CHUNK_SIZE, DOC_CHUNK_OVERLAP, splitter=splitter):
+        if chunk.strip():
+            yield chunk
+
+
+def _process_text_stream(fileobj, filename: str, progress=None, ocr_langs=None):
+    """Cached ingestion of a text upload via `iter_text_chunks`.
+
+    No extra copy of the bytes and no full decoded string is made, but the
+    resulting chunk list is collected for the cache and the caller's
+    `text_content`.
+    """
+    cache = get_ingest_cache()
+    key = cache_key(file_digest(fileobj), {**_ingestion_config(filename, ocr_langs), 'mode': 'stream'})
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    chunk_texts = list(iter_text_chunks(fileobj, progress)) or ['(no extractable text found)']
+    result = {
+        "type": "simple",
+        "chunks": chunk_texts,
+        "text_content": chunk_texts
+    }
+    cache.put(key, result)
+    return result
+
+
+def _extract_pdf(raw_bytes: bytes, report, ocr_langs=None):
+    """PDF extraction: text layer per page, OCR only for scanned pages.
+
+    Chunks never span pages; `pages` holds each chunk's 1-based page number.
+    """
+    ocr = None
+    if PIL_AVAILABLE and (EASYOCR_AVAILABLE or PYTESSERACT_AVAILABLE):
+        ocr = functools.partial(_ocr_image, langs=ocr_langs)
+    pages = pdf_extract_pages(raw_bytes, ocr=ocr, binarize=CONFIG.ocr_binarize, progress=report)
+    report("chunk", 0.0)
+    splitter = None
+    if RecursiveCharacterTextSplitter is not None:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=DOC_CHUNK_SIZE,
+            chunk_overlap=DOC_CHUNK_OVERLAP,
+            length_function=len
+        )
+    chunk_texts, chunk_pages = [], []
+    for page in pages:
+        for chunk in iter_chunks([page.text], DOC_CHUNK_SIZE, DOC_CHUNK_OVERLAP, splitter=splitter):
+            if chunk.strip():
+                chunk_texts.append(chunk)
+                chunk_pages.append(page.number)
+    if not chunk_texts:
+        # Neither the text layer nor OCR found anything
+        raw_text = _strings_from_bytes(raw_bytes) or '(no extractable text found)'
+        chunk_texts = list(iter_chunks([raw_text], DOC_CHUNK_SIZE, DOC_CHUNK_OVERLAP))
+        chunk_pages = [None] * len(chunk_texts)
+    try:
+        logger.info("PDF extracted", pages=len(pages), ocr_pages=sum(p.ocr for p in pages),
+                    chunks=len(chunk_texts))
+    except Exception:
+        pass
+    return {
+        "type": "simple",
+        "chunks": chunk_texts,
+        "text_content": chunk_texts,
+        "pages": chunk_pages
+    }
+
+
+def _extract_office(raw_bytes: bytes, kind: str, report):
+    """DOCX/PPTX/XLSX extraction, section by section.
+
+    Sections (headings, tables, headers/footers, slides, speaker notes,
+    sheet row blocks) are streamed and chunked one at a time; chunks never
+    span sections and `sections` holds each chunk's section label.
+    """
+    report("extract", 0.0)
+    splitter = None
+    if RecursiveCharacterTextSplitter is not None:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=DOC_CHUNK_SIZE,
+            chunk_overlap=DOC_CHUNK_OVERLAP,
+            length_function=len
+        )
+    chunk_texts, chunk_sections = [], []
+    for section in iter_office_sections(raw_bytes, kind):
+        report("chunk", 0.0)
+        for chunk in iter_chunks([section.text], DOC_CHUNK_SIZE, DOC_CHUNK_OVERLAP, splitter=splitter):
+            if chunk.strip():
+                chunk_texts.append(chunk)
+                chunk_sections.append(section.label)
+    if not chunk_texts:
+        chunk_texts, chunk_sections = ['(no extractable text found)'], [None]
+    return {
+        "type": "simple",
+        "chunks": chunk_texts,
+        "text_content": chunk_texts,
+        "sections": chunk_sections
+    }
+
+
+def _extract_document_bytes(raw_bytes: bytes, filename: str, progress=None, ocr_langs=None):
+    """Core document processing which operates on raw bytes and filename"""
+    report = progress or _no_progress
+    try:
+        kind = _detect_file_kind(filename, raw_bytes)
+        if not kind:
+            try:
+                logger.warning("Upload rejected: unknown kind", filename=filename, size=len(raw_bytes))
+            except Exception:
+                pass
+            return None
+
+        safe_name = filename
+        if kind == "pdf" and not safe_name.lower().endswith(".pdf"):
+            safe_name += ".pdf"
+        if kind == "txt" and not safe_name.lower().endswith(".txt"):
+            safe_name += ".txt"
+        ext = Path(safe_name).suffix.lower()
+
+        # Choose loader & splitter. All loaders parse the in-memory bytes;
+        # nothing is written to uploads/.
+        try:
+            if kind == "pdf" and PYMUPDF_AVAILABLE:
+                return _extract_pdf(raw_bytes, report, ocr_langs)
+            if kind in OFFICE_KINDS:
+                return _extract_office(raw_bytes, kind, report)
+            # Only use the LangChain splitter path for PDF or text files; images
+            # should go through the manual/OCR fallback path.
+            if (RecursiveCharacterTextSplitter is not None and kind in ("pdf", "txt")
+                    and (kind == "txt" or PYPDF_AVAILABLE or PYMUPDF_AVAILABLE)):
+                report("extract", 0.1)
+                if kind == "pdf":
+                    pages = pdf_pages_text(raw_bytes)
+                else:
+                    pages = [decode_text(raw_bytes)]
+                report("chunk", 0.0)
+
+                text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=DOC_CHUNK_SIZE,
+                    chunk_overlap=DOC_CHUNK_OVERLAP,
+                    length_function=len
+                )
+                chunk_texts = [c for page in pages for c in text_splitter.split_text(page)]
+
+                # If LangChain produced no chunks (e.g. scanned PDF with no extractable
+                # text), fall back to manual extraction/OCR so we still return at least
+                # one chunk.
+                if not chunk_texts:
+                    raw_text = _strings_from_bytes(raw_bytes) or '(no extractable text found)'
+
+                    # Create at least one chunk (plain strings)
+                    chunk_size = DOC_CHUNK_SIZE
+                    overlap = DOC_CHUNK_OVERLAP
+                    chunk_texts = []
+                    i = 0
+                    while i < len(raw_text):
+                        part = raw_text[i:i+chunk_size]
+                        chunk_texts.append(part)
+                        i += (chunk_size - overlap)
+
+                # Vector store (best effort)
+                # Return simple, pickleable structures (lists of strings)
+                return {
+                    "type": "simple",
+                    "chunks": chunk_texts,
+                    "text_content": chunk_texts
+                }
+            else:
+                # Simple fallback: try multiple extractors (text, office, OCR).
+                # Printable strings are scanned once and reused as the last resort.
+                report("extract", 0.1)
+                strings_text = _strings_from_bytes(raw_bytes)
+                raw_text = strings_text
+
+                # If no plain text found, try format-specific extraction
+                if not raw_text:
+                    # Images - attempt OCR
+                    if ext in ('.png', '.jpg', '.jpeg', '.gif', '.tiff', '.bmp'):
+                        try:
+                            report("ocr", 0.0)
+                            raw_text = _ocr_image_bytes(raw_bytes, ocr_langs)
+                        except Exception:
+                            raw_text = ""
+                    else:
+                        raw_text = decode_text(raw_bytes)
+
+                # Ensure at least one chunk exists (avoid empty-chunk bug)
+                if not raw_text or len(raw_text.strip()) == 0:
+                    # Try extracting printable strings as a last resort
+                    if strings_text and strings_text.strip():
+                        raw_text = strings_text
+                    else:
+                        # For images or binary PDFs where OCR is unavailable,
+                        # provide a helpful placeholder indicating why no text
+                        if kind == 'image':
+                            raw_text = '(image file - no OCR backend installed or OCR returned empty)'
+                        else:
+                            raw_text = '(no extractable text found)'
+
+                report("chunk", 0.0)
+                chunk_size = DOC_CHUNK_SIZE
+                overlap = DOC_CHUNK_OVERLAP
+                chunk_texts = []
+                i = 0
+                while i < len(raw_text):
+                    part = raw_text[i:i+chunk_size]
+                    chunk_texts.append(part)
+                    i += (chunk_size - overlap)
+
+                return {
+                    "type": "simple",
+                    "chunks": chunk_texts,
+                    "text_content": chunk_texts
+                }
+        except Exception as e:
+            try:
+                logger.warning("Document processing fallback error", error=str(e))
+            except Exception:
+                pass
+            return None
+    except Exception as e:
+        try:
+            logger.error("Document processing error", error=str(e))
+        except Exception:
+            pass
+        return None
+
+
+# === Batch ingestion ===
+
+class UploadBuffer(io.BytesIO):
+    """In-memory upload with the `name`/`size` attributes of a Streamlit upload"""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+@dataclass
+class FileResult:
+    """Outcome of processing one file of a batch"""
+    name: str
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    elapsed_s: float = 0.0
+    size: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.result is not None
+
+
+@dataclass
+class BatchReport:
+    """Per-file results of a batch, in completion order"""
+    files: List[FileResult] = field(default_factory=list)
+    elapsed_s: float = 0.0
+
+    @property
+    def failed(self) -> List[FileResult]:
+        return [f for f in self.files if not f.ok]
+
+    def summary(self) -> str:
+        ok = len(self.files) - len(self.failed)
+        return (f"{ok}/{len(self.files)} files processed in {self.elapsed_s:.1f}s"
+                + (f", {len(self.failed)} failed" if self.failed else ""))
+
+
+def _process_file(name: str, data: bytes, ocr_langs=None) -> FileResult:
+    """Worker entry point: process one upload; never raises"""
+    t0 = time.perf_counter()
+    try:
+        result = process_document(UploadBuffer(data, name), ocr_langs=ocr_langs)
+        error = None if result is not None else "no extractable content or unsupported file type"
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    return FileResult(name, result, error, round(time.perf_counter() - t0, 3), len(data))
+
+
+_batch_pool: Optional[ProcessPoolExecutor] = None
+_batch_pool_lock = threading.Lock()
+
+
+def _pool_workers() -> int:
+    return CONFIG.ingest_processes or os.cpu_count() or 2
+
+
+def _new_pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned rather than forked: the app process runs threads (KB warm-up,
+    # job queue) that must not be duplicated mid-operation
+    return ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context("spawn"))
+
+
+def get_batch_pool() -> ProcessPoolExecutor:
+    """Shared process pool for batch ingestion (INGEST_PROCESSES, default: all cores)"""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = _new_pool(_pool_workers())
+        return _batch_pool
+
+
+def _discard_batch_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken shared pool so the next batch gets a fresh one.
+
+    Only the pool that broke is replaced (another batch may already have
+    done it), and nothing is cancelled: its futures have already failed.
+    """
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False)
+
+
+def process_batch(files: List[Tuple[str, bytes]], progress=None, emit: Optional[Callable[[FileResult], None]] = None,
+                  ocr_langs=None, executor=None, worker: Callable[..., FileResult] = None) -> BatchReport:
+    """Process many uploads in parallel, reporting each file as it completes.
+
+    `files` are (name, bytes) pairs. Extraction fans out over `executor`
+    (the shared process pool by default); `emit(FileResult)` is called in
+    completion order so callers can merge finished files while the rest
+    are still running. `worker(name, data, ocr_langs)` runs in the pool
+    for each file (default: the normal pipeline).
+
+    A file that fails is reported as failed without stopping the others.
+    A file that crashes its worker process breaks the pool, failing every
+    file still in it; those are retried in parallel on a private pool, and
+    groups that crash again are split in half until the crashing file runs
+    alone and is reported as failed.
+    """
+    report = progress or _no_progress
+    worker = worker or _process_file
+    batch = BatchReport()
+    t0 = time.perf_counter()
+    total = len(files)
+
+    def finish(res: FileResult) -> None:
+        batch.files.append(res)
+        if emit:
+            emit(res)
+        try:
+            logger.info("Batch file processed", filename=res.name, ok=res.ok,
+                        elapsed_s=res.elapsed_s, error=res.error)
+        except Exception:
+            pass
+        report("extract", len(batch.files) / total)
+
+    def run(pool, group: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+        """Run `group` on `pool`; returns the files lost to a worker crash"""
+        futures: Dict[Future, Tuple[str, bytes]] = {
+            pool.submit(worker, name, data, ocr_langs): (name, data) for name, data in group
+        }
+        crashed: List[Tuple[str, bytes]] = []
+        try:
+            for future in as_completed(futures):
+                try:
+                    res = future.result()
+                except Exception:
+                    crashed.append(futures[future])
+                    continue
+                finish(res)
+        finally:
+            for future in futures:
+                future.cancel()
+        return crashed
+
+    pool = executor or get_batch_pool()
+    crashed = run(pool, files)
+    if crashed and executor is None:
+        _discard_batch_pool(pool)
+
+    # Most files of a crashed pool are collateral: retry them all at once,
+    # bisecting only the groups that crash again
+    groups = [crashed] if crashed else []
+    while groups:
+        group = groups.pop()
+        retry_pool = _new_pool(min(len(group), _pool_workers()))
+        try:
+            lost = run(retry_pool, group)
+        finally:
+            retry_pool.shutdown(wait=False, cancel_futures=True)
+        if len(lost) == 1 and len(group) == 1:
+            name, data = lost[0]
+            finish(FileResult(name, error="worker process crashed", size=len(data)))
+        elif lost:
+            half = (len(lost) + 1) // 2
+            groups += [g for g in (lost[half:], lost[:half]) if g]
+    batch.elapsed_s = round(time.perf_counter() - t0, 3)
+    return batch
+
+
+def merge_into_corpus(corpus: Optional[Dict[str, Any]], name: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Add one processed file to a session corpus, replacing an older copy.
+
+    The corpus has the same shape as a single document result, plus
+    `sources` naming the file each chunk came from; per-chunk `pages` and
+    `sections` stay aligned with the chunks.
+    """
+    keys = ("text_content", "sources", "pages", "sections")
+    merged: Dict[str, Any] = {"type": "simple", **{k: [] for k in keys}}
+    if corpus:
+        old = corpus.get("text_content", [])
+        sources = corpus.get("sources") or [None] * len(old)
+        for i, text in enumerate(old):
+            if sources[i] == name:
+                continue
+            merged["text_content"].append(text)
+            merged["sources"].append(sources[i])
+            for k in ("pages", "sections"):
+                merged[k].append((corpus.get(k) or [None] * len(old))[i])
+    new = result.get("text_content") or result.get("chunks") or []
+    merged["text_content"].extend(new)
+    merged["sources"].extend([name] * len(new))
+    for k in ("pages", "sections"):
+        merged[k].extend(result.get(k) or [None] * len(new))
+    merged["chunks"] = merged["text_content"]
+    return merged
+
+
+__all__ = [
+    "process_document",
+    "iter_text_chunks",
+    "process_batch",
+    "merge_into_corpus",
+    "get_batch_pool",
+    "BatchReport",
+    "FileResult",
+    "UploadBuffer",
+]
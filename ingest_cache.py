@@ -0,0 +1,184 @@
+"""ingest_cache.py
+Persistent, content-addressed cache for document ingestion results.
+
+Entries are keyed by the SHA-256 of the uploaded bytes together with the
+ingestion pipeline version and its configuration (chunking settings,
+available extraction backends, ...), so re-uploading a document skips
+extraction across sessions, restarts and worker processes, while any change
+to the pipeline produces a different key instead of serving stale chunks.
+
+Each entry is one zlib-compressed JSON file under `cache/ingest/`, written
+atomically. The directory is kept under a size cap by evicting the least
+recently used entries (hits refresh the file's mtime). The total size is
+tracked incrementally, so a write only scans the directory when the cap is
+exceeded, plus every `RESCAN_EVERY` writes to pick up entries written by
+other processes.
+"""
+from __future__ import annotations
+from typing import Dict, Any, Optional
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+INGEST_CACHE_DIR = "cache/ingest"
+# Bump whenever extraction or chunking changes in a way that alters output
+PIPELINE_VERSION = 5
+_SUFFIX = ".json.z"
+# Writes between directory rescans that resync the size estimate
+RESCAN_EVERY = 256
+
+
+def content_digest(data: bytes) -> str:
+    """SHA-256 hex digest of raw upload bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(digest: str, config: Optional[Dict[str, Any]] = None,
+              version: int = PIPELINE_VERSION) -> str:
+    """Combine a content digest with the pipeline version and config"""
+    extra = json.dumps({'v': version, 'config': config or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{digest}:{extra}".encode('utf-8')).hexdigest()
+
+
+class IngestionCache:
+    """On-disk LRU cache of ingestion results, bounded by total size"""
+
+    def __init__(self, directory: str = INGEST_CACHE_DIR, max_bytes: int = 100 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Estimated bytes on disk; None until the first scan
+        self._size: Optional[int] = None
+        self._puts_since_scan = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.directory / key[:2] / f"{key}{_SUFFIX}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for `key`, or None"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = json.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, zlib.error):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]) -> bool:
+        """Store a JSON-serializable result; returns False if it can't be cached"""
+        try:
+            data = zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'), 6)
+        except (TypeError, ValueError):
+            return False
+        if self.max_bytes and len(data) > self.max_bytes:
+            return False
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return False
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+            self._puts_since_scan += 1
+        self._evict()
+        return True
+
+    def _entries(self):
+        for path in self.directory.glob(f"*/*{_SUFFIX}"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            yield path, st.st_size, st.st_mtime
+
+    def size_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        with self._lock:
+            stale = self._size is None or self._puts_since_scan >= RESCAN_EVERY
+            if not stale and self._size <= self.max_bytes:
+                return
+            entries = list(self._entries())
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for path, size, _ in sorted(entries, key=lambda e: e[2]):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        continue
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            self._size = total
+            self._puts_since_scan = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._size = 0
+            self._puts_since_scan = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        entries = list(self._entries())
+        return {
+            'entries': len(entries),
+            'size_mb': round(sum(size for _, size, _ in entries) / (1024 * 1024), 2),
+            'max_mb': round(self.max_bytes / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_ingest_cache: Optional[IngestionCache] = None
+
+
+def get_ingest_cache() -> IngestionCache:
+    """Get or create the ingestion cache singleton"""
+    global _ingest_cache
+    if _ingest_cache is None:
+        from config import CONFIG
+        _ingest_cache = IngestionCache(max_bytes=CONFIG.max_cache_size_mb * 1024 * 1024)
+    return _ingest_cache
+
+
+__all__ = [
+    "IngestionCache",
+    "get_ingest_cache",
+    "content_digest",
+    "cache_key",
+    "PIPELINE_VERSION",
+]
@@ -0,0 +1,196 @@
+"""ingest_jobs.py
+Background ingestion job queue for A.K.A.S.H.A.
+
+Document processing (parsing, OCR, chunking) runs on a small worker pool
+instead of inside the user's Streamlit script run. `submit` returns an
+`IngestJob` immediately; the UI polls it by ID for its stage and progress
+and can cancel it, so a session keeps chatting over already-indexed
+documents while a large upload finishes. The pool size caps how many heavy
+jobs run at once across all sessions; further jobs wait in the queue.
+
+Job functions receive a `report(stage, progress)` callback. Calling it after
+`cancel()` raises `JobCancelled`, which stops the job at its next report.
+Jobs submitted with `partial=True` also get an `emit(item)` callback for
+results that are ready before the whole job is (e.g. one file of a batch);
+the UI collects them with `drain()`.
+"""
+from __future__ import annotations
+from typing import Dict, Any, Optional, Callable, List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import threading
+import time
+
+from ids import new_id
+
+# Stages in pipeline order; a job reports whichever ones apply to it
+STAGES = ("queued", "extract", "ocr", "chunk", "embed", "index", "done")
+# Finished jobs kept for polling before the oldest are forgotten
+MAX_FINISHED_JOBS = 200
+
+ProgressCallback = Callable[[str, float], None]
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job when it has been cancelled.
+
+    Derives from BaseException (like KeyboardInterrupt) so the pipeline's
+    best-effort `except Exception` fallbacks don't swallow it.
+    """
+    pass
+
+
+@dataclass
+class IngestJob:
+    """State of one ingestion job, safe to read from any thread"""
+    name: str
+    job_id: str = field(default_factory=new_id)
+    state: str = "queued"  # queued | running | done | failed | cancelled
+    stage: str = "queued"
+    progress: float = 0.0
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _outputs: List[Any] = field(default_factory=list, repr=False)
+    _outputs_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, stage: str, progress: float = 0.0) -> None:
+        """Record the current stage and its progress (0..1)"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.job_id)
+        self.stage = stage
+        self.progress = max(0.0, min(1.0, progress))
+
+    def emit(self, item: Any) -> None:
+        """Publish a partial result for the poller"""
+        with self._outputs_lock:
+            self._outputs.append(item)
+
+    def drain(self) -> List[Any]:
+        """Return and forget the partial results emitted since the last drain"""
+        with self._outputs_lock:
+            items, self._outputs = self._outputs, []
+        return items
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.job_id,
+            'name': self.name,
+            'state': self.state,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'error': self.error,
+            'elapsed_s': round(end - (self.started_at or end), 2),
+            'wait_s': round((self.started_at or end) - self.created_at, 2),
+        }
+
+
+class IngestionQueue:
+    """Thread pool running ingestion jobs, with lookup by job ID"""
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, fn: Callable[..., Any], *args, partial: bool = False, **kwargs) -> IngestJob:
+        """Queue `fn(*args, progress=job.report, **kwargs)` and return its job.
+
+        With `partial=True`, `fn` is also passed `emit=job.emit`.
+        """
+        job = IngestJob(name=name)
+        if partial:
+            kwargs['emit'] = job.emit
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._forget_finished()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: IngestJob, fn: Callable[..., Any], args, kwargs) -> None:
+        if job.cancel_requested:
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            return
+        job.state = "running"
+        job.started_at = time.time()
+        try:
+            job.report("extract", 0.0)
+            job.result = fn(*args, progress=job.report, **kwargs)
+            job.report("done", 1.0)
+            job.state = "done"
+        except JobCancelled:
+            job.state = "cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.state = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _forget_finished(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j.finished]
+        for jid in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[jid]
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Request cancellation; returns False if the job is unknown or finished"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        return True
+
+    def jobs(self, job_ids: Optional[List[str]] = None) -> List[IngestJob]:
+        with self._lock:
+            if job_ids is None:
+                return list(self._jobs.values())
+            return [self._jobs[j] for j in job_ids if j in self._jobs]
+
+    def get_stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs():
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return {'max_workers': self.max_workers, **counts}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_ingest_queue: Optional[IngestionQueue] = None
+
+
+def get_ingest_queue() -> IngestionQueue:
+    """Get or create the ingestion queue singleton"""
+    global _ingest_queue
+    if _ingest_queue is None:
+        from config import CONFIG
+        _ingest_queue = IngestionQueue(max_workers=CONFIG.ingest_workers)
+    return _ingest_queue
+
+
+__all__ = [
+    "IngestJob",
+    "IngestionQueue",
+    "JobCancelled",
+    "get_ingest_queue",
+    "STAGES",
+]
@@ -0,0 +1,291 @@
+"""kb_format.py
+Binary snapshot format for the A.K.A.S.H.A. knowledge base.
+
+Layout (version 1, all integers little-endian):
+
+    header   magic b"AKBSNAP\\0", u16 version, u8 codec, u8 reserved,
+             u32 document count, then (u64 offset, u64 length) for the
+             metadata section and for the index section
+    blocks   document bodies packed into ~64 KB blocks, each compressed on
+             its own with the header's codec
+    metadata compressed JSON: per-document fields (everything except the
+             body) plus its (block, start, length) location, and the block
+             offset table
+    index    compressed: u64 JSON length, JSON with per-document index
+             slots and passage counts, the term list and posting counts,
+             then all postings as one int64 array, sorted and
+             delta-encoded per term, so search works without reading any
+             body
+
+Metadata and the index are read eagerly; bodies are read lazily, one block
+at a time, through `SnapshotReader.read_body`, with a small LRU of
+decompressed blocks. A reader keeps its file open, so a writer replacing
+that file first `suspend`s the reader and `retire`s it once the new file is
+in place (Windows cannot replace an open file). Content is compressed with zstd when `zstandard` is
+installed and zlib otherwise; the codec is recorded in the header so either
+reader can tell what it is opening.
+"""
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Mapping
+from collections import OrderedDict
+from array import array
+from itertools import accumulate
+import json
+import operator
+import struct
+import threading
+import zlib
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except Exception:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+
+MAGIC = b"AKBSNAP\0"
+FORMAT_VERSION = 1
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+BLOCK_SIZE = 64 * 1024
+BLOCK_CACHE_SIZE = 32
+# Fast setting: snapshots are rewritten on every KB change
+ZLIB_LEVEL = 1
+
+_HEADER = struct.Struct("<8sHBBIQQQQ")
+_U64 = struct.Struct("<Q")
+
+
+class SnapshotFormatError(Exception):
+    """Raised when a file is not a readable KB snapshot"""
+    pass
+
+
+def is_snapshot_file(path: str) -> bool:
+    """True if `path` starts with the binary snapshot magic"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _compress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(data: bytes, codec: int) -> bytes:
+    if codec == CODEC_ZSTD:
+        if not ZSTD_AVAILABLE:
+            raise SnapshotFormatError("Snapshot is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _encode_index(slots: List[int], chunk_counts: List[int], terms: Mapping[str, Iterable[int]]) -> bytes:
+    names = list(terms)
+    postings = array('q')
+    counts = []
+    for name in names:
+        codes = sorted(terms[name])
+        counts.append(len(codes))
+        # Deltas are small numbers, which compress far better than codes
+        postings.extend(codes[:1])
+        postings.extend(map(operator.sub, codes[1:], codes[:-1]))
+    header = json.dumps({
+        'slots': slots,
+        'chunk_counts': chunk_counts,
+        'terms': names,
+        'counts': counts,
+    }).encode('utf-8')
+    return _U64.pack(len(header)) + header + postings.tobytes()
+
+
+def write_snapshot(path: str, documents: Iterable[Tuple[Dict[str, Any], str]],
+                   slots: Optional[List[int]] = None, chunk_counts: Optional[List[int]] = None,
+                   terms: Optional[Mapping[str, Iterable[int]]] = None, codec: Optional[int] = None) -> int:
+    """Write documents as a binary snapshot; returns the number written.
+
+    `documents` yields (fields, body) pairs where `fields` is everything but
+    the content. `slots` and `chunk_counts` (per document, in the same
+    order) and `terms` (term -> int postings) make up the persisted search
+    index.
+    The caller is responsible for atomic replacement (write to a temporary
+    path, then `os.replace`).
+    """
+    codec = codec or (CODEC_ZSTD if ZSTD_AVAILABLE else CODEC_ZLIB)
+    entries: List[Dict[str, Any]] = []
+    blocks: List[Tuple[int, int]] = []
+    pending: List[bytes] = []
+    pending_size = 0
+
+    with open(path, 'wb') as f:
+        f.write(b"\0" * _HEADER.size)
+
+        def flush_block() -> None:
+            nonlocal pending_size
+            if not pending:
+                return
+            data = _compress(b"".join(pending), codec)
+            blocks.append((f.tell(), len(data)))
+            f.write(data)
+            pending.clear()
+            pending_size = 0
+
+        for fields, body in documents:
+            raw = body.encode('utf-8')
+            if pending_size and pending_size + len(raw) > BLOCK_SIZE:
+                flush_block()
+            entry = dict(fields)
+            entry['body'] = [len(blocks), pending_size, len(raw)]
+            entry['length'] = len(body)
+            entries.append(entry)
+            pending.append(raw)
+            pending_size += len(raw)
+        flush_block()
+
+        meta = _compress(json.dumps({'documents': entries, 'blocks': blocks}).encode('utf-8'), codec)
+        meta_offset = f.tell()
+        f.write(meta)
+        idx = _compress(_encode_index(slots or [], chunk_counts or [], terms or {}), codec)
+        idx_offset = f.tell()
+        f.write(idx)
+
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, codec, 0, len(entries),
+                             meta_offset, len(meta), idx_offset, len(idx)))
+    return len(entries)
+
+
+class SnapshotReleased(Exception):
+    """The reader was retired because its file was replaced"""
+    pass
+
+
+class SnapshotReader:
+    """Reads a binary snapshot: metadata and index eagerly, bodies on demand.
+
+    Keeps the file open so bodies can be read later. `suspend` closes it
+    (reads that need the disk wait), then `resume` reopens it or `retire`
+    makes those reads raise `SnapshotReleased`. Thread-safe.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._lock = threading.Lock()
+        self._reopened = threading.Condition(self._lock)
+        self._retired = False
+        self._cache: OrderedDict = OrderedDict()
+        try:
+            header = self._file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise SnapshotFormatError(f"{path}: truncated header")
+            (magic, version, self.codec, _, self.count,
+             meta_offset, meta_length, idx_offset, idx_length) = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise SnapshotFormatError(f"{path}: not a KB snapshot")
+            if version > FORMAT_VERSION:
+                raise SnapshotFormatError(f"{path}: snapshot version {version} is newer than supported")
+            self._meta_range = (meta_offset, meta_length)
+            self._index_range = (idx_offset, idx_length)
+            meta = json.loads(self._read_section(*self._meta_range))
+        except Exception:
+            self._file.close()
+            raise
+        self._documents: Optional[List[Dict[str, Any]]] = meta['documents']
+        self._blocks: List[Tuple[int, int]] = [tuple(b) for b in meta['blocks']]
+
+    def read_documents(self) -> List[Dict[str, Any]]:
+        """Per-document fields plus 'body' (block, start, length) and 'length'.
+
+        The list parsed on open is handed over on the first call rather than
+        kept, so the reader does not hold a second copy of the metadata.
+        """
+        documents, self._documents = self._documents, None
+        if documents is None:
+            documents = json.loads(self._read_section(*self._meta_range))['documents']
+        return documents
+
+    def _read_section(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            while self._file is None:
+                if self._retired:
+                    raise SnapshotReleased(self.path)
+                self._reopened.wait()
+            self._file.seek(offset)
+            data = self._file.read(length)
+        return _decompress(data, self.codec)
+
+    def read_index(self) -> Tuple[List[int], List[int], Dict[str, array]]:
+        """Load the persisted search index: (slots, chunk_counts, term -> postings)"""
+        data = self._read_section(*self._index_range)
+        (header_len,) = _U64.unpack_from(data)
+        header = json.loads(data[_U64.size:_U64.size + header_len])
+        postings = array('q')
+        postings.frombytes(data[_U64.size + header_len:])
+        terms: Dict[str, array] = {}
+        pos = 0
+        for name, count in zip(header['terms'], header['counts']):
+            terms[name] = array('q', accumulate(postings[pos:pos + count]))
+            pos += count
+        return header['slots'], header['chunk_counts'], terms
+
+    def _block(self, n: int) -> bytes:
+        with self._lock:
+            data = self._cache.get(n)
+            if data is not None:
+                self._cache.move_to_end(n)
+                return data
+        offset, length = self._blocks[n]
+        data = self._read_section(offset, length)
+        with self._lock:
+            self._cache[n] = data
+            while len(self._cache) > BLOCK_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return data
+
+    def read_body(self, location: Tuple[int, int, int]) -> str:
+        """Return the body stored at a document's (block, start, length)"""
+        block, start, length = location
+        return self._block(block)[start:start + length].decode('utf-8')
+
+    def suspend(self) -> None:
+        """Close the file so it can be replaced; disk reads wait meanwhile"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def resume(self) -> None:
+        """Reopen the (unchanged) file after a suspend"""
+        with self._lock:
+            if self._file is None and not self._retired:
+                self._file = open(self.path, 'rb')
+                self._reopened.notify_all()
+
+    def retire(self) -> None:
+        """The file was replaced: disk reads raise `SnapshotReleased` from now on"""
+        with self._lock:
+            self._retired = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._reopened.notify_all()
+
+    def close(self) -> None:
+        self.retire()
+
+
+__all__ = [
+    "SnapshotReader",
+    "SnapshotReleased",
+    "SnapshotFormatError",
+    "write_snapshot",
+    "is_snapshot_file",
+    "ZSTD_AVAILABLE",
+]
@@ -0,0 +1,326 @@
+"""kb_import.py
+Bulk Knowledge Base import for A.K.A.S.H.A.
+
+Walks a directory, zip or tar archive (archives found inside directories are
+walked too), extracts text from every supported file in a worker pool,
+skips content already in the KB (by normalized content hash), and adds
+documents in batches with one `save_to_disk` per batch.
+
+Usage:
+    python kb_import.py ./help_center --category FAQ --workers 8
+    python kb_import.py articles.zip --tags docs howto
+"""
+from __future__ import annotations
+from typing import List, Any, Optional, Iterator, Callable, Tuple, Deque
+from dataclasses import dataclass, field
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from pathlib import Path, PurePosixPath
+import argparse
+import html
+import io
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+
+from dedup import NearDuplicateIndex
+from ids import new_id
+from knowledge_base import KBDocument, KnowledgeBaseStore, content_hash
+
+TEXT_EXTENSIONS = {'.txt', '.md', '.markdown', '.rst'}
+HTML_EXTENSIONS = {'.html', '.htm'}
+PDF_EXTENSIONS = {'.pdf'}
+SUPPORTED_EXTENSIONS = TEXT_EXTENSIONS | HTML_EXTENSIONS | PDF_EXTENSIONS
+
+# Files larger than this are skipped rather than read into memory
+MAX_FILE_BYTES = 50 * 1024 * 1024
+
+_TAG_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_HTML_TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+_MD_HEADING_RE = re.compile(r"^\s*#\s+(.+?)\s*#*\s*$", re.MULTILINE)
+
+
+@dataclass
+class ImportSource:
+    """A file to import: display name, folder it came from, and a byte reader"""
+    name: str
+    folder: str
+    size: int
+    read: Callable[[], bytes]
+
+
+@dataclass
+class ImportStats:
+    """Progress and outcome of a bulk import"""
+    files_seen: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    failed: int = 0
+    bytes_read: int = 0
+    batches: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files_seen / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_read / (1024 * 1024) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.files_seen} files: {self.imported} imported, {self.duplicates} duplicates, "
+            f"{self.skipped} skipped, {self.failed} failed in {self.elapsed:.1f}s "
+            f"({self.files_per_second:.1f} files/s, {self.mb_per_second:.2f} MB/s)"
+        )
+
+
+def _is_archive(name: str) -> bool:
+    lower = name.lower()
+    return lower.endswith(('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz'))
+
+
+def _supported(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower() in SUPPORTED_EXTENSIONS
+
+
+def _iter_zip(data_or_path: Any, prefix: str) -> Iterator[ImportSource]:
+    with zipfile.ZipFile(data_or_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _supported(info.filename):
+                continue
+            member = info.filename
+            yield ImportSource(
+                name=f"{prefix}/{member}",
+                folder=str(PurePosixPath(member).parent),
+                size=info.file_size,
+                read=lambda zf=zf, member=member: zf.read(member),
+            )
+
+
+def _iter_tar(data_or_path: Any, prefix: str) -> Iterator[ImportSource]:
+    if isinstance(data_or_path, bytes):
+        tf = tarfile.open(fileobj=io.BytesIO(data_or_path), mode="r:*")
+    else:
+        tf = tarfile.open(data_or_path, mode="r:*")
+    with tf:
+        for info in tf:
+            if not info.isfile() or not _supported(info.name):
+                continue
+            # Read eagerly: streamed tar members are only readable in order
+            data = tf.extractfile(info).read() if info.size <= MAX_FILE_BYTES else b""
+            yield ImportSource(
+                name=f"{prefix}/{info.name}",
+                folder=str(PurePosixPath(info.name).parent),
+                size=info.size,
+                read=lambda data=data: data,
+            )
+
+
+def iter_sources(path: str) -> Iterator[ImportSource]:
+    """Yield importable files under a directory, zip or tar archive"""
+    root = Path(path)
+    if root.is_file():
+        if zipfile.is_zipfile(root):
+            yield from _iter_zip(str(root), root.name)
+        elif tarfile.is_tarfile(root):
+            yield from _iter_tar(str(root), root.name)
+        elif _supported(root.name):
+            yield ImportSource(name=root.name, folder=".", size=root.stat().st_size, read=root.read_bytes)
+        return
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            file_path = Path(dirpath) / filename
+            rel = file_path.relative_to(root).as_posix()
+            if _is_archive(filename):
+                yield from iter_sources(str(file_path))
+            elif _supported(filename):
+                yield ImportSource(
+                    name=rel,
+                    folder=str(PurePosixPath(rel).parent),
+                    size=file_path.stat().st_size,
+                    read=file_path.read_bytes,
+                )
+
+
+def extract_text(name: str, data: bytes) -> Tuple[str, str]:
+    """Extract (title, text) from file bytes based on the extension.
+
+    Runs inside the worker pool, so it must stay a picklable top-level function.
+    """
+    suffix = PurePosixPath(name).suffix.lower()
+    title = PurePosixPath(name).stem.replace('_', ' ').replace('-', ' ').strip()
+    if suffix in PDF_EXTENSIONS:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("pypdf not installed")
+        reader = PdfReader(io.BytesIO(data))
+        text = "\n".join(page.extract_text() or "" for page in reader.pages)
+        meta_title = getattr(reader.metadata, 'title', None) if reader.metadata else None
+        return (meta_title or title), text
+
+    text = data.decode('utf-8', errors='replace')
+    if suffix in HTML_EXTENSIONS:
+        match = _HTML_TITLE_RE.search(text)
+        if match and match.group(1).strip():
+            title = html.unescape(match.group(1).strip())
+        text = html.unescape(_TAG_RE.sub(" ", text))
+        text = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    elif suffix in {'.md', '.markdown'}:
+        match = _MD_HEADING_RE.search(text)
+        if match:
+            title = match.group(1)
+    return title, text
+
+
+def import_path(store: KnowledgeBaseStore, path: str, category: Optional[str] = None,
+                tags: Optional[List[str]] = None, workers: Optional[int] = None,
+                batch_size: int = 500, use_processes: bool = False,
+                progress: Optional[Callable[[ImportStats], None]] = None,
+                dedup: Optional[NearDuplicateIndex] = None) -> ImportStats:
+    """Import every supported file under `path` into `store`.
+
+    `category=None` uses each file's top-level folder name (falling back to
+    "General"). Extraction runs in a thread pool, or a process pool when
+    `use_processes` is set (better for large PDF collections). `progress` is
+    called after every batch is committed. With a `dedup` index, near-duplicates
+    of existing or earlier imported documents are skipped too, and new
+    documents are added to the index.
+    """
+    stats = ImportStats()
+    workers = workers or min(8, (os.cpu_count() or 2))
+    seen_hashes = {
+        doc.metadata.get('content_hash') or content_hash(doc.content)
+        for doc in store.snapshot.documents.values()
+    }
+    pending_docs: List[KBDocument] = []
+
+    def flush() -> None:
+        if not pending_docs:
+            return
+        store.add_documents(pending_docs)
+        store.save_to_disk()
+        stats.imported += len(pending_docs)
+        stats.batches += 1
+        pending_docs.clear()
+        if progress:
+            progress(stats)
+
+    def accept(source: ImportSource, title: str, text: str) -> None:
+        if not text.strip():
+            stats.skipped += 1
+            return
+        digest = content_hash(text)
+        if digest in seen_hashes:
+            stats.duplicates += 1
+            return
+        signature = dedup.signature(text) if dedup is not None else None
+        if signature is not None and dedup.find(signature=signature):
+            stats.duplicates += 1
+            return
+        seen_hashes.add(digest)
+        folder_category = source.folder.split('/')[0] if source.folder not in ('', '.') else None
+        doc_id = new_id()
+        if signature is not None:
+            dedup.add(doc_id, signature=signature)
+        pending_docs.append(KBDocument(
+            id=doc_id,
+            title=title or source.name,
+            content=text,
+            category=category or folder_category or "General",
+            tags=list(tags or []),
+            metadata={'source': source.name, 'content_hash': digest},
+        ))
+        if len(pending_docs) >= batch_size:
+            flush()
+
+    pool: Executor = (ProcessPoolExecutor if use_processes else ThreadPoolExecutor)(max_workers=workers)
+    in_flight: Deque[Tuple[Future, ImportSource]] = deque()
+
+    def drain(block_until: int) -> None:
+        # Collect extractions in submission order (so the first copy of a
+        # duplicate always wins) until at most `block_until` remain in flight
+        while len(in_flight) > block_until:
+            future, source = in_flight.popleft()
+            try:
+                title, text = future.result()
+            except Exception as e:
+                stats.failed += 1
+                stats.errors.append(f"{source.name}: {e}")
+                continue
+            accept(source, title, text)
+
+    try:
+        for source in iter_sources(path):
+            stats.files_seen += 1
+            if source.size > MAX_FILE_BYTES:
+                stats.skipped += 1
+                continue
+            try:
+                data = source.read()
+            except Exception as e:
+                stats.failed += 1
+                stats.errors.append(f"{source.name}: {e}")
+                continue
+            stats.bytes_read += len(data)
+            in_flight.append((pool.submit(extract_text, source.name, data), source))
+            # Bound memory held by queued file contents
+            drain(block_until=workers * 4)
+        drain(block_until=0)
+        flush()
+    finally:
+        pool.shutdown(wait=True)
+    stats.finished_at = time.time()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import files into the A.K.A.S.H.A. knowledge base")
+    parser.add_argument("path", help="Directory, .zip or .tar(.gz) archive to import")
+    parser.add_argument("--category", default=None, help="Category for all documents (default: top-level folder name)")
+    parser.add_argument("--tags", nargs="*", default=[], help="Tags to add to every document")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction workers")
+    parser.add_argument("--batch-size", type=int, default=500, help="Documents per index update/save")
+    parser.add_argument("--processes", action="store_true", help="Use a process pool (faster for PDFs)")
+    args = parser.parse_args(argv)
+
+    if not Path(args.path).exists():
+        print(f"❌ Path not found: {args.path}")
+        return 1
+
+    from knowledge_base import get_kb_manager
+    manager = get_kb_manager()
+    stats = manager.import_path(
+        args.path,
+        category=args.category,
+        tags=args.tags,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        use_processes=args.processes,
+        progress=lambda s: print(f"  ... {s.imported} imported ({s.files_per_second:.1f} files/s)"),
+    )
+    print(f"✅ {stats.summary()}")
+    for error in stats.errors[:20]:
+        print(f"   ⚠️ {error}")
+    return 0 if not stats.failed else 2
+
+
+__all__ = ["ImportSource", "ImportStats", "content_hash", "extract_text", "import_path", "iter_sources"]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
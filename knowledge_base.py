@@ -9,13 +9,24 @@ This module provides:
 """
 
 from __future__ import annotations
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, Mapping, FrozenSet, Callable
+from dataclasses import dataclass, field, replace
+from types import MappingProxyType
+import base64
+import bisect
+import hashlib
+import math
+import os
+import re
 import time
 import json
 import threading
+import weakref
 from pathlib import Path
-import hashlib
+
+from dedup import NearDuplicateIndex
+from kb_format import SnapshotReader, SnapshotReleased, write_snapshot, is_snapshot_file
+from ids import new_id
 
 
 @dataclass
@@ -56,192 +67,961 @@ class KBDocument:
             updated_at=data.get('updated_at', time.time()),
             metadata=data.get('metadata', {})
         )
+    
+    @property
+    def content_length(self) -> int:
+        return len(self.content)
+    
+    def fields(self) -> Dict[str, Any]:
+        """All serialized fields except the content"""
+        data = self.to_dict()
+        del data['content']
+        return data
+
+
+class LazyKBDocument(KBDocument):
+    """KBDocument whose content is read from a binary snapshot on access.
+
+    The body is not kept on the object, so resident memory holds metadata
+    only; the snapshot reader caches recently used blocks. When the snapshot
+    file is rewritten the document is rebound to its location in the new
+    file (`_source` is swapped in one assignment).
+    """
+    
+    def __init__(self, reader: SnapshotReader, location: Tuple[int, int, int], length: int, **fields):
+        self._source: Optional[Tuple[SnapshotReader, Tuple[int, int, int]]] = (reader, location)
+        self._length = length
+        super().__init__(content=None, **fields)
+    
+    @property
+    def content(self) -> str:
+        while True:
+            if self._content is not None:
+                return self._content
+            reader, location = self._source
+            try:
+                return reader.read_body(location)
+            except SnapshotReleased:
+                # The file was replaced; retry unless we were not rebound
+                if self._source[0] is reader:
+                    raise
+    
+    def materialize(self) -> None:
+        """Read the body into memory and stop referencing the snapshot file"""
+        self._content = self.content
+        self._source = None
+    
+    @content.setter
+    def content(self, value: Optional[str]) -> None:
+        self._content = value
+    
+    @property
+    def content_length(self) -> int:
+        return self._length if self._content is None else len(self._content)
+    
+    def fields(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'title': self.title,
+            'category': self.category,
+            'tags': self.tags,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'metadata': self.metadata
+        }
+
+
+# Sort keys served from per-snapshot ordered indexes of (key, doc_id) pairs
+SORT_KEYS: Dict[str, Callable[[KBDocument], Any]] = {
+    'updated_at': lambda d: d.updated_at,
+    'created_at': lambda d: d.created_at,
+    'title': lambda d: d.title.lower(),
+}
+
+
+# Chunking for passage-level indexing
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+
+_TERM_RE = re.compile(r"\w{2,}", re.UNICODE)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it its of on or that the this "
+    "to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word terms used by the chunk index (stopwords removed)"""
+    return [t for t in _TERM_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into ~`size`-character passages on sentence/paragraph
+    boundaries, carrying ~`overlap` characters of context into the next one."""
+    text = text.strip()
+    if len(text) <= size:
+        return [text] if text else []
+    pieces = [p for p in _SENTENCE_END_RE.split(text) if p and p.strip()]
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        # Hard-split sentences longer than a whole chunk
+        while len(piece) > size:
+            head, piece = piece[:size], piece[size - overlap:]
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(head)
+        if current and len(current) + len(piece) + 1 > size:
+            chunks.append(current)
+            current = current[-overlap:].lstrip() + " " + piece if overlap else piece
+        else:
+            current = f"{current} {piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+def content_hash(text: str) -> str:
+    """Hash of whitespace/case-normalized content, used to skip exact duplicates"""
+    normalized = " ".join(text.split()).lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+# Term index postings are ints: slot * POSTING_STRIDE + passage + 1, where
+# the slot is a per-store number assigned to each document and passage 0 is
+# reserved for the title/tags. Ints keep the index compact and let it be
+# persisted (as int64) and restored without translation. The stride bounds
+# the passages of one document; more would spill into the next slot.
+POSTING_STRIDE = 1 << 32
+MAX_PASSAGES_PER_DOC = POSTING_STRIDE - 2
+
+
+def _posting(slot: int, n: int) -> int:
+    """Posting for passage `n` of the document in `slot` (-1 = title/tags)"""
+    return slot * POSTING_STRIDE + n + 1
+
+
+@dataclass
+class KBHit:
+    """A search result: document, score and its best-matching passages"""
+    score: float
+    doc: KBDocument
+    passages: List[str] = field(default_factory=list)
+
+
+def _encode_cursor(entry: Tuple[Any, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(entry)).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[Any, str]:
+    key, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return (key, doc_id)
+
+
+@dataclass(frozen=True)
+class KBSnapshot:
+    """Immutable point-in-time view of the knowledge base.
+
+    Published snapshots are never mutated: writers build a new one and swap
+    the store's reference, so readers holding an old snapshot keep a
+    consistent view without locking.
+
+    Besides the documents, a snapshot carries secondary indexes that writers
+    maintain incrementally: category and tag -> document IDs, one ascending
+    tuple of (sort key, id) pairs per entry in `SORT_KEYS`, the total
+    content length, each document's passage (chunk) count, and an inverted
+    index from term to passage postings (see `POSTING_STRIDE`), with the
+    document <-> slot maps that decode them. Passage text is re-derived from
+    the content on demand.
+    """
+    documents: Mapping[str, KBDocument] = field(default_factory=lambda: MappingProxyType({}))
+    category_index: Mapping[str, FrozenSet[str]] = field(default_factory=lambda: MappingProxyType({}))
+    tag_index: Mapping[str, FrozenSet[str]] = field(default_factory=lambda: MappingProxyType({}))
+    orderings: Mapping[str, Tuple[Tuple[Any, str], ...]] = field(
+        default_factory=lambda: MappingProxyType({key: () for key in SORT_KEYS})
+    )
+    total_characters: int = 0
+    chunk_counts: Mapping[str, int] = field(default_factory=lambda: MappingProxyType({}))
+    term_index: Mapping[str, FrozenSet[int]] = field(default_factory=lambda: MappingProxyType({}))
+    doc_slots: Mapping[str, int] = field(default_factory=lambda: MappingProxyType({}))
+    slot_docs: Mapping[int, str] = field(default_factory=lambda: MappingProxyType({}))
+    next_slot: int = 0
+    total_chunks: int = 0
+    version: int = 0
+
+    @property
+    def by_updated(self) -> Tuple[Tuple[float, str], ...]:
+        return self.orderings['updated_at']
+    
+    def passages(self, doc_id: str) -> List[str]:
+        """Passages of a document, numbered as in the term index"""
+        doc = self.documents.get(doc_id)
+        return chunk_text(doc.content) if doc is not None else []
+
+
+# Default persistence paths: binary snapshot, and the legacy JSON backup
+# still read on first start after upgrading
+KB_SNAPSHOT_PATH = "kb/kb_snapshot.akb"
+LEGACY_JSON_PATH = "kb/kb_backup.json"
 
 
 class KnowledgeBaseStore:
-    """In-memory knowledge base with simple search"""
+    """In-memory knowledge base with simple search.
+
+    Reads (`get_document`, `search`, `list_documents`, stats, persistence)
+    grab the current `KBSnapshot` reference without locking. Writers are
+    serialized by `_write_lock`, copy the document map, apply their change
+    and atomically publish a new snapshot (copy-on-write). Documents inside a
+    snapshot are treated as immutable; updates replace the object.
+    """
     
     def __init__(self):
-        self._documents: Dict[str, KBDocument] = {}
-        self._lock = threading.RLock()
+        self._snapshot = KBSnapshot()
+        self._write_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Documents whose bodies are read from a snapshot file, by id(); rebound
+        # (or materialized) before that file is replaced
+        self._lazy_docs: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        # (snapshot, query, ids) of the last `_title_candidates` lookup
+        self._title_cache: Optional[Tuple[KBSnapshot, str, Optional[FrozenSet[str]]]] = None
+        # File that failed to load; never overwritten by default saves
+        self._unreadable: Optional[Path] = None
         self._kb_dir = Path("kb")
         self._kb_dir.mkdir(exist_ok=True)
     
+    @property
+    def snapshot(self) -> KBSnapshot:
+        """Current immutable snapshot (lock-free)"""
+        return self._snapshot
+    
+    def _apply(self, upserts: List[KBDocument] = (), deletes: List[str] = (),
+               index_terms: bool = True) -> None:
+        """Build and publish the next snapshot. Caller holds `_write_lock`.
+
+        Indexes are updated incrementally from the previous snapshot: only
+        the touched categories/tags are copied, and the orderings are
+        maintained with binary-search inserts/deletes. `index_terms=False`
+        skips chunking and the term index (used when loading a snapshot that
+        carries a persisted term index).
+        """
+        old = self._snapshot
+        documents = dict(old.documents)
+        indexes = {
+            'category': dict(old.category_index),
+            'tag': dict(old.tag_index),
+            'term': dict(old.term_index),
+        }
+        chunk_counts = dict(old.chunk_counts)
+        doc_slots = dict(old.doc_slots)
+        slot_docs = dict(old.slot_docs)
+        next_slot = old.next_slot
+        total_chunks = old.total_chunks
+        orderings = {key: list(old.orderings.get(key, ())) for key in SORT_KEYS}
+        total_characters = old.total_characters
+        touched: Dict[Tuple[str, str], set] = {}
+        # Large batches (bulk import, load) re-sort once instead of paying an
+        # O(n) list insert/delete per document
+        batch = len(upserts) + len(deletes) > 64
+        removed_keys: Dict[str, set] = {key: set() for key in SORT_KEYS}
+        added_keys: Dict[str, list] = {key: [] for key in SORT_KEYS}
+        
+        def ids_for(kind: str, value: str) -> set:
+            if (kind, value) not in touched:
+                touched[(kind, value)] = set(indexes[kind].get(value, ()))
+            return touched[(kind, value)]
+        
+        def index_passages(doc: KBDocument, doc_chunks: List[str], add: bool) -> None:
+            if len(doc_chunks) > MAX_PASSAGES_PER_DOC:
+                raise ValueError(f"Document {doc.id} has {len(doc_chunks)} passages "
+                                 f"(limit {MAX_PASSAGES_PER_DOC})")
+            slot = doc_slots[doc.id]
+            postings = [(_posting(slot, -1), doc.title + " " + " ".join(doc.tags))]
+            postings += [(_posting(slot, n), text) for n, text in enumerate(doc_chunks)]
+            for key, text in postings:
+                for term in set(tokenize(text)):
+                    ids = ids_for('term', term)
+                    if add:
+                        ids.add(key)
+                    else:
+                        ids.discard(key)
+        
+        def unindex(doc: KBDocument) -> None:
+            nonlocal total_characters, total_chunks
+            total_characters -= doc.content_length
+            ids_for('category', doc.category).discard(doc.id)
+            for tag in doc.tags:
+                ids_for('tag', tag).discard(doc.id)
+            if doc.id in chunk_counts:
+                total_chunks -= chunk_counts.pop(doc.id)
+                index_passages(doc, chunk_text(doc.content), add=False)
+                slot_docs.pop(doc_slots.pop(doc.id))
+            for key, fn in SORT_KEYS.items():
+                entry = (fn(doc), doc.id)
+                if batch:
+                    removed_keys[key].add(entry)
+                    continue
+                order = orderings[key]
+                i = bisect.bisect_left(order, entry)
+                if i < len(order) and order[i] == entry:
+                    del order[i]
+        
+        for doc_id in deletes:
+            prev = documents.pop(doc_id, None)
+            if prev is not None:
+                unindex(prev)
+        for doc in upserts:
+            prev = documents.get(doc.id)
+            if prev is not None:
+                unindex(prev)
+            documents[doc.id] = doc
+            total_characters += doc.content_length
+            ids_for('category', doc.category).add(doc.id)
+            for tag in doc.tags:
+                ids_for('tag', tag).add(doc.id)
+            if index_terms:
+                doc_slots[doc.id] = next_slot
+                slot_docs[next_slot] = doc.id
+                next_slot += 1
+                doc_chunks = chunk_text(doc.content)
+                chunk_counts[doc.id] = len(doc_chunks)
+                total_chunks += len(doc_chunks)
+                index_passages(doc, doc_chunks, add=True)
+            for key, fn in SORT_KEYS.items():
+                if batch:
+                    added_keys[key].append((fn(doc), doc.id))
+                else:
+                    bisect.insort(orderings[key], (fn(doc), doc.id))
+        
+        if batch:
+            for key, order in orderings.items():
+                if removed_keys[key]:
+                    order = [k for k in order if k not in removed_keys[key]]
+                order.extend(added_keys[key])
+                order.sort()
+                orderings[key] = order
+        
+        for (kind, value), ids in touched.items():
+            if ids:
+                indexes[kind][value] = frozenset(ids)
+            else:
+                indexes[kind].pop(value, None)
+        
+        # Single reference assignment: atomic for readers
+        self._snapshot = KBSnapshot(
+            documents=MappingProxyType(documents),
+            category_index=MappingProxyType(indexes['category']),
+            tag_index=MappingProxyType(indexes['tag']),
+            orderings=MappingProxyType({key: tuple(order) for key, order in orderings.items()}),
+            total_characters=total_characters,
+            chunk_counts=MappingProxyType(chunk_counts),
+            term_index=MappingProxyType(indexes['term']),
+            doc_slots=MappingProxyType(doc_slots),
+            slot_docs=MappingProxyType(slot_docs),
+            next_slot=next_slot,
+            total_chunks=total_chunks,
+            version=old.version + 1,
+        )
+    
     def add_document(self, doc: KBDocument) -> None:
         """Add a document to KB"""
-        with self._lock:
-            self._documents[doc.id] = doc
+        self.add_documents([doc])
+    
+    def add_documents(self, docs: List[KBDocument]) -> None:
+        """Add several documents with a single copy-on-write publish"""
+        with self._write_lock:
+            self._apply(upserts=docs)
     
     def get_document(self, doc_id: str) -> Optional[KBDocument]:
         """Get a document by ID"""
-        with self._lock:
-            return self._documents.get(doc_id)
+        return self._snapshot.documents.get(doc_id)
     
     def delete_document(self, doc_id: str) -> bool:
         """Delete a document from KB"""
-        with self._lock:
-            if doc_id in self._documents:
-                del self._documents[doc_id]
-                return True
-            return False
+        with self._write_lock:
+            if doc_id not in self._snapshot.documents:
+                return False
+            self._apply(deletes=[doc_id])
+            return True
     
     def update_document(self, doc_id: str, **kwargs) -> Optional[KBDocument]:
         """Update a document"""
-        with self._lock:
-            if doc_id not in self._documents:
+        with self._write_lock:
+            old = self._snapshot.documents.get(doc_id)
+            if old is None:
                 return None
             
-            doc = self._documents[doc_id]
-            for key, value in kwargs.items():
-                if hasattr(doc, key) and key != 'id' and key != 'created_at':
-                    setattr(doc, key, value)
-            doc.updated_at = time.time()
+            changes = {
+                key: value for key, value in kwargs.items()
+                if hasattr(old, key) and key != 'id' and key != 'created_at'
+            }
+            changes['updated_at'] = time.time()
+            doc = KBDocument.from_dict({**old.to_dict(), **changes})
+            self._apply(upserts=[doc])
             return doc
     
-    def search(self, query: str, top_k: int = 5) -> List[Tuple[float, KBDocument]]:
-        """Search KB documents by keyword + semantic similarity"""
-        with self._lock:
-            scored: List[Tuple[float, KBDocument]] = []
-            qlow = query.lower()
+    def search_passages(self, query: str, top_k: int = 5, passages_per_doc: int = 2) -> List[KBHit]:
+        """Search KB passages and return the best documents with their best passages.
+
+        Candidate passages come from the term index; each is scored by the
+        IDF-weighted query terms it contains plus a bonus for containing the
+        whole query. A document scores its best passage plus title/tag
+        matches and a small recency bias.
+        """
+        snap = self._snapshot
+        qlow = query.lower().strip()
+        terms = set(tokenize(query))
+        if not qlow:
+            return []
+        
+        n_keys = max(1, snap.total_chunks + len(snap.documents))
+        passage_scores: Dict[int, float] = {}
+        for term in terms:
+            postings = snap.term_index.get(term)
+            if not postings:
+                continue
+            idf = math.log(1.0 + n_keys / len(postings))
+            for key in postings:
+                passage_scores[key] = passage_scores.get(key, 0.0) + idf
+        
+        per_doc: Dict[str, List[Tuple[float, int]]] = {}
+        title_hits: Dict[str, float] = {}
+        for key, score in passage_scores.items():
+            slot, part = divmod(key, POSTING_STRIDE)
+            doc_id = snap.slot_docs[slot]
+            if part == 0:
+                title_hits[doc_id] = score
+            else:
+                per_doc.setdefault(doc_id, []).append((score, part - 1))
+        
+        # First pass from the index alone (no document bodies needed)
+        ranked_docs: List[Tuple[float, str]] = []
+        now = time.time()
+        for doc_id in set(per_doc) | set(title_hits):
+            doc = snap.documents[doc_id]
+            score = max(per_doc[doc_id])[0] if doc_id in per_doc else 0.0
             
-            for doc in self._documents.values():
-                score = 0.0
-                
-                # Title match (highest weight)
+            # Title match (highest weight)
+            if doc_id in title_hits:
+                score += 0.5 * title_hits[doc_id]
                 if qlow in doc.title.lower():
                     score += 3.0
-                
-                # Content match
-                if qlow in doc.content.lower():
-                    score += 1.0
-                
-                # Tag match
-                for tag in doc.tags:
-                    if qlow in tag.lower():
-                        score += 2.0
-                
-                # Recency bias (newer docs slightly preferred)
-                age_days = (time.time() - doc.updated_at) / (60 * 60 * 24)
-                recency = max(0.0, 0.5 - min(age_days / 365, 0.5))
-                score += recency
-                
-                if score > 0:
-                    scored.append((score, doc))
             
-            scored.sort(key=lambda x: x[0], reverse=True)
-            return scored[:top_k]
+            # Tag match
+            for tag in doc.tags:
+                if qlow in tag.lower():
+                    score += 2.0
+            
+            # Recency bias (newer docs slightly preferred)
+            age_days = (now - doc.updated_at) / (60 * 60 * 24)
+            score += max(0.0, 0.5 - min(age_days / 365, 0.5))
+            ranked_docs.append((score, doc_id))
+        
+        # Second pass over the best few: read their passages, reward
+        # passages containing the whole query, and pick the best ones
+        ranked_docs.sort(reverse=True)
+        hits: List[KBHit] = []
+        for score, doc_id in ranked_docs[:max(top_k * 3, top_k + 5)]:
+            doc_chunks = snap.passages(doc_id)
+            candidates = [(sc, n) for sc, n in per_doc.get(doc_id, []) if n < len(doc_chunks)]
+            rescored = sorted(
+                ((sc + (1.0 if qlow in doc_chunks[n].lower() else 0.0), n) for sc, n in candidates),
+                reverse=True,
+            )
+            if rescored:
+                score += rescored[0][0] - max(candidates)[0]
+            # Keep the best passages in document order so they read naturally
+            best = sorted(n for _, n in rescored[:passages_per_doc]) or ([0] if doc_chunks else [])
+            hits.append(KBHit(score=score, doc=snap.documents[doc_id], passages=[doc_chunks[n] for n in best]))
+        
+        hits.sort(key=lambda h: h.score, reverse=True)
+        return hits[:top_k]
     
-    def list_documents(self, category: Optional[str] = None) -> List[KBDocument]:
-        """List all documents, optionally filtered by category"""
-        with self._lock:
-            docs = list(self._documents.values())
-            if category:
-                docs = [d for d in docs if d.category == category]
-            return sorted(docs, key=lambda d: d.updated_at, reverse=True)
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[float, KBDocument]]:
+        """Search KB documents by keyword + semantic similarity"""
+        return [(hit.score, hit.doc) for hit in self.search_passages(query, top_k=top_k)]
+    
+    def list_documents(self, category: Optional[str] = None, limit: Optional[int] = None,
+                       offset: int = 0) -> List[KBDocument]:
+        """List documents newest-first, optionally filtered by category.
+
+        Walks the updated_at index from the newest end, so a page costs
+        O(offset + limit) rather than a sort of the whole collection.
+        """
+        snap = self._snapshot
+        allowed = snap.category_index.get(category, frozenset()) if category else None
+        docs: List[KBDocument] = []
+        skipped = 0
+        for _, doc_id in reversed(snap.by_updated):
+            if allowed is not None and doc_id not in allowed:
+                continue
+            if skipped < offset:
+                skipped += 1
+                continue
+            docs.append(snap.documents[doc_id])
+            if limit is not None and len(docs) >= limit:
+                break
+        return docs
+    
+    def page_documents(self, cursor: Optional[str] = None, limit: int = 20, sort: str = 'updated_at',
+                       descending: bool = True, category: Optional[str] = None, tag: Optional[str] = None,
+                       query: Optional[str] = None) -> Tuple[List[KBDocument], Optional[str]]:
+        """Return one page of documents and the cursor for the next page.
+
+        The cursor encodes the (sort key, id) of the last item returned, so
+        pages stay stable while documents are added or deleted. Category and
+        tag filters come from the indexes; small filtered sets are sorted
+        directly instead of walking the whole ordering. `query` is a
+        case-insensitive substring filter on titles and tags; its candidates
+        come from the term index (see `_title_candidates`), so a selective
+        query costs about as much as a category filter. Queries without an
+        indexable word (e.g. a single letter) still walk the ordering until
+        the page is full.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        snap = self._snapshot
+        allowed: Optional[FrozenSet[str]] = None
+        if category:
+            allowed = snap.category_index.get(category, frozenset())
+        if tag:
+            tagged = snap.tag_index.get(tag, frozenset())
+            allowed = tagged if allowed is None else allowed & tagged
+        qlow = query.lower() if query else None
+        if qlow:
+            matching = self._title_candidates(snap, qlow)
+            if matching is not None:
+                allowed = matching if allowed is None else allowed & matching
+        
+        order = snap.orderings[sort]
+        if allowed is not None and len(allowed) * 8 < len(order):
+            key_fn = SORT_KEYS[sort]
+            order = sorted((key_fn(snap.documents[doc_id]), doc_id) for doc_id in allowed)
+            allowed = None
+        
+        if cursor:
+            after = _decode_cursor(cursor)
+            i = bisect.bisect_left(order, after) - 1 if descending else bisect.bisect_right(order, after)
+        else:
+            i = len(order) - 1 if descending else 0
+        step = -1 if descending else 1
+        
+        docs: List[KBDocument] = []
+        last = None
+        while 0 <= i < len(order) and len(docs) < limit:
+            entry = order[i]
+            i += step
+            if allowed is not None and entry[1] not in allowed:
+                continue
+            doc = snap.documents[entry[1]]
+            if qlow and qlow not in doc.title.lower() and not any(qlow in t.lower() for t in doc.tags):
+                continue
+            docs.append(doc)
+            last = entry
+        
+        has_more = len(docs) >= limit and 0 <= i < len(order)
+        return docs, (_encode_cursor(last) if has_more else None)
+    
+    def _title_candidates(self, snap: KBSnapshot, qlow: str) -> Optional[FrozenSet[str]]:
+        """IDs of documents whose title or tags may contain `qlow`, or None
+        if the query has no word the term index can narrow on.
+
+        Every word of the query must lie inside some indexed title/tag term
+        (passage 0 postings). Words that could fall inside a stopword or a
+        one-letter word are not used, since those are not indexed. The
+        result is a superset; callers still check the substring. Costs one
+        scan of the term vocabulary plus the postings of the matching terms.
+        The last result is cached, since pagination repeats the query.
+        """
+        cached = self._title_cache
+        if cached is not None and cached[0] is snap and cached[1] == qlow:
+            return cached[2]
+        result: Optional[FrozenSet[str]] = None
+        for word in set(_TERM_RE.findall(qlow)):
+            if any(word in stopword for stopword in _STOPWORDS):
+                continue
+            ids = set()
+            for term, postings in snap.term_index.items():
+                if word in term:
+                    for code in postings:
+                        slot, part = divmod(code, POSTING_STRIDE)
+                        if part == 0:
+                            ids.add(snap.slot_docs[slot])
+            result = frozenset(ids) if result is None else result & ids
+        self._title_cache = (snap, qlow, result)
+        return result
     
     def get_categories(self) -> List[str]:
         """Get all unique categories"""
-        with self._lock:
-            categories = set()
-            for doc in self._documents.values():
-                categories.add(doc.category)
-            return sorted(list(categories))
+        return sorted(self._snapshot.category_index)
+    
+    def get_tags(self) -> List[str]:
+        """Get all unique tags"""
+        return sorted(self._snapshot.tag_index)
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get KB statistics"""
-        with self._lock:
-            categories = {}
-            total_chars = 0
-            
-            for doc in self._documents.values():
-                total_chars += len(doc.content)
-                cat = doc.category
-                if cat not in categories:
-                    categories[cat] = 0
-                categories[cat] += 1
-            
-            return {
-                'total_documents': len(self._documents),
-                'total_characters': total_chars,
-                'categories': categories,
-                'categories_count': len(categories)
-            }
+        """Get KB statistics (from incrementally maintained counters)"""
+        snap = self._snapshot
+        categories = {cat: len(ids) for cat, ids in snap.category_index.items()}
+        return {
+            'total_documents': len(snap.documents),
+            'total_characters': snap.total_characters,
+            'categories': categories,
+            'categories_count': len(categories)
+        }
     
-    def save_to_disk(self, filepath: str = "kb/kb_backup.json") -> bool:
-        """Save KB to disk"""
+    def save_to_disk(self, filepath: Optional[str] = None, force: bool = False) -> bool:
+        """Save KB to disk.
+
+        Serializes the current snapshot without blocking readers or writers,
+        then atomically replaces the file. Writes the binary snapshot format
+        (see `kb_format`) unless `filepath` ends in `.json`, which writes the
+        legacy JSON export.
+
+        After a failed load, the default save and saves over the unreadable
+        file are refused (the in-memory KB is then incomplete) unless
+        `force` is set.
+        """
         try:
-            with self._lock:
-                data = {
-                    'documents': [doc.to_dict() for doc in self._documents.values()],
-                    'timestamp': time.time()
-                }
-                Path(filepath).parent.mkdir(parents=True, exist_ok=True)
-                with open(filepath, 'w') as f:
-                    json.dump(data, f, indent=2)
-                return True
+            snapshot = self._snapshot
+            path = Path(filepath or KB_SNAPSHOT_PATH)
+            if self._unreadable is not None and not force and (
+                    filepath is None or path.resolve() == self._unreadable.resolve()):
+                print(f"Not saving KB: {self._unreadable} could not be loaded")
+                return False
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with self._save_lock:
+                binary = path.suffix != '.json'
+                if not binary:
+                    data = {
+                        'documents': [doc.to_dict() for doc in snapshot.documents.values()],
+                        'timestamp': time.time()
+                    }
+                    with open(tmp_path, 'w') as f:
+                        json.dump(data, f)
+                else:
+                    self._write_snapshot(snapshot, str(tmp_path))
+                self._replace_file(snapshot, tmp_path, path, binary)
+            return True
         except Exception as e:
             print(f"Error saving KB: {e}")
             return False
     
-    def load_from_disk(self, filepath: str = "kb/kb_backup.json") -> bool:
-        """Load KB from disk"""
+    def _replace_file(self, snapshot: KBSnapshot, tmp_path: Path, path: Path, binary: bool) -> None:
+        """`os.replace(tmp_path, path)`, releasing snapshot readers that hold `path` open.
+
+        Windows cannot replace an open file. Lazy documents of `snapshot`
+        are rebound to their bodies in the new file, so nothing is read into
+        memory for them; only lazy documents that are no longer in
+        `snapshot` (still referenced by older snapshots) are materialized.
+        Called with `_save_lock` held.
+        """
+        target = path.resolve()
+        readers = set()
+        moving: List[LazyKBDocument] = []
+        for doc in list(self._lazy_docs.values()):
+            source = doc._source
+            if source is None or Path(source[0].path).resolve() != target:
+                continue
+            readers.add(source[0])
+            if binary and snapshot.documents.get(doc.id) is doc:
+                moving.append(doc)
+            else:
+                doc.materialize()
+        for reader in readers:
+            reader.suspend()
         try:
-            if not Path(filepath).exists():
-                return False
-            
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-            
-            with self._lock:
-                self._documents.clear()
-                for doc_data in data.get('documents', []):
-                    doc = KBDocument.from_dict(doc_data)
-                    self._documents[doc.id] = doc
-                return True
+            os.replace(tmp_path, path)
+        except Exception:
+            for reader in readers:
+                reader.resume()
+            raise
+        try:
+            if moving:
+                new_reader = SnapshotReader(str(path))
+                locations = {entry['id']: tuple(entry['body']) for entry in new_reader.read_documents()}
+                for doc in moving:
+                    doc._source = (new_reader, locations[doc.id])
+        finally:
+            for reader in readers:
+                reader.retire()
+    
+    @staticmethod
+    def _write_snapshot(snapshot: KBSnapshot, filepath: str) -> None:
+        docs = list(snapshot.documents.values())
+        write_snapshot(
+            filepath,
+            ((doc.fields(), doc.content) for doc in docs),
+            slots=[snapshot.doc_slots.get(doc.id, -1) for doc in docs],
+            chunk_counts=[snapshot.chunk_counts.get(doc.id, 0) for doc in docs],
+            terms=snapshot.term_index,
+        )
+    
+    def load_from_disk(self, filepath: Optional[str] = None,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       batch_size: int = 2000, strict: bool = False) -> bool:
+        """Load KB from disk.
+
+        Without `filepath`, loads the binary snapshot, falling back to the
+        legacy JSON backup. Binary snapshots restore the persisted term index
+        and leave document bodies on disk until they are read. JSON backups
+        are indexed and published `batch_size` documents at a time, so
+        searches see a growing KB while a large backup loads.
+        `progress(loaded, total)` is called after each publish.
+
+        Returns False if there is nothing to load. A file that exists but
+        cannot be read returns False too (or raises, with `strict`) and is
+        protected from being overwritten; see `save_to_disk`.
+        """
+        if filepath is None:
+            filepath = KB_SNAPSHOT_PATH if Path(KB_SNAPSHOT_PATH).exists() else LEGACY_JSON_PATH
+        if not Path(filepath).exists():
+            return False
+        try:
+            self._load_file(filepath, progress, batch_size)
         except Exception as e:
+            self._unreadable = Path(filepath)
+            if strict:
+                raise
             print(f"Error loading KB: {e}")
             return False
+        self._unreadable = None
+        return True
+    
+    def _load_file(self, filepath: str, progress: Optional[Callable[[int, int], None]],
+                   batch_size: int) -> None:
+        if is_snapshot_file(filepath):
+            self._load_snapshot(filepath, progress)
+            return
+        
+        with open(filepath, 'r') as f:
+            data = json.load(f)
+        
+        docs = [KBDocument.from_dict(doc_data) for doc_data in data.get('documents', [])]
+        with self._write_lock:
+            self._snapshot = KBSnapshot(version=self._snapshot.version)
+        if progress:
+            progress(0, len(docs))
+        for start in range(0, len(docs), batch_size):
+            with self._write_lock:
+                self._apply(upserts=docs[start:start + batch_size])
+            if progress:
+                progress(min(start + batch_size, len(docs)), len(docs))
+    
+    def _load_snapshot(self, filepath: str, progress: Optional[Callable[[int, int], None]] = None) -> None:
+        # Under the save lock, so a concurrent save cannot replace the file
+        # before its lazy documents are registered
+        with self._save_lock:
+            reader = SnapshotReader(filepath)
+            if progress:
+                progress(0, reader.count)
+            docs: List[KBDocument] = []
+            for entry in reader.read_documents():
+                location = tuple(entry.pop('body'))
+                docs.append(LazyKBDocument(reader, location, length=entry.pop('length'), **entry))
+            self._lazy_docs.update((id(doc), doc) for doc in docs)
+        slots, counts, terms = reader.read_index()
+        doc_slots = {doc.id: slot for doc, slot in zip(docs, slots)}
+        chunk_counts = {doc.id: count for doc, count in zip(docs, counts)}
+        term_index = {term: frozenset(postings) for term, postings in terms.items()}
+        with self._write_lock:
+            self._snapshot = KBSnapshot(version=self._snapshot.version)
+            self._apply(upserts=docs, index_terms=False)
+            self._snapshot = replace(
+                self._snapshot,
+                term_index=MappingProxyType(term_index),
+                doc_slots=MappingProxyType(doc_slots),
+                slot_docs=MappingProxyType({slot: doc_id for doc_id, slot in doc_slots.items()}),
+                next_slot=max(slots, default=-1) + 1,
+                chunk_counts=MappingProxyType(chunk_counts),
+                total_chunks=sum(chunk_counts.values()),
+            )
+        if progress:
+            progress(len(docs), reader.count)
     
     def clear_all(self) -> None:
         """Clear all KB documents"""
-        with self._lock:
-            self._documents.clear()
+        with self._write_lock:
+            self._snapshot = KBSnapshot(version=self._snapshot.version + 1)
+
+
+DEDUP_INDEX_PATH = "kb/kb_minhash.json"
 
 
 class KnowledgeBaseManager:
-    """High-level KB API for the application"""
+    """High-level KB API for the application.
+
+    The existing KB is opened on a background thread (`background=True`) so
+    constructing the manager never blocks the first page render. Until
+    loading finishes, searches are served from whatever has been published
+    so far; writes wait for the load to complete. `load_status()` reports
+    progress for the UI.
+    """
     
-    def __init__(self):
+    def __init__(self, dedup_threshold: float = 0.85, background: bool = True):
         self.store = KnowledgeBaseStore()
-        self.store.load_from_disk()  # Load existing KB if available
+        # MinHash signatures of KB documents, persisted next to the backup;
+        # `dedup_threshold=0` disables near-duplicate checks
+        self.dedup: Optional[NearDuplicateIndex] = None
+        self._dedup_threshold = dedup_threshold
+        self._dedup_version = -1
+        self._ready = threading.Event()
+        self._status: Dict[str, Any] = {
+            'state': 'warming', 'loaded': 0, 'total': None,
+            'started_at': time.time(), 'elapsed_s': None, 'error': None,
+        }
+        if background:
+            threading.Thread(target=self._warm, name="kb-warm", daemon=True).start()
+        else:
+            self._warm()
+    
+    def _warm(self) -> None:
+        """Load the KB and the dedup index; always ends with `ready` set"""
+        def progress(loaded: int, total: int) -> None:
+            self._status.update(loaded=loaded, total=total)
+        
+        try:
+            migrate = not Path(KB_SNAPSHOT_PATH).exists() and Path(LEGACY_JSON_PATH).exists()
+            found = self.store.load_from_disk(progress=progress, strict=True)  # Load existing KB if available
+            if found and migrate:
+                # Write the binary snapshot once; later starts load it lazily
+                self.store.save_to_disk()
+            if self._dedup_threshold:
+                self.dedup = (NearDuplicateIndex.load(DEDUP_INDEX_PATH, threshold=self._dedup_threshold)
+                              or NearDuplicateIndex(threshold=self._dedup_threshold))
+            self._status['state'] = 'ready' if found else 'empty'
+        except Exception as e:
+            self._status.update(state='failed', error=str(e))
+        finally:
+            self._status['elapsed_s'] = round(time.time() - self._status['started_at'], 3)
+            self._ready.set()
+    
+    @property
+    def ready(self) -> bool:
+        """True once the initial load has finished (or failed)"""
+        return self._ready.is_set()
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
     
-    def add_from_text(self, title: str, content: str, category: str = "General", tags: List[str] = None) -> str:
-        """Add a document from text"""
-        doc_id = hashlib.md5(f"{title}{time.time()}".encode()).hexdigest()[:12]
+    def load_status(self) -> Dict[str, Any]:
+        """Initial load progress: state (warming/ready/empty/failed),
+        loaded/total documents, elapsed seconds and any error"""
+        status = dict(self._status)
+        if status['elapsed_s'] is None:
+            status['elapsed_s'] = round(time.time() - status['started_at'], 3)
+        return status
+    
+    def _sync_dedup(self) -> None:
+        """Bring the dedup index in line with the store after out-of-band
+        changes (backup reload, direct store writes). No-op when unchanged."""
+        snap = self.store.snapshot
+        if self.dedup is None or snap.version == self._dedup_version:
+            return
+        indexed = set(self.dedup.keys())
+        self.dedup.retain(snap.documents)
+        for doc_id in snap.documents.keys() - indexed:
+            self.dedup.add(doc_id, snap.documents[doc_id].content)
+        self._dedup_version = snap.version
+    
+    def _save(self) -> None:
+        self.store.save_to_disk()
+        if self.dedup is not None:
+            self._dedup_version = self.store.snapshot.version
+            self.dedup.save(DEDUP_INDEX_PATH)
+    
+    def find_duplicate(self, content: str) -> Optional[Tuple[KBDocument, float]]:
+        """Return (document, similarity) of the closest near-duplicate in the KB"""
+        self.wait_until_ready()
+        if self.dedup is None:
+            return None
+        self._sync_dedup()
+        match = self.dedup.find(content)
+        if match is None:
+            return None
+        doc = self.store.get_document(match[0])
+        return (doc, match[1]) if doc else None
+    
+    def add_from_text(self, title: str, content: str, category: str = "General", tags: List[str] = None,
+                      on_duplicate: str = "skip") -> str:
+        """Add a document from text.
+
+        If the content is a near-duplicate of an existing document,
+        `on_duplicate` decides: "skip" returns the existing ID, "merge" adds
+        the new tags to the existing document and returns its ID, and "link"
+        adds the document with `metadata['duplicate_of']` set.
+        """
+        self.wait_until_ready()
+        metadata = {'content_hash': content_hash(content)}
+        signature = None
+        if self.dedup is not None:
+            self._sync_dedup()
+            signature = self.dedup.signature(content)
+            match = self.dedup.find(signature=signature) if signature else None
+            existing = self.store.get_document(match[0]) if match else None
+            if existing is not None:
+                if on_duplicate == "skip":
+                    return existing.id
+                if on_duplicate == "merge":
+                    merged_tags = existing.tags + [t for t in (tags or []) if t not in existing.tags]
+                    if merged_tags != existing.tags:
+                        self.store.update_document(existing.id, tags=merged_tags)
+                        self._save()
+                    return existing.id
+                metadata['duplicate_of'] = existing.id
+        doc_id = new_id()
         doc = KBDocument(
             id=doc_id,
             title=title,
             content=content,
             category=category,
-            tags=tags or []
+            tags=tags or [],
+            metadata=metadata
         )
         self.store.add_document(doc)
-        self.store.save_to_disk()
+        if signature is not None:
+            self.dedup.add(doc_id, signature=signature)
+        self._save()
         return doc_id
     
+    def import_path(self, path: str, category: Optional[str] = None, tags: List[str] = None,
+                    workers: Optional[int] = None, batch_size: int = 500, use_processes: bool = False,
+                    progress: Optional[Callable[[Any], None]] = None) -> Any:
+        """Bulk import a directory or zip/tar archive; returns `kb_import.ImportStats`"""
+        from kb_import import import_path
+        self.wait_until_ready()
+        if self.dedup is not None:
+            self._sync_dedup()
+        stats = import_path(
+            self.store, path, category=category, tags=tags, workers=workers,
+            batch_size=batch_size, use_processes=use_processes, progress=progress,
+            dedup=self.dedup,
+        )
+        if self.dedup is not None:
+            self._dedup_version = self.store.snapshot.version
+            self.dedup.save(DEDUP_INDEX_PATH)
+        return stats
+    
     def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """Search KB and return formatted results"""
-        results = self.store.search(query, top_k=top_k)
+        """Search KB and return formatted results.
+
+        `passage` holds the best-matching part(s) of the document, which is
+        what should be sent to the LLM for long articles.
+        """
+        hits = self.store.search_passages(query, top_k=top_k)
         return [
             {
-                'id': doc.id,
-                'title': doc.title,
-                'content': doc.content,
-                'category': doc.category,
-                'relevance': round(score, 2),
-                'tags': doc.tags
+                'id': hit.doc.id,
+                'title': hit.doc.title,
+                'content': hit.doc.content,
+                'passage': "\n...\n".join(hit.passages),
+                'category': hit.doc.category,
+                'relevance': round(hit.score, 2),
+                'tags': hit.doc.tags
             }
-            for score, doc in results
+            for hit in hits
         ]
     
     def get_kb_context(self, query: str, max_results: int = 3) -> str:
@@ -254,7 +1034,7 @@ class KnowledgeBaseManager:
         context = "📚 **Knowledge Base Results:**\n\n"
         for i, result in enumerate(results, 1):
             context += f"{i}. **{result['title']}** (Category: {result['category']}, Relevance: {result['relevance']})\n"
-            context += f"   {result['content'][:200]}...\n\n"
+            context += f"   {result['passage']}\n\n"
         
         return context
     
@@ -272,11 +1052,48 @@ class KnowledgeBaseManager:
             for doc in docs
         ]
     
+    def list_page(self, cursor: Optional[str] = None, limit: int = 20, sort: str = 'updated_at',
+                  descending: bool = True, category: Optional[str] = None, tag: Optional[str] = None,
+                  query: Optional[str] = None) -> Dict[str, Any]:
+        """List one page of KB documents (cursor pagination)"""
+        docs, next_cursor = self.store.page_documents(
+            cursor=cursor, limit=limit, sort=sort, descending=descending,
+            category=category, tag=tag, query=query,
+        )
+        snap = self.store.snapshot
+        if query:
+            total = None
+        elif category and tag:
+            total = len(snap.category_index.get(category, frozenset()) & snap.tag_index.get(tag, frozenset()))
+        elif category:
+            total = len(snap.category_index.get(category, ()))
+        elif tag:
+            total = len(snap.tag_index.get(tag, ()))
+        else:
+            total = len(snap.documents)
+        return {
+            'items': [
+                {
+                    'id': doc.id,
+                    'title': doc.title,
+                    'category': doc.category,
+                    'tags': doc.tags,
+                    'updated_at': doc.updated_at
+                }
+                for doc in docs
+            ],
+            'next_cursor': next_cursor,
+            'total': total,
+        }
+    
     def delete(self, doc_id: str) -> bool:
         """Delete a KB document"""
+        self.wait_until_ready()
         success = self.store.delete_document(doc_id)
         if success:
-            self.store.save_to_disk()
+            if self.dedup is not None:
+                self.dedup.remove(doc_id)
+            self._save()
         return success
     
     def get_stats(self) -> Dict[str, Any]:
@@ -292,5 +1109,6 @@ def get_kb_manager() -> KnowledgeBaseManager:
     """Get or create KB manager singleton"""
     global _kb_manager
     if _kb_manager is None:
-        _kb_manager = KnowledgeBaseManager()
+        from config import CONFIG
+        _kb_manager = KnowledgeBaseManager(dedup_threshold=CONFIG.dedup_threshold)
     return _kb_manager
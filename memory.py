@@ -7,11 +7,19 @@ remote vector DB is not installed. Later this can be extended to use a
 persistent FAISS, Milvus or hosted vector DB.
 """
 from __future__ import annotations
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable, Deque
 from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+import bisect
+import heapq
+import re
 import time
 import threading
 
+from dedup import NearDuplicateIndex
+from ids import new_id
+
 
 @dataclass
 class MemoryEntry:
@@ -20,57 +28,206 @@ class MemoryEntry:
     embedding: Optional[List[float]] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
     ts: float = field(default_factory=lambda: time.time())
+    # Insertion sequence number, assigned by MemoryManager (0 = not yet inserted)
+    seq: int = 0
 
 
 class InMemoryStore:
     """Very small in-process memory store used as a safe default.
 
-    The store keeps entries in a list and performs naive similarity by
-    optionally using precomputed embeddings (if provided) or simple
-    substring matching as a fallback.
+    The store keeps entries in insertion (time) order and performs naive
+    similarity by optionally using precomputed embeddings (if provided) or
+    simple substring matching as a fallback.
+
+    With `capacity` set the store is bounded: entries live in a ring buffer
+    and the oldest is evicted in O(1) on insert. Entries whose
+    `metadata["importance"]` reaches `protect_threshold` are kept in a
+    separate min-heap (up to `protected_capacity`) so high-value memories
+    survive regardless of age; when that heap is full the least important
+    protected entry is demoted back to the ring, in timestamp order.
     """
 
-    def __init__(self):
-        self._entries: List[MemoryEntry] = []
+    def __init__(self, capacity: Optional[int] = None, protected_capacity: Optional[int] = None,
+                 protect_threshold: float = 0.8):
+        # Ring of (seq, ts, entry) slots ordered by the ts recorded when the
+        # slot was placed; may hold tombstoned slots (deleted, or superseded by
+        # a re-insert of the same entry), which are skipped on read and dropped
+        # on eviction or compaction.
+        self._entries: Deque[Tuple[int, float, MemoryEntry]] = deque()
+        # Live entries keyed by ID: O(1) lookups, deletes and duplicate checks
+        self._by_id: Dict[str, MemoryEntry] = {}
+        # Entry ID -> seq of its live ring slot
+        self._slots: Dict[str, int] = {}
+        # (importance, seq, entry) min-heap; only used in bounded mode
+        self._protected: List[Tuple[float, int, MemoryEntry]] = []
+        self._protected_ids: set = set()
+        self._regular_live = 0
+        self._seq = 0
         self._lock = threading.RLock()
+        self.capacity = capacity
+        if protected_capacity is None and capacity:
+            protected_capacity = max(1, capacity // 10)
+        self.protected_capacity = protected_capacity or 0
+        self.protect_threshold = protect_threshold
+
+    @staticmethod
+    def importance(entry: MemoryEntry) -> float:
+        try:
+            return float(entry.metadata.get("importance", 0.0))
+        except (TypeError, ValueError):
+            return 0.0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._by_id)
+
+    def __contains__(self, entry_id: str) -> bool:
+        with self._lock:
+            return entry_id in self._by_id
+
+    def _is_live(self, slot: Tuple[int, float, MemoryEntry]) -> bool:
+        return self._slots.get(slot[2].id) == slot[0]
+
+    def _evict_regular(self, keep: int) -> None:
+        while self._regular_live > keep and self._entries:
+            slot = self._entries.popleft()
+            if self._is_live(slot):
+                del self._by_id[slot[2].id]
+                del self._slots[slot[2].id]
+                self._regular_live -= 1
+
+    def _maybe_compact(self) -> None:
+        if len(self._entries) > 2 * self._regular_live + 64:
+            self._entries = deque(slot for slot in self._entries if self._is_live(slot))
 
     def insert(self, entry: MemoryEntry) -> None:
         with self._lock:
-            self._entries.append(entry)
+            if entry.id in self._by_id:
+                # Same ID inserted again: replace the previous entry
+                self._delete_locked(entry.id)
+            self._by_id[entry.id] = entry
+            if self.capacity and self.protected_capacity:
+                imp = self.importance(entry)
+                if imp >= self.protect_threshold:
+                    self._seq += 1
+                    if len(self._protected) < self.protected_capacity:
+                        heapq.heappush(self._protected, (imp, self._seq, entry))
+                        self._protected_ids.add(entry.id)
+                        entry = None
+                    elif imp > self._protected[0][0]:
+                        self._protected_ids.add(entry.id)
+                        entry = heapq.heapreplace(self._protected, (imp, self._seq, entry))[2]
+                        self._protected_ids.discard(entry.id)
+            if entry is not None:
+                self._seq += 1
+                slot = (self._seq, entry.ts, entry)
+                if self._entries and entry.ts < self._entries[-1][1]:
+                    # Older than the newest slot (e.g. demoted from the protected
+                    # heap): place it by timestamp so eviction stays oldest-first.
+                    # O(n), but only happens on demotion or out-of-order inserts.
+                    self._entries.insert(bisect.bisect_right(self._entries, entry.ts, key=lambda s: s[1]), slot)
+                else:
+                    self._entries.append(slot)
+                self._slots[entry.id] = self._seq
+                self._regular_live += 1
+            if self.capacity:
+                self._evict_regular(max(0, self.capacity - len(self._protected)))
 
-    def query(self, query: str, top_k: int = 5) -> List[MemoryEntry]:
+    def get(self, entry_id: str) -> Optional[MemoryEntry]:
+        with self._lock:
+            return self._by_id.get(entry_id)
+
+    def _delete_locked(self, entry_id: str) -> bool:
+        entry = self._by_id.pop(entry_id, None)
+        if entry is None:
+            return False
+        if entry_id in self._protected_ids:
+            self._protected_ids.discard(entry_id)
+            self._protected = [p for p in self._protected if p[2] is not entry]
+            heapq.heapify(self._protected)
+        else:
+            del self._slots[entry_id]
+            self._regular_live -= 1
+            self._maybe_compact()
+        return True
+
+    def delete(self, entry_id: str) -> bool:
+        """Delete an entry by ID in O(1) (amortized)."""
+        with self._lock:
+            return self._delete_locked(entry_id)
+
+    def _snapshot(self) -> List[MemoryEntry]:
         with self._lock:
-            # If embeddings are available, a real implementation would compute
-            # distances. For this scaffold, fall back to simple substring match
-            # and recency ordering.
-            scored: List[Tuple[float, MemoryEntry]] = []
-            qlow = query.lower()
-            for e in self._entries:
-                score = 0.0
-                if e.embedding:
-                    # placeholder: optimistic score for entries with embeddings
-                    score += 0.5
-                if qlow in e.content.lower():
-                    score += 1.0
-                # add recency bias
-                age = time.time() - e.ts
-                score += max(0.0, 0.5 - min(age / (60 * 60 * 24), 0.5))
-                scored.append((score, e))
-
-            scored.sort(key=lambda x: x[0], reverse=True)
-            return [e for _, e in scored[:top_k]]
+            return [slot[2] for slot in self._entries if self._is_live(slot)] + [e for _, _, e in self._protected]
+
+    def query(self, query: str, top_k: int = 5) -> List[MemoryEntry]:
+        # Copy references under the lock and score outside it so inserts and
+        # pruning are not blocked by scoring.
+        entries = self._snapshot()
+        # If embeddings are available, a real implementation would compute
+        # distances. For this scaffold, fall back to simple substring match
+        # and recency ordering.
+        scored: List[Tuple[float, int, MemoryEntry]] = []
+        qlow = query.lower()
+        now = time.time()
+        for i, e in enumerate(entries):
+            score = 0.0
+            if e.embedding:
+                # placeholder: optimistic score for entries with embeddings
+                score += 0.5
+            if qlow in e.content.lower():
+                score += 1.0
+            # add recency bias
+            age = now - e.ts
+            score += max(0.0, 0.5 - min(age / (60 * 60 * 24), 0.5))
+            # negative index keeps earlier entries first among equal scores
+            scored.append((score, -i, e))
+
+        return [e for _, _, e in heapq.nlargest(top_k, scored, key=lambda x: (x[0], x[1]))]
 
     def prune(self, keep_last: int = 1000) -> None:
+        """Keep the `keep_last` most recent entries (protected entries count
+        towards the limit but are kept). Entries are time-ordered, so this
+        pops from the old end: O(number of evicted entries)."""
         with self._lock:
-            if len(self._entries) <= keep_last:
-                return
-            # keep most recent
-            self._entries.sort(key=lambda e: e.ts, reverse=True)
-            self._entries = self._entries[:keep_last]
+            self._evict_regular(max(0, keep_last - len(self._protected)))
 
     def all_entries(self) -> List[MemoryEntry]:
+        entries = self._snapshot()
+        if self._protected:
+            entries.sort(key=lambda e: e.ts)
+        return entries
+
+    def remove(self, ids: List[str]) -> int:
+        """Remove entries by ID; returns how many were removed."""
         with self._lock:
-            return list(self._entries)
+            return sum(1 for entry_id in ids if self._delete_locked(entry_id))
+
+
+# summarizer(cluster_entries) -> content of the consolidated semantic entry
+ClusterSummarizer = Callable[[List[MemoryEntry]], str]
+
+_TOKEN_RE = re.compile(r"\w{3,}", re.UNICODE)
+
+
+def _tokens(text: str) -> frozenset:
+    return frozenset(_TOKEN_RE.findall(text.lower()))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def representative_summary(entries: List[MemoryEntry]) -> str:
+    """Default, LLM-free summary: the content of the entry sharing the most
+    vocabulary with the rest of its cluster."""
+    if len(entries) == 1:
+        return entries[0].content
+    toks = [_tokens(e.content) for e in entries]
+    best = max(range(len(entries)), key=lambda i: sum(_jaccard(toks[i], t) for t in toks))
+    return entries[best].content
 
 
 class MemoryManager:
@@ -79,30 +236,219 @@ class MemoryManager:
     Responsibilities:
     - insert memories (optionally compute embeddings externally)
     - query memories with ranking
-    - consolidate/prune memories (background job)
+    - consolidate episodic memories into semantic entries (optionally on a
+      background worker) and prune old entries
+    - optionally detect near-duplicate inserts (`dedup`) and skip, merge or
+      link them according to `on_duplicate`
     - persist/load (to be implemented in a future extension)
     """
 
-    def __init__(self, store: Optional[InMemoryStore] = None):
-        self.store = store or InMemoryStore()
+    def __init__(self, store: Optional[InMemoryStore] = None, auto_consolidate_every: int = 0,
+                 similarity_threshold: float = 0.6, consolidation_window: int = 200,
+                 summarizer: Optional[ClusterSummarizer] = None, executor: Optional[ThreadPoolExecutor] = None,
+                 dedup: Optional[NearDuplicateIndex] = None, on_duplicate: str = "merge"):
+        if on_duplicate not in ("skip", "merge", "link"):
+            raise ValueError(f"on_duplicate must be 'skip', 'merge' or 'link', not {on_duplicate!r}")
+        self.store = store if store is not None else InMemoryStore()
+        # Near-duplicate index over entry IDs; entries evicted by the store
+        # are dropped from it lazily
+        self.dedup = dedup
+        self.on_duplicate = on_duplicate
+        # Consolidation settings; 0 disables automatic background runs
+        self.auto_consolidate_every = auto_consolidate_every
+        self.similarity_threshold = similarity_threshold
+        self.consolidation_window = consolidation_window
+        self.summarizer = summarizer or representative_summary
+        self.last_consolidation: Dict[str, Any] = {}
+        # Sequence numbers order inserts exactly (timestamps can tie); entries
+        # with seq above the high-water mark are new to consolidation
+        self._seq = 0
+        self._consolidated_upto = 0
+        self._lock = threading.Lock()
+        self._consolidate_lock = threading.Lock()
+        # Background worker for consolidate_async; may be shared between managers
+        self._executor: Optional[ThreadPoolExecutor] = executor
+        self._executor_lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        self._inserts_since_consolidation = 0
 
-    def insert_memory(self, content: str, metadata: Optional[Dict[str, Any]] = None, embedding: Optional[List[float]] = None) -> MemoryEntry:
-        """Insert a new memory entry and return it."""
-        mid = f"m_{int(time.time() * 1000)}"
-        entry = MemoryEntry(id=mid, content=content, embedding=embedding, metadata=metadata or {})
+    def _next_id(self) -> str:
+        return new_id("m")
+
+    def _insert_locked(self, entry: MemoryEntry) -> None:
+        self._seq += 1
+        entry.seq = self._seq
         self.store.insert(entry)
+
+    def _find_duplicate(self, signature) -> Optional[MemoryEntry]:
+        while True:
+            match = self.dedup.find(signature=signature)
+            if match is None:
+                return None
+            existing = self.store.get(match[0])
+            if existing is not None:
+                return existing
+            # Evicted or consolidated away since it was indexed
+            self.dedup.remove(match[0])
+
+    def insert_memory(self, content: str, metadata: Optional[Dict[str, Any]] = None, embedding: Optional[List[float]] = None) -> MemoryEntry:
+        """Insert a new memory entry and return it.
+
+        With a `dedup` index, a near-duplicate of a live entry is handled per
+        `on_duplicate`: "skip" returns the existing entry, "merge" refreshes it
+        (timestamp, `duplicates` count, missing metadata) and returns it, and
+        "link" inserts the new entry with `metadata["duplicate_of"]`.
+        """
+        metadata = metadata or {}
+        signature = None
+        if self.dedup is not None:
+            signature = self.dedup.signature(content)
+            existing = self._find_duplicate(signature) if signature else None
+            if existing is not None:
+                if self.on_duplicate == "skip":
+                    return existing
+                if self.on_duplicate == "merge":
+                    for key, value in metadata.items():
+                        existing.metadata.setdefault(key, value)
+                    existing.metadata["duplicates"] = existing.metadata.get("duplicates", 0) + 1
+                    existing.ts = time.time()
+                    # Re-insert so the ring order matches the refreshed timestamp
+                    with self._lock:
+                        self._insert_locked(existing)
+                    return existing
+                metadata = dict(metadata, duplicate_of=existing.id)
+        mid = self._next_id()
+        entry = MemoryEntry(id=mid, content=content, embedding=embedding, metadata=metadata)
+        consolidate = False
+        with self._lock:
+            self._insert_locked(entry)
+            if self.auto_consolidate_every:
+                self._inserts_since_consolidation += 1
+                if self._inserts_since_consolidation >= self.auto_consolidate_every:
+                    self._inserts_since_consolidation = 0
+                    consolidate = True
+        if signature is not None:
+            self.dedup.add(mid, signature=signature)
+            if len(self.dedup) > 2 * len(self.store) + 64:
+                self.dedup.retain(e.id for e in self.store.all_entries())
+        if consolidate:
+            self.consolidate_async()
         return entry
 
     def query(self, query: str, top_k: int = 5) -> List[MemoryEntry]:
         return self.store.query(query, top_k=top_k)
 
-    def consolidate(self) -> None:
-        """Placeholder consolidation: in a real system this would summarize
-        recent episodic memories into semantic entries and optionally remove
-        low-value fragments.
+    def get_memory(self, memory_id: str) -> Optional[MemoryEntry]:
+        return self.store.get(memory_id)
+
+    def delete_memory(self, memory_id: str) -> bool:
+        if self.dedup is not None:
+            self.dedup.remove(memory_id)
+        return self.store.delete(memory_id)
+
+    def consolidate(self) -> int:
+        """Cluster related episodic memories into semantic entries.
+
+        Only entries inserted since the previous run (the high-water mark) are
+        clustered, against each other, the existing semantic entries and a
+        bounded window of recent episodic entries. Each cluster with two or
+        more members is replaced by one semantic entry (or merged into an
+        existing one). Returns the number of episodic entries merged away.
         """
-        # No-op scaffold
-        return
+        with self._consolidate_lock:
+            started = time.time()
+            # Snapshot under the insert lock so no entry with a lower seq than
+            # one we see can be missing from it
+            with self._lock:
+                entries = self.store.all_entries()
+            hwm = self._consolidated_upto
+            new = [e for e in entries if e.seq > hwm and e.metadata.get("kind", "episodic") == "episodic"]
+            if not new:
+                self.last_consolidation = {"merged": 0, "clusters": 0, "processed": 0, "elapsed_s": 0.0}
+                return 0
+
+            semantic = [e for e in entries if e.metadata.get("kind") == "semantic"]
+            older = [e for e in entries if e.seq <= hwm and e.metadata.get("kind", "episodic") == "episodic"]
+            older = older[-self.consolidation_window:]
+
+            # Greedy single-pass clustering: each new entry joins the most similar
+            # existing cluster above the threshold, otherwise seeds its own.
+            clusters: List[Dict[str, Any]] = []
+            for e in semantic + older:
+                clusters.append({"anchor": e, "tokens": _tokens(e.content), "members": []})
+            for e in new:
+                toks = _tokens(e.content)
+                best, best_sim = None, self.similarity_threshold
+                for c in clusters:
+                    sim = _jaccard(toks, c["tokens"])
+                    if sim >= best_sim:
+                        best, best_sim = c, sim
+                if best is None:
+                    clusters.append({"anchor": e, "tokens": toks, "members": []})
+                else:
+                    best["members"].append(e)
+                    best["tokens"] = best["tokens"] | toks
+
+            removed: List[MemoryEntry] = []
+            additions: List[MemoryEntry] = []
+            merged = 0
+            for c in clusters:
+                if not c["members"]:
+                    continue
+                anchor = c["anchor"]
+                sources = [anchor] + c["members"]
+                if anchor.metadata.get("kind") == "semantic":
+                    # Fold the new members into the existing semantic entry
+                    count = anchor.metadata.get("count", 1) + len(c["members"])
+                    source_ids = anchor.metadata.get("source_ids", []) + [m.id for m in c["members"]]
+                    first_ts = anchor.metadata.get("first_ts", anchor.ts)
+                    merged += len(c["members"])
+                else:
+                    count = len(sources)
+                    source_ids = [m.id for m in sources]
+                    first_ts = anchor.ts
+                    merged += len(sources)
+                removed.extend(sources)
+                additions.append(MemoryEntry(
+                    id=self._next_id(),
+                    content=self.summarizer(sources),
+                    metadata={
+                        "kind": "semantic",
+                        "count": count,
+                        "source_ids": source_ids,
+                        "first_ts": first_ts,
+                        # Recurring memories are worth keeping in bounded stores
+                        "importance": min(1.0, count / 5),
+                    },
+                    ts=max(m.ts for m in sources),
+                ))
+
+            self.store.remove([m.id for m in removed])
+            with self._lock:
+                for entry in additions:
+                    self._insert_locked(entry)
+            self._consolidated_upto = max(e.seq for e in new)
+            self.last_consolidation = {
+                "merged": merged,
+                "clusters": len(additions),
+                "processed": len(new),
+                "elapsed_s": round(time.time() - started, 4),
+            }
+            return merged
+
+    def consolidate_async(self) -> Future:
+        """Run `consolidate` on the background worker.
+
+        Requests made while a run is already queued share that run's future,
+        so bursts of inserts trigger at most one pending consolidation.
+        """
+        with self._executor_lock:
+            if self._pending is not None and not self._pending.done():
+                return self._pending
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-consolidate")
+            self._pending = self._executor.submit(self.consolidate)
+            return self._pending
 
     def prune(self, keep_last: int = 1000) -> None:
         self.store.prune(keep_last=keep_last)
@@ -115,4 +461,93 @@ class MemoryManager:
         raise NotImplementedError("Load not implemented in scaffold")
 
 
-__all__ = ["MemoryManager", "MemoryEntry", "InMemoryStore"]
+class ShardedMemoryManager:
+    """Memory namespaced by session or user ID.
+
+    Each namespace gets its own `MemoryManager` (and therefore its own store,
+    lock and ID index), so a query only scans the caller's memories, never
+    leaks another user's history, and lock contention grows with the number
+    of active sessions rather than total traffic. Shards share a single
+    background consolidation worker.
+
+    Idle shards are dropped after `max_idle_s` seconds, and the least
+    recently used shard is dropped when more than `max_shards` exist.
+    """
+
+    def __init__(self, factory: Optional[Callable[[ThreadPoolExecutor], MemoryManager]] = None,
+                 max_shards: int = 1000, max_idle_s: Optional[float] = 6 * 60 * 60):
+        if max_shards < 1:
+            raise ValueError(f"max_shards must be at least 1, not {max_shards!r}")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-consolidate")
+        self._factory = factory or (lambda executor: MemoryManager(executor=executor))
+        self._shards: Dict[str, MemoryManager] = {}
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.max_shards = max_shards
+        self.max_idle_s = max_idle_s
+
+    def shard(self, namespace: str) -> MemoryManager:
+        """Return the MemoryManager for `namespace`, creating it on first use.
+
+        The registry lock is held only for the dict lookup (and creation), so
+        it never covers memory reads or writes within a shard.
+        """
+        with self._lock:
+            manager = self._shards.get(namespace)
+            if manager is None:
+                self._evict_locked()
+                manager = self._factory(self._executor)
+                self._shards[namespace] = manager
+            self._last_used[namespace] = time.time()
+            return manager
+
+    def _evict_locked(self) -> None:
+        now = time.time()
+        if self.max_idle_s is not None:
+            for ns, used in list(self._last_used.items()):
+                if now - used > self.max_idle_s:
+                    self._shards.pop(ns, None)
+                    self._last_used.pop(ns, None)
+        while len(self._shards) >= self.max_shards:
+            oldest = min(self._last_used, key=self._last_used.get)
+            self._shards.pop(oldest, None)
+            self._last_used.pop(oldest, None)
+
+    def drop(self, namespace: str) -> bool:
+        """Forget a namespace (e.g. when a user clears their chat)."""
+        with self._lock:
+            self._last_used.pop(namespace, None)
+            return self._shards.pop(namespace, None) is not None
+
+    def namespaces(self) -> List[str]:
+        with self._lock:
+            return list(self._shards)
+
+    def insert_memory(self, namespace: str, content: str, metadata: Optional[Dict[str, Any]] = None,
+                      embedding: Optional[List[float]] = None) -> MemoryEntry:
+        return self.shard(namespace).insert_memory(content, metadata=metadata, embedding=embedding)
+
+    def query(self, namespace: str, query: str, top_k: int = 5) -> List[MemoryEntry]:
+        return self.shard(namespace).query(query, top_k=top_k)
+
+
+_memory_shards: Optional[ShardedMemoryManager] = None
+
+
+def get_memory_shards() -> ShardedMemoryManager:
+    """Get or create the per-session memory registry singleton"""
+    global _memory_shards
+    if _memory_shards is None:
+        from config import CONFIG
+        _memory_shards = ShardedMemoryManager(
+            factory=lambda executor: MemoryManager(
+                store=InMemoryStore(capacity=CONFIG.memory_capacity or None),
+                auto_consolidate_every=CONFIG.memory_consolidate_every,
+                executor=executor,
+                dedup=NearDuplicateIndex(threshold=CONFIG.dedup_threshold) if CONFIG.dedup_threshold else None,
+            ),
+        )
+    return _memory_shards
+
+
+__all__ = ["MemoryManager", "MemoryEntry", "InMemoryStore", "ShardedMemoryManager", "get_memory_shards"]
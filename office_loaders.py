@@ -0,0 +1,341 @@
+"""office_loaders.py
+Structured, streaming text extraction for DOCX, PPTX and XLSX uploads.
+
+Office Open XML files are zip archives of XML parts. Instead of loading the
+whole document model (python-docx / python-pptx), each part is streamed out
+of the zip and parsed with `iterparse`, clearing elements as soon as they
+are consumed, so memory stays bounded by the largest single paragraph, row
+or slide rather than by the file. Extraction yields `OfficeSection`s, each
+labelled with where it came from (heading, slide, notes, sheet, ...), and
+covers body text, tables, headers/footers and speaker notes.
+
+`detect_office_kind` dispatches on the zip magic bytes and the parts
+present, so a mislabeled or extension-less upload is still recognised.
+"""
+from __future__ import annotations
+from typing import List, Dict, Iterator, Optional, Tuple
+from dataclasses import dataclass
+import io
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Sheet rows emitted per section, so huge sheets become many small sections
+XLSX_ROWS_PER_SECTION = 50
+
+_NUM_RE = re.compile(r"(\d+)")
+
+# Distinctive part of each format, checked in this order
+_KIND_PARTS = (
+    ("docx", "word/document.xml"),
+    ("pptx", "ppt/presentation.xml"),
+    ("xlsx", "xl/workbook.xml"),
+)
+OFFICE_KINDS = tuple(kind for kind, _ in _KIND_PARTS)
+
+
+@dataclass
+class OfficeSection:
+    """A run of extracted text and where in the document it came from"""
+    label: str
+    text: str
+    part: str = "body"  # body | table | header | footer | notes | sheet
+
+
+def detect_office_kind(data: bytes) -> Optional[str]:
+    """'docx', 'pptx' or 'xlsx' from the file content, or None"""
+    if not data.startswith(ZIP_MAGIC):
+        return None
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            names = set(zf.namelist())
+    except (zipfile.BadZipFile, OSError):
+        return None
+    for kind, part in _KIND_PARTS:
+        if part in names:
+            return kind
+    return None
+
+
+def _numbered(names: List[str], prefix: str) -> List[str]:
+    """Parts like ppt/slides/slide10.xml in numeric (not string) order"""
+    matches = [n for n in names if n.startswith(prefix) and n.endswith(".xml")]
+    return sorted(matches, key=lambda n: int((_NUM_RE.findall(posixpath.basename(n)) or ["0"])[-1]))
+
+
+def _rels(zf: zipfile.ZipFile, part: str) -> Dict[str, str]:
+    """Relationship id -> target part name for `part`"""
+    base = posixpath.dirname(part)
+    rels_name = posixpath.join(base, "_rels", posixpath.basename(part) + ".rels")
+    if rels_name not in zf.NameToInfo:
+        return {}
+    out = {}
+    with zf.open(rels_name) as f:
+        for _, el in iterparse(f):
+            if el.tag == _REL + "Relationship":
+                out[el.get("Id")] = posixpath.normpath(posixpath.join(base, el.get("Target", "")))
+    return out
+
+
+def _row_text(cells: List[str]) -> str:
+    return " | ".join(c for c in cells if c)
+
+
+# --- DOCX ---
+
+def _docx_part(zf: zipfile.ZipFile, name: str, part: str, label: str) -> Iterator[OfficeSection]:
+    """Stream paragraphs and tables of one WordprocessingML part"""
+    heading = label
+    paragraphs: List[str] = []
+    table_rows: List[str] = []
+    row: List[str] = []
+    cell: List[str] = []
+    texts: List[str] = []
+    style = ""
+    table_depth = 0
+
+    def flush_paragraphs():
+        if paragraphs:
+            yield OfficeSection(heading, "\n".join(paragraphs), part)
+            paragraphs.clear()
+
+    with zf.open(name) as f:
+        for event, el in iterparse(f, events=("start", "end")):
+            tag = el.tag
+            if event == "start":
+                if tag == _W + "tbl":
+                    if table_depth == 0:
+                        yield from flush_paragraphs()
+                    table_depth += 1
+                elif tag == _W + "p":
+                    texts = []
+                    style = ""
+                continue
+            if tag == _W + "t":
+                texts.append(el.text or "")
+            elif tag == _W + "tab":
+                texts.append("\t")
+            elif tag == _W + "pStyle":
+                style = el.get(_W + "val", "")
+            elif tag == _W + "p":
+                text = "".join(texts).strip()
+                if table_depth:
+                    if text:
+                        cell.append(text)
+                elif text:
+                    if style.lower().startswith(("heading", "title")):
+                        yield from flush_paragraphs()
+                        heading = text
+                    paragraphs.append(text)
+                el.clear()
+            elif tag == _W + "tc":
+                row.append(" ".join(cell))
+                cell = []
+            elif tag == _W + "tr":
+                text = _row_text(row)
+                if text:
+                    table_rows.append(text)
+                row = []
+                el.clear()
+            elif tag == _W + "tbl":
+                table_depth -= 1
+                if table_depth == 0:
+                    if table_rows:
+                        yield OfficeSection(f"{heading} (table)", "\n".join(table_rows), "table")
+                    table_rows = []
+                el.clear()
+    yield from flush_paragraphs()
+
+
+def iter_docx_sections(zf: zipfile.ZipFile) -> Iterator[OfficeSection]:
+    names = zf.namelist()
+    for name in _numbered(names, "word/header"):
+        yield from _docx_part(zf, name, "header", "Header")
+    yield from _docx_part(zf, "word/document.xml", "body", "Document")
+    for name in ("word/footnotes.xml", "word/endnotes.xml"):
+        if name in zf.NameToInfo:
+            yield from _docx_part(zf, name, "notes", "Notes")
+    for name in _numbered(names, "word/footer"):
+        yield from _docx_part(zf, name, "footer", "Footer")
+
+
+# --- PPTX ---
+
+def _slide_paragraphs(zf: zipfile.ZipFile, name: str, skip_placeholders: Tuple[str, ...] = ()
+                      ) -> Tuple[List[str], List[str]]:
+    """(paragraph texts, table rows) of one slide or notes part.
+
+    Text of shapes that are placeholders of a type in `skip_placeholders`
+    (slide numbers, dates, ...) is dropped.
+    """
+    paragraphs: List[str] = []
+    rows: List[str] = []
+    texts: List[str] = []
+    row: List[str] = []
+    cell: List[str] = []
+    in_table = 0
+    shape_start = 0
+    skip_shape = False
+    with zf.open(name) as f:
+        for event, el in iterparse(f, events=("start", "end")):
+            tag = el.tag
+            if event == "start":
+                if tag == _A + "tbl":
+                    in_table += 1
+                elif tag == _A + "p":
+                    texts = []
+                elif tag == _P + "sp":
+                    shape_start = len(paragraphs)
+                    skip_shape = False
+                continue
+            if tag == _A + "t":
+                texts.append(el.text or "")
+            elif tag == _P + "ph":
+                skip_shape = skip_shape or el.get("type") in skip_placeholders
+            elif tag == _A + "p":
+                text = "".join(texts).strip()
+                if text:
+                    (cell if in_table else paragraphs).append(text)
+            elif tag == _A + "tc":
+                row.append(" ".join(cell))
+                cell = []
+            elif tag == _A + "tr":
+                text = _row_text(row)
+                if text:
+                    rows.append(text)
+                row = []
+            elif tag == _A + "tbl":
+                in_table -= 1
+            elif tag == _P + "sp":
+                if skip_shape:
+                    del paragraphs[shape_start:]
+                el.clear()
+    return paragraphs, rows
+
+
+def iter_pptx_sections(zf: zipfile.ZipFile) -> Iterator[OfficeSection]:
+    names = zf.namelist()
+    for n, slide in enumerate(_numbered(names, "ppt/slides/slide"), 1):
+        paragraphs, rows = _slide_paragraphs(zf, slide)
+        title = paragraphs[0] if paragraphs else ""
+        label = f"Slide {n}: {title}" if title else f"Slide {n}"
+        if paragraphs:
+            yield OfficeSection(label, "\n".join(paragraphs), "body")
+        if rows:
+            yield OfficeSection(f"{label} (table)", "\n".join(rows), "table")
+        for target in _rels(zf, slide).values():
+            if target.startswith("ppt/notesSlides/") and target in zf.NameToInfo:
+                notes, _ = _slide_paragraphs(zf, target, skip_placeholders=("sldNum", "sldImg", "hdr", "ftr", "dt"))
+                if notes:
+                    yield OfficeSection(f"Slide {n} notes", "\n".join(notes), "notes")
+
+
+# --- XLSX ---
+
+def _shared_strings(zf: zipfile.ZipFile) -> List[str]:
+    strings: List[str] = []
+    if "xl/sharedStrings.xml" not in zf.NameToInfo:
+        return strings
+    with zf.open("xl/sharedStrings.xml") as f:
+        texts: List[str] = []
+        for event, el in iterparse(f, events=("start", "end")):
+            if event == "start":
+                if el.tag == _S + "si":
+                    texts = []
+                continue
+            if el.tag == _S + "t":
+                texts.append(el.text or "")
+            elif el.tag == _S + "si":
+                strings.append("".join(texts))
+                el.clear()
+    return strings
+
+
+def iter_xlsx_sections(zf: zipfile.ZipFile, rows_per_section: int = XLSX_ROWS_PER_SECTION
+                       ) -> Iterator[OfficeSection]:
+    shared = _shared_strings(zf)
+    rels = _rels(zf, "xl/workbook.xml")
+    sheets: List[Tuple[str, str]] = []
+    with zf.open("xl/workbook.xml") as f:
+        for _, el in iterparse(f):
+            if el.tag == _S + "sheet":
+                target = rels.get(el.get(_R + "id"))
+                if target and target in zf.NameToInfo:
+                    sheets.append((el.get("name", "Sheet"), target))
+    for sheet_name, part in sheets:
+        rows: List[str] = []
+        first_row = row_number = 0
+        cells: List[str] = []
+        value = ""
+        with zf.open(part) as f:
+            for event, el in iterparse(f, events=("start", "end")):
+                tag = el.tag
+                if event == "start":
+                    if tag == _S + "c":
+                        value = ""
+                    continue
+                if tag == _S + "v":
+                    value = el.text or ""
+                elif tag == _S + "t":
+                    value += el.text or ""  # inline strings
+                elif tag == _S + "c":
+                    if el.get("t") == "s" and value.isdigit() and int(value) < len(shared):
+                        value = shared[int(value)]
+                    cells.append(value.strip())
+                elif tag == _S + "row":
+                    # `r` is optional; rows without it follow the previous one
+                    row_number = int(el.get("r") or row_number + 1)
+                    text = _row_text(cells)
+                    cells = []
+                    el.clear()
+                    if not text:
+                        continue
+                    if not rows:
+                        first_row = row_number
+                    rows.append(text)
+                    if len(rows) >= rows_per_section:
+                        yield OfficeSection(f"{sheet_name} (rows {first_row}+)", "\n".join(rows), "sheet")
+                        rows = []
+        if rows:
+            yield OfficeSection(f"{sheet_name} (rows {first_row}+)", "\n".join(rows), "sheet")
+
+
+_EXTRACTORS = {
+    "docx": iter_docx_sections,
+    "pptx": iter_pptx_sections,
+    "xlsx": iter_xlsx_sections,
+}
+
+
+def iter_office_sections(data: bytes, kind: Optional[str] = None) -> Iterator[OfficeSection]:
+    """Yield the labelled sections of a DOCX/PPTX/XLSX file held in memory.
+
+    `kind` is detected from the content when not given. Raises ValueError
+    for anything that isn't a supported Office file.
+    """
+    kind = kind or detect_office_kind(data)
+    if kind not in _EXTRACTORS:
+        raise ValueError("Not a DOCX, PPTX or XLSX file")
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        yield from _EXTRACTORS[kind](zf)
+
+
+__all__ = [
+    "OfficeSection",
+    "OFFICE_KINDS",
+    "detect_office_kind",
+    "iter_office_sections",
+    "iter_docx_sections",
+    "iter_pptx_sections",
+    "iter_xlsx_sections",
+]
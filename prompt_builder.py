@@ -0,0 +1,327 @@
+"""prompt_builder.py
+Token-budgeted prompt assembly for A.K.A.S.H.A.
+
+The chat loop used to concatenate the user prompt with document snippets,
+memory bullets and the KB block using fixed character cuts. This module
+counts tokens for the active provider/model, reserves room for the response,
+splits the remaining context budget across KB, document, memory and web
+sections by priority, removes overlapping chunks and packs the highest-ranked context
+into the window.
+"""
+from __future__ import annotations
+from typing import List, Dict, Optional, Tuple
+from dataclasses import dataclass, field
+from functools import lru_cache
+import re
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except Exception:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+
+# Context windows (tokens) for the models offered in the sidebar. Unknown
+# models fall back to the provider default.
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "qwen/qwen3-32b": 131072,
+    "gemma-7b-it": 8192,
+    "gemini-2.5-pro": 1048576,
+    "gemini-2.5-flash": 1048576,
+    "gemini-1.5-pro": 1048576,
+    "microsoft/DialoGPT-medium": 1024,
+    "facebook/blenderbot-400M-distill": 128,
+}
+
+PROVIDER_CONTEXT_WINDOWS: Dict[str, int] = {
+    "groq": 8192,
+    "gemini": 32768,
+    "huggingface": 1024,
+    "offline": 4096,
+}
+
+# tiktoken encoding used to count tokens; None counts ~4 characters per
+# token. DialoGPT and BlenderBot use GPT-2's byte-level BPE; Llama 3 and Qwen
+# vocabularies are close to cl100k_base; Gemini's SentencePiece vocabulary is
+# not available locally, so it is estimated.
+MODEL_ENCODINGS: Dict[str, Optional[str]] = {
+    "microsoft/DialoGPT-medium": "gpt2",
+    "facebook/blenderbot-400M-distill": "gpt2",
+}
+
+PROVIDER_ENCODINGS: Dict[str, Optional[str]] = {
+    "groq": "cl100k_base",
+    "gemini": None,
+    "huggingface": "gpt2",
+    "offline": "cl100k_base",
+}
+
+# Section order is also the priority order used to hand out leftover budget
+DEFAULT_SECTION_WEIGHTS: Dict[str, float] = {
+    "kb": 0.4,
+    "document": 0.4,
+    "memory": 0.2,
+    "web": 0.2,
+}
+
+# Items that would be cut below this many tokens are dropped instead
+MIN_ITEM_TOKENS = 24
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(name: str):
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # Encoding files may need a download; fall back to the heuristic
+        return None
+
+
+def context_window_for(provider: str, model: Optional[str] = None) -> int:
+    """Return the context window (tokens) for a provider/model pair"""
+    if model and model in MODEL_CONTEXT_WINDOWS:
+        return MODEL_CONTEXT_WINDOWS[model]
+    return PROVIDER_CONTEXT_WINDOWS.get(provider, 4096)
+
+
+def encoding_for(provider: str, model: Optional[str] = None) -> Optional[str]:
+    """Return the tiktoken encoding for a provider/model pair (None = estimate)"""
+    if model and model in MODEL_ENCODINGS:
+        return MODEL_ENCODINGS[model]
+    return PROVIDER_ENCODINGS.get(provider, "cl100k_base")
+
+
+class TokenCounter:
+    """Counts tokens for a provider/model.
+
+    Uses the tiktoken encoding from `encoding_for` when tiktoken is
+    available; otherwise (and for providers without a local tokenizer)
+    estimates ~4 characters per token.
+    """
+
+    def __init__(self, provider: str = "groq", model: Optional[str] = None):
+        self.provider = provider
+        self.model = model
+        self.encoding = encoding_for(provider, model)
+        self._enc = _get_encoding(self.encoding) if self.encoding else None
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._enc is not None:
+            return len(self._enc.encode(text, disallowed_special=()))
+        return max(1, (len(text) + 3) // 4)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut `text` to at most `max_tokens`, preferring a sentence boundary"""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        # Leave one token for the trailing ellipsis
+        if self._enc is not None:
+            cut = self._enc.decode(self._enc.encode(text, disallowed_special=())[:max_tokens - 1])
+        else:
+            cut = text[:(max_tokens - 1) * 4]
+        boundary = max(cut.rfind(". "), cut.rfind("\n"))
+        if boundary > len(cut) // 2:
+            cut = cut[:boundary + 1]
+        return cut.rstrip() + "..."
+
+
+@dataclass
+class ContextItem:
+    """A retrieved piece of context competing for prompt space"""
+    text: str
+    source: str                            # "kb", "document", "memory" or "web"
+    title: Optional[str] = None
+    score: Optional[float] = None
+    url: Optional[str] = None
+
+
+@dataclass
+class BuiltPrompt:
+    """Result of `PromptBuilder.build`"""
+    text: str
+    tokens: int
+    budget: int
+    sections: Dict[str, int] = field(default_factory=dict)
+    dropped: int = 0
+    duplicates: int = 0
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def dedupe_items(items: List[ContextItem], threshold: float = 0.8) -> Tuple[List[ContextItem], int]:
+    """Drop items whose word shingles mostly overlap an earlier (higher-ranked) item.
+
+    Uses the overlap coefficient so a chunk fully contained in a longer one
+    (e.g. a memory bullet that repeats a document passage) is also removed.
+    """
+    kept: List[ContextItem] = []
+    kept_shingles: List[set] = []
+    dupes = 0
+    for item in items:
+        sh = _shingles(item.text)
+        if not sh:
+            dupes += 1
+            continue
+        is_dup = False
+        for other in kept_shingles:
+            overlap = len(sh & other) / min(len(sh), len(other))
+            if overlap >= threshold:
+                is_dup = True
+                break
+        if is_dup:
+            dupes += 1
+            continue
+        kept.append(item)
+        kept_shingles.append(sh)
+    return kept, dupes
+
+
+class PromptBuilder:
+    """Assembles the final LLM prompt within a token budget.
+
+    The budget is the smaller of `context_budget` and what fits in the model
+    window after the query, the reserved response tokens and a safety margin.
+    Each non-empty section gets a weighted share; tokens a section does not use
+    are handed to the remaining sections in priority order.
+    """
+
+    def __init__(self, provider: str = "groq", model: Optional[str] = None, max_output_tokens: int = 512,
+                 context_budget: int = 3000, weights: Optional[Dict[str, float]] = None,
+                 safety_margin: int = 64):
+        self.counter = TokenCounter(provider, model)
+        self.window = context_window_for(provider, model)
+        self.max_output_tokens = max_output_tokens
+        self.context_budget = context_budget
+        self.weights = dict(weights or DEFAULT_SECTION_WEIGHTS)
+        self.safety_margin = safety_margin
+
+    def _format_item(self, item: ContextItem, index: int) -> str:
+        if item.source == "kb":
+            header = f"{index}. **{item.title or 'Untitled'}**"
+            if item.score is not None:
+                header += f" (Relevance: {item.score})"
+            return f"{header}\n   {item.text}"
+        if item.source == "memory":
+            return f"• {item.text}"
+        if item.source == "web":
+            return f"{index}. **{item.title or item.url}** ({item.url})\n   {item.text}"
+        return item.text
+
+    def _pack(self, items: List[ContextItem], budget: int, start_index: int = 1) -> Tuple[List[str], int, int]:
+        """Greedily pack items in rank order; returns (formatted, used, consumed_count)"""
+        out: List[str] = []
+        used = 0
+        consumed = 0
+        for item in items:
+            remaining = budget - used
+            if remaining < MIN_ITEM_TOKENS:
+                break
+            formatted = self._format_item(item, start_index + len(out))
+            cost = self.counter.count(formatted) + 1
+            if cost > remaining:
+                overhead = cost - self.counter.count(item.text)
+                allowed = remaining - overhead
+                if allowed < MIN_ITEM_TOKENS:
+                    break
+                item = ContextItem(text=self.counter.truncate(item.text, allowed), source=item.source,
+                                   title=item.title, score=item.score, url=item.url)
+                formatted = self._format_item(item, start_index + len(out))
+                cost = self.counter.count(formatted) + 1
+                if cost > remaining:
+                    break
+            out.append(formatted)
+            used += cost
+            consumed += 1
+        return out, used, consumed
+
+    def build(self, query: str, kb: Optional[List[ContextItem]] = None,
+              documents: Optional[List[ContextItem]] = None, memory: Optional[List[ContextItem]] = None,
+              preamble: str = "", web: Optional[List[ContextItem]] = None) -> BuiltPrompt:
+        """Build the prompt. Items in each list must already be in rank order."""
+        query_tokens = self.counter.count(query) + self.counter.count(preamble)
+        room = self.window - self.max_output_tokens - self.safety_margin - query_tokens
+        budget = max(0, min(self.context_budget, room))
+
+        # Deduplicate across all sections, in section priority order
+        ordered = [(name, list(items or [])) for name, items in
+                   (("kb", kb), ("document", documents), ("memory", memory), ("web", web))]
+        flat = [it for _, items in ordered for it in items]
+        unique, dupes = dedupe_items(flat)
+        unique_ids = {id(it) for it in unique}
+        sections = {name: [it for it in items if id(it) in unique_ids] for name, items in ordered}
+
+        active = [name for name in ("kb", "document", "memory", "web") if sections[name]]
+        total_weight = sum(self.weights.get(n, 0.0) for n in active) or 1.0
+        packed: Dict[str, List[str]] = {n: [] for n in sections}
+        consumed: Dict[str, int] = {n: 0 for n in sections}
+        used_total = 0
+        for name in active:
+            share = int(budget * self.weights.get(name, 0.0) / total_weight)
+            out, used, n = self._pack(sections[name], share)
+            packed[name], consumed[name] = out, n
+            used_total += used
+
+        # Second pass: hand leftover tokens to sections with items still waiting
+        for name in active:
+            leftover = budget - used_total
+            if leftover < MIN_ITEM_TOKENS:
+                break
+            rest = sections[name][consumed[name]:]
+            if not rest:
+                continue
+            out, used, n = self._pack(rest, leftover, start_index=len(packed[name]) + 1)
+            packed[name].extend(out)
+            consumed[name] += n
+            used_total += used
+
+        if query_tokens > self.window - self.max_output_tokens - self.safety_margin:
+            query = self.counter.truncate(query, max(MIN_ITEM_TOKENS, self.window - self.max_output_tokens - self.safety_margin))
+
+        parts = [preamble] if preamble else []
+        parts.append(query)
+        if packed["document"]:
+            parts.append("Relevant document content:\n" + "\n\n".join(packed["document"]))
+        if packed["memory"]:
+            parts.append("Relevant past context:\n" + "\n".join(packed["memory"]))
+        if packed["kb"]:
+            parts.append("📚 **Knowledge Base Results:**\n\n" + "\n\n".join(packed["kb"]))
+        if packed["web"]:
+            parts.append("🌐 **Web Results:**\n\n" + "\n\n".join(packed["web"]))
+        text = "\n\n".join(parts)
+
+        dropped = sum(len(sections[n]) - consumed[n] for n in sections)
+        return BuiltPrompt(
+            text=text,
+            tokens=self.counter.count(text),
+            budget=budget,
+            sections={n: len(packed[n]) for n in packed},
+            dropped=dropped,
+            duplicates=dupes,
+        )
+
+
+__all__ = [
+    "TokenCounter",
+    "ContextItem",
+    "BuiltPrompt",
+    "PromptBuilder",
+    "context_window_for",
+    "encoding_for",
+    "dedupe_items",
+]
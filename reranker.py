@@ -0,0 +1,236 @@
+"""reranker.py
+Second-stage reranking of retrieved context for A.K.A.S.H.A.
+
+First-stage retrieval (KB keyword search, memory recency/substring scoring,
+document chunk term matching and, when enabled, web search) is cheap but
+imprecise. This module widens the candidate set from all sources, rescoring it with a local CPU
+cross-encoder in batches and keeping only the best few passages for the prompt.
+
+The cross-encoder is optional: if `sentence-transformers` is not installed, the
+model cannot be loaded, or scoring exceeds the latency budget, candidates are
+returned in first-stage order so the chat path never blocks on reranking.
+"""
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Callable, Sequence, Tuple, Union
+from dataclasses import dataclass, field
+import time
+import threading
+
+from config import CONFIG
+
+try:
+    from sentence_transformers import CrossEncoder
+    CROSS_ENCODER_AVAILABLE = True
+except Exception:
+    CrossEncoder = None
+    CROSS_ENCODER_AVAILABLE = False
+
+
+# Maximum characters of a candidate passed to the cross-encoder; MiniLM-style
+# models truncate at 512 tokens anyway, so longer inputs only cost tokenization.
+MAX_CANDIDATE_CHARS = 1200
+
+ScoreFn = Callable[[List[Tuple[str, str]]], Sequence[float]]
+
+
+@dataclass
+class Candidate:
+    """A retrieved passage competing for a slot in the prompt"""
+    text: str
+    source: str                            # "kb", "memory", "document" or "web"
+    first_stage_score: float = 0.0
+    rerank_score: Optional[float] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def gather_candidates(query: str, kb_manager: Any = None, memory_manager: Any = None,
+                      doc_data: Optional[Dict[str, Any]] = None, limit: int = 50,
+                      web_results: Union[Sequence[Any], Callable[[], Sequence[Any]], None] = None,
+                      exclude_memory_ids: Sequence[str] = ()) -> List[Candidate]:
+    """Collect a wide first-stage candidate set from KB, memory, document chunks
+    and web results (`WebResult`s from web_retrieval, already ranked).
+
+    `web_results` may be a callable; it is called after the local sources
+    are collected, so a web search started beforehand overlaps them.
+    Memories in `exclude_memory_ids` (e.g. the prompt itself, just stored)
+    are left out before ranking so they never take a top-n slot.
+
+    Sources are interleaved round-robin so the first-stage order (used when
+    reranking is unavailable) keeps the best hit of every source near the top.
+    """
+    per_source: List[List[Candidate]] = []
+
+    if kb_manager is not None:
+        kb_cands = []
+        try:
+            for r in kb_manager.search(query, top_k=limit):
+                kb_cands.append(Candidate(
+                    text=r.get('passage') or r['content'],
+                    source="kb",
+                    first_stage_score=float(r.get('relevance', 0.0)),
+                    metadata={'id': r['id'], 'title': r['title'], 'category': r.get('category')},
+                ))
+        except Exception:
+            kb_cands = []
+        per_source.append(kb_cands)
+
+    if doc_data:
+        doc_cands = []
+        terms = [t for t in query.lower().split() if t]
+        for idx, chunk in enumerate(doc_data.get("text_content", [])):
+            low = chunk.lower()
+            hits = sum(1 for t in terms if t in low)
+            if hits:
+                doc_cands.append(Candidate(
+                    text=chunk, source="document", first_stage_score=float(hits), metadata={'chunk': idx}
+                ))
+        doc_cands.sort(key=lambda c: c.first_stage_score, reverse=True)
+        per_source.append(doc_cands[:limit])
+
+    if memory_manager is not None:
+        mem_cands = []
+        exclude = set(exclude_memory_ids)
+        try:
+            for m in memory_manager.query(query, top_k=limit + len(exclude)):
+                if m.id in exclude:
+                    continue
+                mem_cands.append(Candidate(
+                    text=m.content, source="memory", metadata={'id': m.id, **(m.metadata or {})}
+                ))
+        except Exception:
+            mem_cands = []
+        per_source.append(mem_cands[:limit])
+
+    if callable(web_results):
+        web_results = web_results()
+    if web_results:
+        per_source.append([
+            Candidate(
+                text=r.snippet or r.title, source="web", first_stage_score=1.0 / max(1, r.position),
+                metadata={'title': r.title, 'url': r.url},
+            )
+            for r in web_results[:limit]
+        ])
+
+    merged: List[Candidate] = []
+    seen = set()
+    depth = max((len(c) for c in per_source), default=0)
+    for i in range(depth):
+        for cands in per_source:
+            if i < len(cands):
+                key = cands[i].text.strip()
+                if key and key not in seen:
+                    seen.add(key)
+                    merged.append(cands[i])
+    return merged[:limit]
+
+
+class CrossEncoderReranker:
+    """Batch cross-encoder reranker with a latency budget.
+
+    `score_fn` may be supplied to plug in a different scorer (e.g. a remote
+    reranking endpoint or a stub in tests); it receives a batch of
+    (query, passage) pairs and returns one relevance score per pair.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size: int = 16,
+                 budget_ms: int = 400, score_fn: Optional[ScoreFn] = None):
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.budget_ms = budget_ms
+        self._score_fn = score_fn
+        self._model = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+        self.last_stats: Dict[str, Any] = {}
+
+    @property
+    def available(self) -> bool:
+        return self._score_fn is not None or (CROSS_ENCODER_AVAILABLE and not self._load_failed)
+
+    def _get_scorer(self) -> Optional[ScoreFn]:
+        if self._score_fn is not None:
+            return self._score_fn
+        if not CROSS_ENCODER_AVAILABLE or self._load_failed:
+            return None
+        with self._lock:
+            if self._model is None:
+                try:
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                except Exception:
+                    self._load_failed = True
+                    return None
+        model = self._model
+        return lambda pairs: model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+    def rerank(self, query: str, candidates: List[Candidate], top_n: int = 5) -> List[Candidate]:
+        """Return the `top_n` best candidates.
+
+        Falls back to first-stage order if no scorer is available, scoring
+        raises, or the latency budget is exhausted before all batches finish.
+        """
+        if not candidates:
+            self.last_stats = {'reranked': False, 'candidates': 0}
+            return []
+
+        scorer = self._get_scorer()
+        if scorer is None:
+            self.last_stats = {'reranked': False, 'reason': 'unavailable', 'candidates': len(candidates)}
+            return candidates[:top_n]
+
+        # Budget starts after the (one-time) model load so warm-up is not
+        # mistaken for a slow query.
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000.0
+        scores: List[float] = []
+        try:
+            for i in range(0, len(candidates), self.batch_size):
+                if time.perf_counter() > deadline:
+                    self.last_stats = {
+                        'reranked': False, 'reason': 'budget_exceeded', 'candidates': len(candidates),
+                        'scored': len(scores), 'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+                    }
+                    return candidates[:top_n]
+                batch = candidates[i:i + self.batch_size]
+                pairs = [(query, c.text[:MAX_CANDIDATE_CHARS]) for c in batch]
+                scores.extend(float(s) for s in scorer(pairs))
+        except Exception as e:
+            self.last_stats = {'reranked': False, 'reason': f'error: {e}', 'candidates': len(candidates)}
+            return candidates[:top_n]
+
+        for cand, score in zip(candidates, scores):
+            cand.rerank_score = score
+        # Stable sort keeps first-stage order among equal scores
+        ranked = sorted(candidates, key=lambda c: c.rerank_score, reverse=True)
+        self.last_stats = {
+            'reranked': True, 'candidates': len(candidates),
+            'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        }
+        return ranked[:top_n]
+
+
+def group_by_source(candidates: List[Candidate]) -> Dict[str, List[Candidate]]:
+    """Split a reranked list back into per-source lists, preserving rank order"""
+    grouped: Dict[str, List[Candidate]] = {"kb": [], "document": [], "memory": [], "web": []}
+    for c in candidates:
+        grouped.setdefault(c.source, []).append(c)
+    return grouped
+
+
+# Global singleton instance
+_reranker: Optional[CrossEncoderReranker] = None
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Get or create the reranker singleton configured from CONFIG"""
+    global _reranker
+    if _reranker is None:
+        _reranker = CrossEncoderReranker(
+            model_name=CONFIG.rerank_model,
+            batch_size=CONFIG.rerank_batch_size,
+            budget_ms=CONFIG.rerank_budget_ms,
+        )
+    return _reranker
+
+
+__all__ = ["Candidate", "CrossEncoderReranker", "gather_candidates", "group_by_source", "get_reranker"]
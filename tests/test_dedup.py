@@ -0,0 +1,65 @@
+from dedup import NearDuplicateIndex, estimate_similarity, minhash_signature
+from knowledge_base import KnowledgeBaseManager
+
+ARTICLE = (
+    "To reset your password open the account settings page, choose security, "
+    "click reset password and follow the link sent to your registered email address. "
+    "The link expires after thirty minutes, after which a new one must be requested."
+)
+
+
+def test_signature_similarity_tracks_jaccard():
+    a = minhash_signature(ARTICLE)
+    b = minhash_signature(ARTICLE.replace("thirty", "sixty"))
+    c = minhash_signature("Invoices are generated on the first business day of every month.")
+    assert estimate_similarity(a, a) == 1.0
+    assert estimate_similarity(a, b) > 0.6
+    assert estimate_similarity(a, c) < 0.2
+    assert minhash_signature("   ") is None
+
+
+def test_index_find_remove_and_persist(tmp_path):
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add("a", ARTICLE)
+    index.add("b", "Shipping usually takes three to five business days within the country.")
+    match = index.find(ARTICLE + " ")
+    assert match is not None and match[0] == "a"
+    assert index.find("Something entirely unrelated about cooking pasta at home tonight.") is None
+
+    path = tmp_path / "sig.json"
+    assert index.save(str(path))
+    loaded = NearDuplicateIndex.load(str(path))
+    assert loaded.find(ARTICLE)[0] == "a"
+    assert loaded.remove("a") and loaded.find(ARTICLE) is None
+
+
+def test_lookup_examines_few_candidates_on_large_index():
+    index = NearDuplicateIndex()
+    texts = [f"memory {i} about topic {i * 7} with detail {i * 13} and more {i}" for i in range(5000)]
+    for i, text in enumerate(texts):
+        index.add(f"k{i}", text)
+    for i in range(0, 5000, 50):
+        assert index.find(texts[i])[0] == f"k{i}"
+    # LSH buckets narrow each lookup to a handful of signatures, not a scan of all 5000
+    assert index.candidates_examined <= 100 * 10
+    before = index.candidates_examined
+    assert index.find(ARTICLE) is None
+    assert index.candidates_examined - before <= 10
+
+
+def test_kb_manager_skips_merges_and_links(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    kb = KnowledgeBaseManager()
+    first = kb.add_from_text("Reset password", ARTICLE, tags=["setup"])
+    assert kb.add_from_text("Reset password (copy)", ARTICLE) == first
+    assert kb.add_from_text("Reset", ARTICLE, tags=["security"], on_duplicate="merge") == first
+    assert kb.store.get_document(first).tags == ["setup", "security"]
+    linked = kb.add_from_text("Reset again", ARTICLE, on_duplicate="link")
+    assert kb.store.get_document(linked).metadata["duplicate_of"] == first
+
+    # Signatures persist next to the backup and are reused on restart
+    assert (tmp_path / "kb" / "kb_minhash.json").exists()
+    restarted = KnowledgeBaseManager()
+    assert restarted.find_duplicate(ARTICLE)[0].id in (first, linked)
+    assert restarted.delete(first) and restarted.delete(linked)
+    assert restarted.find_duplicate(ARTICLE) is None
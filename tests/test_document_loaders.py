@@ -0,0 +1,119 @@
+import hashlib
+import io
+
+import pytest
+
+import document_loaders
+from document_loaders import (
+    decode_text, file_digest, iter_blocks, iter_chunks, iter_text_segments,
+    choose_ocr_dpi, looks_like_text, printable_strings, temp_file,
+)
+
+
+def test_decode_text_drops_bom_and_invalid_bytes():
+    assert decode_text(b"\xef\xbb\xbfhello \xff world") == "hello  world"
+
+
+def test_printable_strings_splits_on_control_bytes():
+    data = b"abc\x00header text\x01\x02\xff" + "résumé of a naïve plan".encode() + b"\x00xy"
+    assert printable_strings(data, min_len=5) == "header text\nrésumé of a naïve plan"
+    assert printable_strings(b"\x00\x01") == ""
+    # Stray high bytes split runs instead of passing as text
+    assert printable_strings(b"\x00" + bytes(range(0x80, 0xf5)) * 20 + b"\x00") == ""
+    assert printable_strings(b"\x00abc\xe9\xff\x90 text run\xc3(") == " text run"
+
+
+def test_looks_like_text():
+    assert looks_like_text("नमस्ते दुनिया, hello\n".encode())
+    assert not looks_like_text(bytes(range(32)) * 8)
+    assert not looks_like_text(b"")
+
+
+def test_temp_file_is_unique_and_removed(tmp_path):
+    with temp_file(b"one", suffix=".pdf", directory=str(tmp_path)) as a, \
+            temp_file(b"two", suffix=".pdf", directory=str(tmp_path)) as b:
+        assert a != b
+        assert a.read_bytes() == b"one" and b.read_bytes() == b"two"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_temp_file_removed_on_error(tmp_path):
+    with pytest.raises(ValueError):
+        with temp_file(b"data", directory=str(tmp_path)):
+            raise ValueError("boom")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_pdf_pages_text_without_backend(monkeypatch):
+    monkeypatch.setattr(document_loaders, "PYPDF_AVAILABLE", False)
+    monkeypatch.setattr(document_loaders, "PYMUPDF_AVAILABLE", False)
+    with pytest.raises(RuntimeError):
+        document_loaders.pdf_pages_text(b"%PDF-1.4")
+
+
+def _sliced(text, size=1000, overlap=200):
+    return [text[i:i + size] for i in range(0, len(text), size - overlap)]
+
+
+@pytest.mark.parametrize("block_size", [3, 64, 4096])
+def test_streamed_chunks_match_whole_text(block_size):
+    text = "\ufeffline one ü\n" + "दुनिया words and more words\n" * 200
+    data = text.encode("utf-8")
+    segments = iter_text_segments(iter_blocks(io.BytesIO(data), block_size), block_size)
+    assert list(iter_chunks(segments)) == _sliced(text.lstrip("\ufeff"))
+
+
+def test_text_segments_cut_at_newlines_and_cap_long_lines():
+    segments = list(iter_text_segments([b"first\nsec", b"ond\nno", b"x" * 20], block_size=8))
+    assert segments == ["first\n", "second\n", "no" + "x" * 20]
+
+
+def test_file_digest_rewinds():
+    f = io.BytesIO(b"payload" * 1000)
+    assert file_digest(f, block_size=100) == hashlib.sha256(b"payload" * 1000).hexdigest()
+    assert f.tell() == 0
+
+
+def _mixed_pdf(fitz):
+    """Page 1 has a text layer, page 2 is an image only (a 'scan'), page 3 is blank"""
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Quarterly revenue grew by twelve percent.")
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    pix.clear_with(200)
+    doc.new_page().insert_image(fitz.Rect(0, 0, 200, 200), pixmap=pix)
+    doc.new_page()
+    return doc.tobytes()
+
+
+def test_pdf_extract_pages_ocrs_only_scanned_pages():
+    fitz = pytest.importorskip("fitz")
+    calls = []
+
+    def fake_ocr(image):
+        calls.append(image.mode)
+        return "Scanned invoice total 42"
+
+    pages = document_loaders.pdf_extract_pages(_mixed_pdf(fitz), ocr=fake_ocr, dpi=30)
+    assert [p.number for p in pages] == [1, 2, 3]
+    assert "Quarterly revenue" in pages[0].text and not pages[0].ocr
+    assert pages[1].text == "Scanned invoice total 42" and pages[1].ocr
+    assert pages[2].text.strip() == "" and not pages[2].ocr
+    assert calls == ["L"]
+
+
+def test_choose_ocr_dpi_adapts_to_page_size_and_density():
+    letter = choose_ocr_dpi(612, 792)
+    assert choose_ocr_dpi(612 * 2, 792 * 2) < letter < choose_ocr_dpi(226, 400)
+    assert choose_ocr_dpi(612, 792, density=0.0) == document_loaders.OCR_MIN_DPI
+    assert choose_ocr_dpi(612, 792, density=0.3) > choose_ocr_dpi(612, 792, density=0.05)
+    assert choose_ocr_dpi(30, 40) == document_loaders.OCR_MAX_DPI
+
+
+def test_render_page_for_ocr_is_grayscale_and_capped():
+    fitz = pytest.importorskip("fitz")
+    pytest.importorskip("PIL")
+    doc = fitz.open(stream=_mixed_pdf(fitz), filetype="pdf")
+    image = document_loaders.render_page_for_ocr(doc[0], max_pixels=200_000, binarize=True)
+    assert image.mode == "L"
+    assert image.width * image.height <= 200_000
+    assert set(image.getdata()) <= {0, 255}
@@ -0,0 +1,50 @@
+from history import ConversationHistory
+
+
+def _chat(n):
+    msgs = []
+    for i in range(n):
+        msgs.append({"role": "user", "content": f"Question number {i} about topic {i}. " + "filler " * 20})
+        msgs.append({"role": "assistant", "content": f"Answer number {i}. " + "detail " * 20})
+    return msgs
+
+
+def test_short_chat_is_sent_verbatim():
+    h = ConversationHistory(window_tokens=1000)
+    block = h.build_context(_chat(2))
+    assert "Question number 0" in block and "Answer number 1" in block
+    assert h.summary == ""
+
+
+def test_old_turns_folded_once_into_summary():
+    calls = []
+
+    def summarizer(previous, turns):
+        calls.append(len(turns))
+        return (previous + "\n" if previous else "") + f"{len(turns)} turns"
+
+    h = ConversationHistory(window_tokens=200, summary_tokens=100)
+    msgs = _chat(10)
+    block = h.build_context(msgs, summarizer=summarizer)
+    assert "Summary of earlier conversation" in block
+    assert "Answer number 9" in block
+    first_mark = h.summarized_upto
+
+    # Re-running on the same history does not re-summarize anything
+    h.build_context(msgs, summarizer=summarizer)
+    assert len(calls) == 1
+
+    # New turns only fold the messages that fell off since the last mark
+    msgs += _chat(12)[20:]
+    h.build_context(msgs, summarizer=summarizer)
+    assert sum(calls) == h.summarized_upto
+    assert h.summarized_upto > first_mark
+
+
+def test_failing_summarizer_falls_back_to_extractive():
+    def broken(previous, turns):
+        raise RuntimeError("llm down")
+
+    h = ConversationHistory(window_tokens=150)
+    h.build_context(_chat(6), summarizer=broken)
+    assert "User asked: Question number 0" in h.summary
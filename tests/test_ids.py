@@ -0,0 +1,33 @@
+import threading
+import time
+
+from ids import new_id, ulid_timestamp
+
+
+def test_ids_are_unique_and_sorted_under_threads():
+    out = []
+    per_thread = []
+    lock = threading.Lock()
+
+    def worker():
+        local = [new_id() for _ in range(2000)]
+        with lock:
+            out.extend(local)
+            per_thread.append(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(out)) == len(out) == 8000
+    # Each thread sees its own IDs in increasing order
+    assert len(per_thread) == 4
+    assert all(local == sorted(local) for local in per_thread)
+
+
+def test_ids_are_monotonic_and_carry_timestamp():
+    ids = [new_id("m") for _ in range(1000)]
+    assert ids == sorted(ids)
+    assert all(i.startswith("m_") and len(i) == 28 for i in ids)
+    assert abs(ulid_timestamp(ids[0][2:]) - time.time()) < 5
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def ingest(tmp_path, monkeypatch):
+    # The pipeline writes its cache (and logs) relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    import ingest
+    return ingest
+
+
+def test_process_batch_reports_each_file(ingest):
+    files = [
+        ("a.txt", b"alpha document " * 100),
+        ("b.md", b"# Beta\n\nsecond document body text"),
+        ("empty.bin", b""),
+    ]
+    emitted, stages = [], []
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        batch = ingest.process_batch(files, progress=lambda s, p: stages.append((s, p)),
+                                     emit=emitted.append, executor=pool)
+
+    assert [f.name for f in emitted] == [f.name for f in batch.files]
+    by_name = {f.name: f for f in batch.files}
+    assert by_name["a.txt"].ok and "alpha document" in by_name["a.txt"].result["text_content"][0]
+    assert by_name["b.md"].ok and by_name["b.md"].size == len(files[1][1])
+    assert [f.name for f in batch.failed] == ["empty.bin"] and by_name["empty.bin"].error
+    assert all(f.elapsed_s >= 0 for f in batch.files)
+    assert stages[-1] == ("extract", 1.0)
+    assert "2/3 files processed" in batch.summary() and "1 failed" in batch.summary()
+
+
+def test_process_batch_isolates_worker_errors(ingest, monkeypatch):
+    real = ingest.process_document
+
+    def flaky(upload, **kwargs):
+        if upload.name == "bad.txt":
+            raise ValueError("parser exploded")
+        return real(upload, **kwargs)
+
+    monkeypatch.setattr(ingest, "process_document", flaky)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        batch = ingest.process_batch([("bad.txt", b"x" * 50), ("good.txt", b"good text " * 20)],
+                                     executor=pool)
+    by_name = {f.name: f for f in batch.files}
+    assert by_name["good.txt"].ok
+    assert not by_name["bad.txt"].ok and "parser exploded" in by_name["bad.txt"].error
+
+
+def test_merge_into_corpus_keeps_sources_aligned(ingest):
+    corpus = ingest.merge_into_corpus(None, "a.txt", {"type": "simple", "text_content": ["a1", "a2"]})
+    corpus = ingest.merge_into_corpus(corpus, "b.pdf", {
+        "type": "simple", "text_content": ["b1"], "pages": [3],
+    })
+    assert corpus["text_content"] == ["a1", "a2", "b1"]
+    assert corpus["sources"] == ["a.txt", "a.txt", "b.pdf"]
+    assert corpus["pages"] == [None, None, 3]
+    assert corpus["chunks"] == corpus["text_content"]
+
+    # Re-uploading a file replaces its chunks instead of duplicating them
+    corpus = ingest.merge_into_corpus(corpus, "a.txt", {"type": "simple", "text_content": ["a3"]})
+    assert corpus["text_content"] == ["b1", "a3"]
+    assert corpus["sources"] == ["b.pdf", "a.txt"]
+    assert corpus["pages"] == [3, None]
+    assert len(corpus["sections"]) == 2
+
+
+def crashing_worker(name, data, ocr_langs=None):
+    """Pool worker that kills its process on one file, like a native parser crash"""
+    import os
+    import ingest
+
+    if name == "crash.txt":
+        os._exit(1)
+    return ingest._process_file(name, data, ocr_langs)
+
+
+def test_process_batch_isolates_a_crashing_worker_process(ingest, monkeypatch):
+    monkeypatch.setattr(ingest.CONFIG, "ingest_processes", 2)
+    monkeypatch.setattr(ingest, "_batch_pool", None)
+    files = [(f"f{i}.txt", f"document {i} text".encode()) for i in range(6)]
+    files.insert(1, ("crash.txt", b"boom"))
+    try:
+        first_pool = ingest.get_batch_pool()
+        batch = ingest.process_batch(files, worker=crashing_worker)
+        # The broken shared pool was replaced, not reused
+        assert ingest.get_batch_pool() is not first_pool
+    finally:
+        if ingest._batch_pool is not None:
+            ingest._batch_pool.shutdown()
+
+    by_name = {f.name: f for f in batch.files}
+    assert len(batch.files) == len(files)
+    assert [f.name for f in batch.failed] == ["crash.txt"]
+    assert "crashed" in by_name["crash.txt"].error
+    assert all(by_name[f"f{i}.txt"].ok for i in range(6))
+
+
+def test_iter_text_chunks_yields_before_reading_everything(ingest):
+    data = ("line of streamed text\n" * 200_000).encode()
+    upload = ingest.UploadBuffer(data, "big.txt")
+    chunks = ingest.iter_text_chunks(upload)
+    first = next(chunks)
+    assert first.startswith("line of streamed text")
+    # Only the first block(s) have been read so far
+    assert upload.tell() < len(data)
+    assert sum(1 for _ in chunks) > 1
@@ -0,0 +1,48 @@
+import os
+import time
+
+from ingest_cache import IngestionCache, cache_key, content_digest
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = IngestionCache(str(tmp_path / "ingest"))
+    key = cache_key(content_digest(b"report"), {"chunk_size": 1000})
+    assert cache.get(key) is None
+    value = {"type": "simple", "chunks": ["ünïcode chunk"], "text_content": ["ünïcode chunk"]}
+    assert cache.put(key, value)
+    # A fresh instance (new process / restart) sees the same entry
+    assert IngestionCache(str(tmp_path / "ingest")).get(key) == value
+    stats = cache.get_stats()
+    assert stats["entries"] == 1 and stats["misses"] == 1
+
+
+def test_key_depends_on_pipeline_config():
+    digest = content_digest(b"same bytes")
+    assert cache_key(digest, {"chunk_size": 1000}) == cache_key(digest, {"chunk_size": 1000})
+    assert cache_key(digest, {"chunk_size": 1000}) != cache_key(digest, {"chunk_size": 500})
+    assert cache_key(digest, {"chunk_size": 1000}) != cache_key(digest, {"chunk_size": 1000}, version=999)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    payload = {"chunks": [os.urandom(2000).hex()]}
+    cache = IngestionCache(str(tmp_path / "ingest"), max_bytes=6000)
+    keys = [cache_key(content_digest(bytes([i])), {}) for i in range(3)]
+    for i, key in enumerate(keys[:2]):
+        cache.put(key, payload)
+        os.utime(cache._path(key), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get(keys[0])  # refresh: keys[1] is now the oldest
+    cache.put(keys[2], payload)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == payload and cache.get(keys[2]) == payload
+    assert cache.size_bytes() <= 6000
+
+
+def test_puts_under_the_cap_do_not_rescan(tmp_path, monkeypatch):
+    cache = IngestionCache(str(tmp_path / "ingest"), max_bytes=10_000_000)
+    scans = []
+    real_entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or real_entries())
+    for i in range(50):
+        cache.put(cache_key(content_digest(bytes([i])), {}), {"chunks": ["x" * 100]})
+    assert len(scans) == 1  # only the first write sizes the directory
+    assert cache._size == cache.size_bytes()
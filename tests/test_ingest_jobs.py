@@ -0,0 +1,89 @@
+import threading
+import time
+
+from ingest_jobs import IngestionQueue
+
+
+def _wait(job, timeout=5.0):
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+def test_job_runs_and_reports_stages():
+    queue = IngestionQueue(max_workers=1)
+    stages = []
+
+    def work(text, progress):
+        progress("chunk", 0.5)
+        stages.append(queue.jobs()[0].stage)
+        return text.upper()
+
+    job = queue.submit("doc.txt", work, "hello")
+    assert _wait(job).state == "done"
+    assert job.result == "HELLO" and job.stage == "done" and job.progress == 1.0
+    assert stages == ["chunk"]
+    queue.shutdown()
+
+
+def test_failure_and_cancel():
+    queue = IngestionQueue(max_workers=1)
+    failed = queue.submit("bad.pdf", lambda progress: 1 / 0)
+    assert _wait(failed).state == "failed" and "division" in failed.error
+
+    started = threading.Event()
+
+    def slow(progress):
+        started.set()
+        while True:
+            progress("ocr", 0.1)
+            time.sleep(0.01)
+
+    job = queue.submit("scan.pdf", slow)
+    assert started.wait(5)
+    assert queue.cancel(job.job_id)
+    assert _wait(job).state == "cancelled"
+    assert not queue.cancel(job.job_id)
+    queue.shutdown()
+
+
+def test_worker_cap_queues_extra_jobs():
+    queue = IngestionQueue(max_workers=2)
+    release = threading.Event()
+    running = []
+    lock = threading.Lock()
+    peak = [0]
+
+    def work(progress):
+        with lock:
+            running.append(1)
+            peak[0] = max(peak[0], len(running))
+        release.wait(5)
+        with lock:
+            running.pop()
+
+    jobs = [queue.submit(f"doc{i}", work) for i in range(4)]
+    time.sleep(0.2)
+    assert sum(j.state == "queued" for j in jobs) == 2
+    release.set()
+    for job in jobs:
+        assert _wait(job).state == "done"
+    assert peak[0] == 2
+    assert queue.get_stats()["done"] == 4
+    queue.shutdown()
+
+
+def test_partial_results_are_drained_once():
+    queue = IngestionQueue(max_workers=1)
+
+    def work(items, progress, emit):
+        for item in items:
+            emit(item)
+        return len(items)
+
+    job = _wait(queue.submit("batch", work, ["a", "b"], partial=True))
+    assert job.state == "done" and job.result == 2
+    assert job.drain() == ["a", "b"]
+    assert job.drain() == []
+    queue.shutdown()
@@ -0,0 +1,58 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from kb_import import import_path, iter_sources
+from knowledge_base import KnowledgeBaseStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return KnowledgeBaseStore()
+
+
+def _write_tree(root):
+    (root / "FAQ").mkdir(parents=True)
+    (root / "Policy").mkdir()
+    (root / "FAQ" / "reset.md").write_text("# Resetting your password\n\nUse the account page.")
+    (root / "FAQ" / "reset_copy.txt").write_text("#  Resetting your password\n\nUse the   account page.")
+    (root / "Policy" / "refunds.html").write_text(
+        "<html><title>Refund policy</title><body><p>Refunds within 30 days.</p></body></html>"
+    )
+    (root / "Policy" / "notes.bin").write_bytes(b"\x00\x01")
+    with zipfile.ZipFile(root / "extra.zip", "w") as zf:
+        zf.writestr("Tutorial/start.txt", "Getting started with the CLI.")
+
+
+def test_import_directory_with_nested_archive(store, tmp_path):
+    src = tmp_path / "help"
+    _write_tree(src)
+    stats = import_path(store, str(src), workers=2, batch_size=2)
+
+    assert stats.files_seen == 4
+    assert stats.imported == 3
+    assert stats.duplicates == 1
+    assert stats.batches == 2
+    titles = {d.title: d.category for d in store.snapshot.documents.values()}
+    assert titles["Resetting your password"] == "FAQ"
+    assert titles["Refund policy"] == "Policy"
+    assert titles["start"] == "Tutorial"
+    assert (tmp_path / "kb" / "kb_snapshot.akb").exists()
+
+    # Re-importing the same tree adds nothing
+    again = import_path(store, str(src), workers=2)
+    assert again.imported == 0 and again.duplicates == 4
+
+
+def test_iter_sources_reads_tar_archives(tmp_path):
+    path = tmp_path / "kb.tar.gz"
+    with tarfile.open(path, "w:gz") as tf:
+        data = b"Tar article body"
+        info = tarfile.TarInfo("API/auth.md")
+        info.size = len(data)
+        tf.addfile(info, io.BytesIO(data))
+    sources = list(iter_sources(str(path)))
+    assert [(s.folder, s.read()) for s in sources] == [("API", b"Tar article body")]
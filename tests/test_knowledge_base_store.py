@@ -0,0 +1,274 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from knowledge_base import KBDocument, KnowledgeBaseStore, LazyKBDocument
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return KnowledgeBaseStore()
+
+
+def _doc(i, category="FAQ", content=None):
+    return KBDocument(id=f"d{i}", title=f"Doc {i}", content=content or f"content {i}", category=category)
+
+
+def test_update_publishes_new_snapshot(store):
+    store.add_document(_doc(1))
+    before = store.snapshot
+    updated = store.update_document("d1", title="Renamed")
+    assert updated.title == "Renamed"
+    # Readers holding the old snapshot keep a consistent view
+    assert before.documents["d1"].title == "Doc 1"
+    assert store.get_document("d1").title == "Renamed"
+    assert store.snapshot.version == before.version + 1
+
+
+def test_reads_during_concurrent_writes(store):
+    errors = []
+
+    def writer():
+        for i in range(300):
+            store.add_document(_doc(i))
+
+    def reader():
+        try:
+            for _ in range(300):
+                store.search("content")
+                store.get_stats()
+        except Exception as e:  # pragma: no cover - failure path
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert store.get_stats()["total_documents"] == 300
+
+
+def test_save_and_load_roundtrip(store, tmp_path):
+    store.add_documents([_doc(1), _doc(2, category="Policy")])
+    path = tmp_path / "kb" / "backup.json"
+    assert store.save_to_disk(str(path))
+    fresh = KnowledgeBaseStore()
+    assert fresh.load_from_disk(str(path))
+    assert fresh.get_categories() == ["FAQ", "Policy"]
+    assert not list(path.parent.glob("*.tmp"))
+
+
+def test_indexes_track_add_update_delete(store):
+    store.add_documents([_doc(i, category="FAQ" if i % 2 else "Policy") for i in range(10)])
+    store.update_document("d3", category="API", content="longer content here")
+    store.delete_document("d4")
+    stats = store.get_stats()
+    assert stats["total_documents"] == 9
+    assert stats["categories"] == {"FAQ": 4, "Policy": 4, "API": 1}
+    assert stats["total_characters"] == sum(len(d.content) for d in store.snapshot.documents.values())
+    assert store.get_categories() == ["API", "FAQ", "Policy"]
+    # Most recently updated first; pages come from the updated_at index
+    assert store.list_documents()[0].id == "d3"
+    page = store.list_documents(category="FAQ", limit=2, offset=1)
+    assert len(page) == 2 and all(d.category == "FAQ" for d in page)
+
+
+def test_cursor_pagination_with_filters(store):
+    docs = []
+    for i in range(50):
+        d = _doc(i, category="FAQ" if i % 2 else "Policy")
+        d.tags = ["setup"] if i % 5 == 0 else []
+        d.updated_at = 1000.0 + i
+        docs.append(d)
+    store.add_documents(docs)
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = store.page_documents(cursor=cursor, limit=7, category="FAQ")
+        seen.extend(d.id for d in page)
+        if cursor is None:
+            break
+    expected = [f"d{i}" for i in range(49, -1, -1) if i % 2]
+    assert seen == expected
+
+    page, cursor = store.page_documents(limit=3, sort="title", descending=False, tag="setup")
+    assert [d.title for d in page] == ["Doc 0", "Doc 10", "Doc 15"]
+    page, _ = store.page_documents(cursor=cursor, limit=3, sort="title", descending=False, tag="setup")
+    assert [d.title for d in page] == ["Doc 20", "Doc 25", "Doc 30"]
+
+    page, _ = store.page_documents(query="doc 4", limit=20)
+    assert {d.id for d in page} == {"d4"} | {f"d{i}" for i in range(40, 50)}
+
+
+def test_query_filter_narrows_through_the_term_index(store):
+    docs = [_doc(i) for i in range(2000)]
+    docs[0].title = "Zebra crossing handbook"
+    docs[1].title = "The guide"
+    docs[2].tags = ["zebras"]
+    store.add_documents(docs)
+    # Candidates come from title/tag postings, not a walk over all 2000 documents
+    assert store._title_candidates(store.snapshot, "zebra") == {"d0", "d2"}
+    page, cursor = store.page_documents(query="ZEBRA", limit=5)
+    assert {d.id for d in page} == {"d0", "d2"} and cursor is None
+    # Substrings inside words and across stopwords still match
+    assert [d.id for d in store.page_documents(query="ebra cross")[0]] == ["d0"]
+    assert [d.id for d in store.page_documents(query="the gui")[0]] == ["d1"]
+    assert store.page_documents(query="no such title")[0] == []
+
+
+def test_search_returns_best_passage_of_long_document(store):
+    filler = "General notes about the product and its history. " * 60
+    target = "Refunds are issued within fourteen days of the return being received."
+    store.add_documents([
+        _doc(1, content=filler + target + " " + filler),
+        _doc(2, content="Shipping times vary by region."),
+    ])
+    assert store.snapshot.chunk_counts["d1"] > 3
+
+    hits = store.search_passages("refunds issued", top_k=5)
+    assert [h.doc.id for h in hits] == ["d1"]
+    assert any(target in p for p in hits[0].passages)
+    assert sum(len(p) for p in hits[0].passages) < len(hits[0].doc.content) / 2
+
+    # Updates and deletes keep the term index in sync
+    store.update_document("d1", content="Nothing relevant here.")
+    assert store.search_passages("refunds") == []
+    store.delete_document("d2")
+    assert "shipping" not in store.snapshot.term_index
+
+
+def test_binary_snapshot_loads_bodies_lazily(store, tmp_path):
+    long_body = "Refunds are processed within five business days. " * 200
+    docs = [_doc(i, category="Policy" if i % 2 else "FAQ") for i in range(300)]
+    docs.append(KBDocument(id="refunds", title="Refund policy", content=long_body, category="Policy", tags=["billing"]))
+    store.add_documents(docs)
+    assert store.save_to_disk()
+    path = tmp_path / "kb" / "kb_snapshot.akb"
+    assert path.read_bytes().startswith(b"AKBSNAP")
+    # Far smaller than the JSON export of the same documents
+    assert store.save_to_disk(str(tmp_path / "kb" / "export.json"))
+    assert path.stat().st_size * 4 < (tmp_path / "kb" / "export.json").stat().st_size
+
+    fresh = KnowledgeBaseStore()
+    assert fresh.load_from_disk()
+    snap = fresh.snapshot
+    assert isinstance(snap.documents["refunds"], LazyKBDocument)
+    assert snap.documents["refunds"]._content is None
+    assert fresh.get_stats() == store.get_stats()
+    assert dict(snap.term_index) == dict(store.snapshot.term_index)
+
+    hit = fresh.search_passages("refunds processed", top_k=1)[0]
+    assert hit.doc.id == "refunds" and "five business days" in hit.passages[0]
+    assert fresh.get_document("d7").content == "content 7"
+
+    # Lazily loaded documents can be updated and deleted like any other
+    fresh.update_document("refunds", content="Refunds are no longer offered.")
+    fresh.delete_document("d7")
+    assert fresh.search_passages("processed") == []
+    assert fresh.get_stats()["total_documents"] == 300
+
+
+def test_manager_warms_in_background(store, tmp_path):
+    from knowledge_base import KnowledgeBaseManager
+
+    store.add_documents([_doc(i) for i in range(50)])
+    store.save_to_disk(str(tmp_path / "kb" / "kb_backup.json"))
+
+    kb = KnowledgeBaseManager(background=True)
+    assert kb.wait_until_ready(timeout=10)
+    status = kb.load_status()
+    assert status["state"] == "ready"
+    assert status["loaded"] == status["total"] == 50
+    assert kb.get_stats()["total_documents"] == 50
+    # The legacy JSON backup is migrated to a binary snapshot
+    assert (tmp_path / "kb" / "kb_snapshot.akb").exists()
+    migrated = KnowledgeBaseStore()
+    assert migrated.load_from_disk() and migrated.get_stats()["total_documents"] == 50
+
+    # Batched JSON loads publish partial snapshots along the way
+    seen = []
+    fresh = KnowledgeBaseStore()
+    fresh.load_from_disk(str(tmp_path / "kb" / "kb_backup.json"),
+                         progress=lambda loaded, total: seen.append(len(fresh.snapshot.documents)), batch_size=20)
+    assert seen == [0, 20, 40, 50]
+
+
+def test_documents_with_many_passages_keep_postings_in_their_slot(store, tmp_path):
+    # Well over the 4095 passages that fit the old 4096 posting stride
+    body = " ".join(f"Filler sentence number {i} about nothing in particular." for i in range(60000))
+    store.add_documents([
+        KBDocument(id="big", title="Big", content=body + " The zebra appears only here.", category="FAQ"),
+        _doc(1, content="Ordinary neighbouring document."),
+    ])
+    assert store.snapshot.chunk_counts["big"] > 4096
+    assert [h.doc.id for h in store.search_passages("zebra")] == ["big"]
+
+    # Big document in the last slot: decoding must not run past the slot map
+    store.delete_document("d1")
+    assert [h.doc.id for h in store.search_passages("zebra")] == ["big"]
+
+    assert store.save_to_disk()
+    fresh = KnowledgeBaseStore()
+    assert fresh.load_from_disk()
+    assert [h.doc.id for h in fresh.search_passages("zebra")] == ["big"]
+
+
+def test_save_after_binary_load_replaces_open_snapshot(store, tmp_path, monkeypatch):
+    import knowledge_base
+
+    store.add_documents([_doc(i) for i in range(5)])
+    assert store.save_to_disk()
+    fresh = KnowledgeBaseStore()
+    assert fresh.load_from_disk()
+
+    old = fresh.get_document("d2")
+    assert fresh.update_document("d2", content="content 2 updated")
+
+    # Emulate Windows: a file that is still open cannot be replaced
+    real_replace = knowledge_base.os.replace
+
+    def windows_replace(src, dst):
+        for doc in list(fresh._lazy_docs.values()):
+            reader = doc._source and doc._source[0]
+            if reader and reader._file is not None and Path(reader.path).resolve() == Path(dst).resolve():
+                raise PermissionError("file is in use")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(knowledge_base.os, "replace", windows_replace)
+    fresh.add_document(_doc(9))
+    assert fresh.save_to_disk()
+    # Bodies stay on disk, now read from the new file
+    doc = fresh.get_document("d3")
+    assert doc._content is None and doc.content == "content 3"
+    # A version replaced before the save is kept readable by older snapshots
+    assert old.content == "content 2"
+    # Saving again releases the new file in turn
+    assert fresh.save_to_disk()
+    assert fresh.get_document("d3").content == "content 3"
+
+    reloaded = KnowledgeBaseStore()
+    assert reloaded.load_from_disk()
+    assert reloaded.get_stats()["total_documents"] == 6
+    assert reloaded.get_document("d9").content == "content 9"
+
+
+def test_unreadable_kb_fails_warmup_and_is_not_overwritten(store, tmp_path):
+    from knowledge_base import KnowledgeBaseManager
+
+    path = tmp_path / "kb" / "kb_snapshot.akb"
+    path.write_bytes(b"AKBSNAP\0" + b"\xff" * 64)  # corrupt snapshot
+
+    kb = KnowledgeBaseManager(background=False, dedup_threshold=0)
+    status = kb.load_status()
+    assert status["state"] == "failed" and status["error"]
+
+    # Writes still work in memory but never replace the unreadable file
+    kb.add_from_text("New", "fresh content")
+    assert path.read_bytes() == b"AKBSNAP\0" + b"\xff" * 64
+    assert not kb.store.save_to_disk()
+    assert kb.store.save_to_disk(str(tmp_path / "kb" / "export.json"))
+    assert kb.store.save_to_disk(force=True)
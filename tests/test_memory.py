@@ -43,5 +43,163 @@ def test_memory_retrieval_ranking():
     assert results[0].id == e1.id
 
 
+def test_memory_consolidate_merges_near_duplicates():
+    mm = MemoryManager(similarity_threshold=0.5)
+    mm.insert_memory("How do I reset my account password?")
+    mm.insert_memory("how do I reset my account password")
+    mm.insert_memory("Reset my account password please, how do I")
+    mm.insert_memory("What is the weather in Pune today?")
+    merged = mm.consolidate()
+    assert merged == 3
+    entries = mm.store.all_entries()
+    assert len(entries) == 2
+    semantic = [e for e in entries if e.metadata.get("kind") == "semantic"]
+    assert len(semantic) == 1
+    assert semantic[0].metadata["count"] == 3
+
+
+def test_memory_consolidate_is_incremental():
+    mm = MemoryManager(similarity_threshold=0.5)
+    mm.insert_memory("deploy the service to staging")
+    mm.insert_memory("deploy the service to staging now")
+    assert mm.consolidate() == 2
+    # Nothing new since the last run
+    assert mm.consolidate() == 0
+    assert mm.last_consolidation["processed"] == 0
+    mm.insert_memory("please deploy the service to staging")
+    assert mm.consolidate() == 1
+    semantic = [e for e in mm.store.all_entries() if e.metadata.get("kind") == "semantic"]
+    assert len(semantic) == 1
+    assert semantic[0].metadata["count"] == 3
+
+
+def test_memory_consolidate_sees_inserts_with_equal_timestamps(monkeypatch):
+    # A coarse clock gives every entry the same timestamp; ordering must not depend on it
+    monkeypatch.setattr(time, "time", lambda: 1000.0)
+    mm = MemoryManager(similarity_threshold=0.5)
+    mm.insert_memory("rotate the api keys every month")
+    mm.insert_memory("rotate the api keys every month please")
+    assert mm.consolidate() == 2
+    mm.insert_memory("please rotate the api keys every month")
+    assert mm.consolidate() == 1
+    assert mm.last_consolidation["processed"] == 1
+
+
+def test_memory_consolidate_runs_in_background():
+    mm = MemoryManager(similarity_threshold=0.5, auto_consolidate_every=4)
+    for _ in range(4):
+        mm.insert_memory("remember that the meeting is on friday")
+    mm.consolidate_async().result(timeout=5)
+    assert len(mm.store.all_entries()) == 1
+
+
+def test_bounded_store_evicts_oldest():
+    from memory import InMemoryStore
+    mm = MemoryManager(store=InMemoryStore(capacity=5))
+    for i in range(12):
+        mm.insert_memory(f"Message {i}")
+    contents = [e.content for e in mm.store.all_entries()]
+    assert contents == [f"Message {i}" for i in range(7, 12)]
+
+
+def test_bounded_store_keeps_important_entries():
+    from memory import InMemoryStore
+    mm = MemoryManager(store=InMemoryStore(capacity=5, protected_capacity=2))
+    mm.insert_memory("User's name is Asha", metadata={"importance": 0.9})
+    for i in range(20):
+        mm.insert_memory(f"Message {i}")
+    contents = [e.content for e in mm.store.all_entries()]
+    assert len(contents) == 5
+    assert "User's name is Asha" in contents
+    mm.prune(keep_last=2)
+    assert [e.content for e in mm.store.all_entries()] == ["User's name is Asha", "Message 19"]
+
+
+def test_bounded_store_demotes_in_time_order():
+    from memory import InMemoryStore
+    store = InMemoryStore(capacity=4, protected_capacity=1)
+    store.insert(MemoryEntry(id="p", content="old but important", metadata={"importance": 0.9}, ts=1.0))
+    store.insert(MemoryEntry(id="a", content="a", ts=2.0))
+    store.insert(MemoryEntry(id="b", content="b", ts=3.0))
+    # A more important entry demotes "p", which is still the oldest regular entry
+    store.insert(MemoryEntry(id="q", content="newer and more important", metadata={"importance": 0.95}, ts=4.0))
+    assert [e.id for e in store.all_entries()] == ["p", "a", "b", "q"]
+    store.insert(MemoryEntry(id="c", content="c", ts=5.0))
+    assert [e.id for e in store.all_entries()] == ["a", "b", "q", "c"]
+    store.prune(keep_last=2)
+    assert [e.id for e in store.all_entries()] == ["q", "c"]
+
+
+def test_memory_ids_unique_and_indexed():
+    mm = MemoryManager()
+    entries = [mm.insert_memory(f"burst {i}") for i in range(500)]
+    assert len({e.id for e in entries}) == 500
+    assert mm.get_memory(entries[10].id) is entries[10]
+    assert mm.delete_memory(entries[10].id)
+    assert mm.get_memory(entries[10].id) is None
+    assert len(mm.store.all_entries()) == 499
+
+
+def test_sharded_memory_isolates_namespaces():
+    from memory import ShardedMemoryManager
+    shards = ShardedMemoryManager(max_shards=2)
+    shards.insert_memory("alice", "my account number is 1234")
+    shards.insert_memory("bob", "I like cricket")
+    assert [m.content for m in shards.query("bob", "account")] == ["I like cricket"]
+    assert shards.shard("alice") is shards.shard("alice")
+    # Creating a third shard evicts the least recently used one
+    shards.shard("carol")
+    assert sorted(shards.namespaces()) == ["alice", "carol"]
+    assert shards.drop("alice") and shards.namespaces() == ["carol"]
+    with pytest.raises(ValueError):
+        ShardedMemoryManager(max_shards=0)
+
+
+def test_memory_shards_singleton_keeps_memories():
+    from memory import get_memory_shards
+    shards = get_memory_shards()
+    entry = shards.insert_memory("session-x", "remember the blue folder")
+    # Streamlit reruns call get_memory_shards() again and must see the same memories
+    assert get_memory_shards() is shards
+    assert get_memory_shards().shard("session-x").get_memory(entry.id) is entry
+    shards.drop("session-x")
+
+
+def test_insert_memory_merges_near_duplicates():
+    from dedup import NearDuplicateIndex
+    from memory import InMemoryStore
+
+    mm = MemoryManager(dedup=NearDuplicateIndex(threshold=0.8))
+    answer = "The office is open from nine in the morning until six in the evening on weekdays."
+    first = mm.insert_memory(answer, metadata={"role": "assistant"})
+    again = mm.insert_memory(answer + " ", metadata={"source": "chat"})
+    assert again is first
+    assert first.metadata == {"role": "assistant", "source": "chat", "duplicates": 1}
+    assert len(mm.store) == 1
+    # The refreshed entry replaces its old slot rather than appearing twice
+    assert mm.store.all_entries() == [first]
+    assert mm.query("office") == [first]
+
+    other = mm.insert_memory("Parking is free for visitors at the north entrance gate.")
+    mm.insert_memory(answer)
+    assert mm.store.all_entries() == [other, first]
+    mm.prune(keep_last=1)
+    assert mm.store.all_entries() == [first]
+    assert mm.consolidate() == 0
+    assert mm.store.all_entries() == [first]
+
+    linking = MemoryManager(dedup=NearDuplicateIndex(threshold=0.8), on_duplicate="link")
+    a = linking.insert_memory(answer)
+    b = linking.insert_memory(answer)
+    assert b.metadata["duplicate_of"] == a.id
+
+    # Evicted entries are not reported as duplicates
+    bounded = MemoryManager(store=InMemoryStore(capacity=1), dedup=NearDuplicateIndex(threshold=0.8))
+    bounded.insert_memory(answer)
+    bounded.insert_memory("Completely different note about parking at the north entrance gate.")
+    assert len(bounded.store) == 1
+    assert bounded.insert_memory(answer).metadata.get("duplicates") is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,129 @@
+import io
+import zipfile
+
+import pytest
+
+from office_loaders import detect_office_kind, iter_office_sections
+
+W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+A = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+P = 'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"'
+S = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+R = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+REL = 'xmlns="http://schemas.openxmlformats.org/package/2006/relationships"'
+
+
+def _zip(parts):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, xml in parts.items():
+            zf.writestr(name, xml)
+    return buf.getvalue()
+
+
+def _wp(text, style=None):
+    ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{ppr}<w:r><w:t>{text}</w:t></w:r></w:p>"
+
+
+def _docx():
+    cell = lambda t: f"<w:tc>{_wp(t)}</w:tc>"
+    body = (
+        _wp("Intro paragraph.")
+        + _wp("Pricing", "Heading1")
+        + _wp("Plans are billed monthly.")
+        + f"<w:tbl><w:tr>{cell('Plan')}{cell('Price')}</w:tr><w:tr>{cell('Pro')}{cell('$10')}</w:tr></w:tbl>"
+    )
+    return _zip({
+        "word/document.xml": f"<w:document {W}><w:body>{body}</w:body></w:document>",
+        "word/header1.xml": f"<w:hdr {W}>{_wp('ACME Confidential')}</w:hdr>",
+    })
+
+
+def _sp(text, ph=None):
+    nv = f'<p:nvSpPr><p:nvPr><p:ph type="{ph}"/></p:nvPr></p:nvSpPr>' if ph else ""
+    return f"<p:sp>{nv}<p:txBody><a:p><a:r><a:t>{text}</a:t></a:r></a:p></p:txBody></p:sp>"
+
+
+def _pptx(slides=11):
+    parts = {"ppt/presentation.xml": f"<p:presentation {P}/>"}
+    for n in range(1, slides + 1):
+        parts[f"ppt/slides/slide{n}.xml"] = (
+            f"<p:sld {P} {A}><p:cSld><p:spTree>{_sp(f'Title {n}')}{_sp('Body text')}</p:spTree></p:cSld></p:sld>"
+        )
+    parts["ppt/slides/_rels/slide2.xml.rels"] = (
+        f'<Relationships {REL}><Relationship Id="rId2" Target="../notesSlides/notesSlide1.xml"/></Relationships>'
+    )
+    parts["ppt/notesSlides/notesSlide1.xml"] = (
+        f"<p:notes {P} {A}><p:cSld><p:spTree>{_sp('Mention the discount')}{_sp('2', ph='sldNum')}"
+        f"</p:spTree></p:cSld></p:notes>"
+    )
+    return _zip(parts)
+
+
+def _xlsx():
+    return _zip({
+        "xl/workbook.xml": f'<workbook {S} {R}><sheets><sheet name="Sales" r:id="rId1"/></sheets></workbook>',
+        "xl/_rels/workbook.xml.rels": (
+            f'<Relationships {REL}><Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>'
+        ),
+        "xl/sharedStrings.xml": f"<sst {S}><si><t>Region</t></si><si><t>North</t></si></sst>",
+        "xl/worksheets/sheet1.xml": (
+            f'<worksheet {S}><sheetData>'
+            f'<row r="1"><c t="s"><v>0</v></c><c t="inlineStr"><is><t>Total</t></is></c></row>'
+            f'<row r="2"><c t="s"><v>1</v></c><c><v>42</v></c></row>'
+            f'</sheetData></worksheet>'
+        ),
+    })
+
+
+def test_detect_office_kind_by_content():
+    assert detect_office_kind(_docx()) == "docx"
+    assert detect_office_kind(_pptx(1)) == "pptx"
+    assert detect_office_kind(_xlsx()) == "xlsx"
+    assert detect_office_kind(_zip({"a.txt": "x"})) is None
+    assert detect_office_kind(b"%PDF-1.7") is None
+
+
+def test_docx_sections_cover_headings_tables_and_headers():
+    sections = [(s.label, s.part, s.text) for s in iter_office_sections(_docx())]
+    assert sections == [
+        ("Header", "header", "ACME Confidential"),
+        ("Document", "body", "Intro paragraph."),
+        ("Pricing", "body", "Pricing\nPlans are billed monthly."),
+        ("Pricing (table)", "table", "Plan | Price\nPro | $10"),
+    ]
+
+
+def test_pptx_slides_in_numeric_order_with_notes():
+    sections = list(iter_office_sections(_pptx()))
+    labels = [s.label for s in sections]
+    assert labels[:3] == ["Slide 1: Title 1", "Slide 2: Title 2", "Slide 2 notes"]
+    assert labels[-1] == "Slide 11: Title 11"
+    notes = sections[2]
+    assert notes.part == "notes" and notes.text == "Mention the discount"
+
+
+def test_xlsx_rows_with_shared_strings():
+    (section,) = iter_office_sections(_xlsx())
+    assert section.label == "Sales (rows 1+)" and section.part == "sheet"
+    assert section.text == "Region | Total\nNorth | 42"
+
+
+def test_xlsx_sections_are_labelled_with_their_first_row():
+    rows = "".join(f'<row r="{r}"><c><v>v{r}</v></c></row>' for r in range(5, 125))
+    data = _zip({
+        "xl/workbook.xml": f'<workbook {S} {R}><sheets><sheet name="S1" r:id="rId1"/></sheets></workbook>',
+        "xl/_rels/workbook.xml.rels": (
+            f'<Relationships {REL}><Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>'
+        ),
+        "xl/worksheets/sheet1.xml": f"<worksheet {S}><sheetData>{rows}</sheetData></worksheet>",
+    })
+    sections = list(iter_office_sections(data))
+    assert [s.label for s in sections] == ["S1 (rows 5+)", "S1 (rows 55+)", "S1 (rows 105+)"]
+    assert [s.text.split("\n")[0] for s in sections] == ["v5", "v55", "v105"]
+
+
+def test_rejects_non_office_data():
+    with pytest.raises(ValueError):
+        list(iter_office_sections(b"plain text"))
@@ -0,0 +1,59 @@
+from prompt_builder import ContextItem, PromptBuilder, TokenCounter, dedupe_items, encoding_for
+
+
+def test_build_respects_context_budget():
+    long_text = "The refund policy allows returns within thirty days. " * 200
+    builder = PromptBuilder(provider="groq", model="llama-3.1-8b-instant", max_output_tokens=256, context_budget=300)
+    built = builder.build(
+        "What is the refund policy?",
+        kb=[ContextItem(text=long_text, source="kb", title="Refunds", score=3.5)],
+        documents=[ContextItem(text=long_text.upper(), source="document")],
+    )
+    counter = TokenCounter("groq", "llama-3.1-8b-instant")
+    assert built.budget == 300
+    assert built.tokens <= 300 + counter.count("What is the refund policy?") + 40
+    assert "Refunds" in built.text
+
+
+def test_small_window_model_limits_budget():
+    builder = PromptBuilder(provider="huggingface", model="microsoft/DialoGPT-medium",
+                            max_output_tokens=512, context_budget=3000)
+    built = builder.build("hello", memory=[ContextItem(text="word " * 2000, source="memory")])
+    assert built.budget < 1024 - 512
+
+
+def test_token_counter_follows_provider_and_model():
+    assert encoding_for("groq", "llama-3.1-8b-instant") == "cl100k_base"
+    assert encoding_for("huggingface", "microsoft/DialoGPT-medium") == "gpt2"
+    assert encoding_for("gemini", "gemini-2.5-flash") is None
+    # No local Gemini tokenizer: estimated at ~4 characters per token
+    assert TokenCounter("gemini", "gemini-2.5-flash").count("abcd" * 25) == 25
+
+
+def test_dedupe_drops_contained_chunks():
+    passage = "invoices are due within thirty days of the billing date"
+    items = [
+        ContextItem(text="Reminder: " + passage + " unless agreed otherwise.", source="document"),
+        ContextItem(text=passage, source="memory"),
+        ContextItem(text="support is available on weekdays", source="kb"),
+    ]
+    kept, dupes = dedupe_items(items)
+    assert dupes == 1
+    assert [i.source for i in kept] == ["document", "kb"]
+
+
+def test_leftover_budget_flows_to_other_sections():
+    docs = [ContextItem(text=f"chunk {i} " + "detail " * 40, source="document") for i in range(10)]
+    builder = PromptBuilder(context_budget=1000)
+    built = builder.build("q", documents=docs, kb=[ContextItem(text="short kb note", source="kb", title="t")])
+    # The KB share is mostly unused, so more document chunks fit than the 40% share alone allows
+    assert built.sections["document"] > 2
+    assert built.sections["kb"] == 1
+
+
+def test_web_results_get_their_own_section():
+    web = [ContextItem(text="retrieval augmented generation", source="web", title="RAG",
+                       url="https://example.com/rag")]
+    built = PromptBuilder(context_budget=500).build("what is rag", web=web)
+    assert built.sections["web"] == 1
+    assert "Web Results" in built.text and "https://example.com/rag" in built.text
@@ -0,0 +1,60 @@
+import time
+
+from memory import MemoryManager
+from reranker import Candidate, CrossEncoderReranker, gather_candidates, group_by_source
+
+
+def _overlap_scorer(pairs):
+    """Stub cross-encoder: score = number of query words in the passage."""
+    return [sum(1 for w in q.lower().split() if w in p.lower()) for q, p in pairs]
+
+
+def test_rerank_orders_by_scorer():
+    cands = [
+        Candidate(text="unrelated text", source="kb"),
+        Candidate(text="reset the api key", source="document"),
+        Candidate(text="api key", source="memory"),
+    ]
+    rr = CrossEncoderReranker(score_fn=_overlap_scorer, batch_size=2)
+    ranked = rr.rerank("reset api key", cands, top_n=2)
+    assert [c.text for c in ranked] == ["reset the api key", "api key"]
+    assert rr.last_stats["reranked"] is True
+
+
+def test_rerank_falls_back_when_budget_exceeded():
+    def slow_scorer(pairs):
+        time.sleep(0.02)
+        return [1.0] * len(pairs)
+
+    cands = [Candidate(text=f"passage {i}", source="kb") for i in range(6)]
+    rr = CrossEncoderReranker(score_fn=slow_scorer, batch_size=1, budget_ms=1)
+    ranked = rr.rerank("query", cands, top_n=3)
+    assert [c.text for c in ranked] == ["passage 0", "passage 1", "passage 2"]
+    assert rr.last_stats["reason"] == "budget_exceeded"
+
+
+def test_gather_candidates_interleaves_sources():
+    mm = MemoryManager()
+    mm.insert_memory("we discussed invoices yesterday")
+    doc_data = {"text_content": ["invoice totals are due monthly", "nothing here"]}
+    cands = gather_candidates("invoice", memory_manager=mm, doc_data=doc_data, limit=10)
+    grouped = group_by_source(cands)
+    assert len(grouped["document"]) == 1
+    assert len(grouped["memory"]) == 1
+
+
+def test_gather_candidates_excludes_the_current_prompt():
+    mm = MemoryManager()
+    mm.insert_memory("invoice reminders go out on the 5th")
+    prompt = mm.insert_memory("when are invoice reminders sent?")
+    cands = gather_candidates("invoice", memory_manager=mm, limit=1, exclude_memory_ids=[prompt.id])
+    assert [c.text for c in cands] == ["invoice reminders go out on the 5th"]
+
+
+def test_gather_candidates_includes_web_results():
+    from web_retrieval import WebResult
+
+    web = [WebResult("Invoices 101", "https://example.com/inv", "how invoices work", 1)]
+    grouped = group_by_source(gather_candidates("invoice", web_results=web, limit=10))
+    assert [c.text for c in grouped["web"]] == ["how invoices work"]
+    assert grouped["web"][0].metadata["url"] == "https://example.com/inv"
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from ingest_cache import IngestionCache
+from web_retrieval import WebSearchClient, normalize_query, parse_serpapi
+
+PAYLOAD = {
+    "answer_box": {"title": "RAG", "link": "https://example.com/rag", "snippet": "Retrieval  augmented\ngeneration."},
+    "organic_results": [
+        {"title": "RAG explained", "link": "https://example.com/rag#intro", "snippet": "duplicate of the answer box"},
+        {"title": "Paper", "link": "https://arxiv.org/abs/2005.11401", "snippet": "Lewis et al."},
+        {"title": "No link", "snippet": "dropped"},
+        {"title": "Blog", "link": "https://blog.example.org/rag/", "snippet": ""},
+    ],
+}
+
+
+@pytest.fixture
+def stub_server():
+    """Local SerpAPI stand-in that records queries and answers slowly"""
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = parse_qs(urlsplit(self.path).query)
+            calls.append(params["q"][0])
+            time.sleep(0.2)
+            if params["q"][0] == "boom":
+                self.send_response(500)
+                self.end_headers()
+                return
+            body = json.dumps(PAYLOAD).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/search.json", calls
+    server.shutdown()
+
+
+def _client(endpoint, tmp_path, **kwargs):
+    return WebSearchClient("test-key", endpoint=endpoint, timeout_s=5,
+                           cache=IngestionCache(str(tmp_path / "web")), **kwargs)
+
+
+def test_parse_serpapi_normalizes_results():
+    results = parse_serpapi(PAYLOAD, limit=5)
+    assert [r.url for r in results] == [
+        "https://example.com/rag", "https://arxiv.org/abs/2005.11401", "https://blog.example.org/rag/",
+    ]
+    assert results[0].snippet == "Retrieval augmented generation."
+    assert [r.position for r in results] == [1, 2, 3]
+    assert len(parse_serpapi(PAYLOAD, limit=1)) == 1
+    assert normalize_query("  What  is\tRAG? ") == "what is rag?"
+
+
+def test_search_caches_by_normalized_query(stub_server, tmp_path):
+    endpoint, calls = stub_server
+    client = _client(endpoint, tmp_path)
+    first = client.search("What is RAG?")
+    second = client.search("  what is   rag? ")
+    assert calls == ["what is rag?"]
+    assert [r.to_dict() for r in first] == [r.to_dict() for r in second]
+    assert client.get_stats()["cache_hits"] == 1
+
+    # Expired entries are fetched again
+    client.ttl_s = 0
+    time.sleep(0.01)
+    client.search("what is rag?")
+    assert len(calls) == 2
+
+
+def test_concurrent_identical_queries_share_one_request(stub_server, tmp_path):
+    endpoint, calls = stub_server
+    client = _client(endpoint, tmp_path)
+
+    async def many():
+        return await asyncio.gather(*(client.asearch(q) for q in ["rag", "RAG", " rag "]))
+
+    results = asyncio.run(many())
+    assert calls == ["rag"]
+    assert all(len(r) == 3 for r in results)
+    assert client.get_stats()["coalesced"] == 2
+
+    # Coalescing also works across threads, each with its own event loop
+    client = _client(endpoint, tmp_path / "other")
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(client.search("threads"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls.count("threads") == 1 and len(out) == 4
+
+
+def test_errors_return_empty_and_are_not_cached(stub_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # failures are logged under ./logs
+    endpoint, calls = stub_server
+    client = _client(endpoint, tmp_path)
+    assert client.search("boom") == []
+    assert client.search("boom") == []
+    assert calls == ["boom", "boom"]
+    assert client.get_stats()["errors"] == 2
+    assert WebSearchClient(None, endpoint=endpoint).search("rag") == []
+
+
+def test_background_search_overlaps_caller_and_respects_budget(stub_server, tmp_path):
+    endpoint, calls = stub_server
+    client = _client(endpoint, tmp_path)
+
+    t0 = time.perf_counter()
+    pending = client.start_search("overlap")
+    time.sleep(0.2)  # local retrieval running meanwhile
+    results = client.collect(pending, budget_s=2)
+    assert len(results) == 3
+    assert time.perf_counter() - t0 < 0.35  # not 0.2 s of work + 0.2 s of search
+
+    # Over budget: no results this turn, but the fetch finishes and fills the cache
+    slow = client.start_search("late")
+    assert client.collect(slow, budget_s=0.01) == []
+    slow.result(timeout=5)
+    assert len(client.search("late")) == 3 and calls.count("late") == 1
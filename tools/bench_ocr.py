@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark OCR page preparation: PNG round-trip vs direct grayscale render.
+
+Usage:
+    python tools/bench_ocr.py [scanned.pdf] [--pages 20] [--tesseract]
+
+"before" is the old path: render RGB at 150 DPI, encode PNG, decode it with
+PIL and convert to RGB. "after" is `render_page_for_ocr`: adaptive DPI,
+grayscale render wrapped as an image without encoding. With --tesseract the
+image is also recognized, so the numbers include OCR itself. Without a PDF
+argument a synthetic scanned PDF (text rendered to images) is generated.
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from document_loaders import render_page_for_ocr
+
+
+def synthetic_scan(pages: int) -> bytes:
+    """A PDF whose pages are images of text, like a scanner produces"""
+    text = fitz.open()
+    for n in range(pages):
+        page = text.new_page()
+        body = "\n".join(f"Line {i} of page {n + 1}: the quick brown fox jumps over the lazy dog."
+                         for i in range(40))
+        page.insert_textbox(fitz.Rect(54, 54, 558, 738), body, fontsize=10)
+    scan = fitz.open()
+    for page in text:
+        pix = page.get_pixmap(dpi=200)
+        out = scan.new_page(width=page.rect.width, height=page.rect.height)
+        out.insert_image(out.rect, pixmap=pix)
+    return scan.tobytes()
+
+
+def before(page):
+    png = page.get_pixmap(dpi=150).tobytes(output="png")
+    return Image.open(io.BytesIO(png)).convert("RGB")
+
+
+def after(page):
+    return render_page_for_ocr(page)
+
+
+def run(name, prepare, doc, recognize):
+    t0 = time.perf_counter()
+    pixels = 0
+    for page in doc:
+        image = prepare(page)
+        pixels += image.width * image.height
+        if recognize:
+            recognize(image)
+    elapsed = time.perf_counter() - t0
+    pages = doc.page_count
+    print(f"{name:7s} {pages / elapsed:8.2f} pages/s  ({elapsed:.2f}s, {pixels / pages / 1e6:.2f} MP/page)")
+    return pages / elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", nargs="?", help="PDF to benchmark (default: synthetic scan)")
+    parser.add_argument("--pages", type=int, default=20, help="pages in the synthetic scan")
+    parser.add_argument("--tesseract", action="store_true", help="include pytesseract recognition")
+    args = parser.parse_args()
+
+    data = Path(args.pdf).read_bytes() if args.pdf else synthetic_scan(args.pages)
+    recognize = None
+    if args.tesseract:
+        import pytesseract
+        recognize = pytesseract.image_to_string
+
+    doc = fitz.open(stream=data, filetype="pdf")
+    old = run("before", before, doc, recognize)
+    new = run("after", after, doc, recognize)
+    print(f"speedup {new / old:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""web_retrieval.py
+Web search retrieval for A.K.A.S.H.A.
+
+Queries go to SerpAPI over an async HTTP client (httpx when installed,
+otherwise urllib on the default executor) and come back as structured
+`WebResult`s (title, URL, snippet) that compete with KB, memory and
+document hits in the reranking and prompt-packing stages.
+
+Results are cached on disk for a TTL, keyed by the normalized query
+("  What is RAG? " and "what is rag?" share an entry), so repeated questions
+cost no API call across sessions and restarts. Identical queries that are
+in flight at the same time, from any session or thread, share one request.
+Failures are logged and return no results; they are never cached.
+
+`start_search` runs a query on a shared background event loop and returns a
+future at once, so the fetch overlaps local (KB, memory, document)
+retrieval; `collect` then waits for it within a latency budget.
+"""
+from __future__ import annotations
+from typing import List, Dict, Any, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, asdict
+from urllib.parse import urlencode, urlsplit, urlunsplit
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+
+from ingest_cache import IngestionCache
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except Exception:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+SERPAPI_ENDPOINT = "https://serpapi.com/search.json"
+WEB_CACHE_DIR = "cache/web"
+# Snippets longer than this are cut; search snippets are rarely longer
+MAX_SNIPPET_CHARS = 500
+
+_SPACE_RE = re.compile(r"\s+")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop running on a daemon thread, shared by background searches"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="web-search", daemon=True).start()
+        return _loop
+
+
+class WebSearchError(Exception):
+    """The search API returned an error instead of results"""
+    pass
+
+
+@dataclass
+class WebResult:
+    """One normalized web search hit"""
+    title: str
+    url: str
+    snippet: str
+    position: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share a cache entry"""
+    return _SPACE_RE.sub(" ", query or "").strip().casefold()
+
+
+def _clean(text: Any) -> str:
+    return _SPACE_RE.sub(" ", str(text or "")).strip()
+
+
+def _canonical_url(url: str) -> str:
+    """URL without fragment or trailing slash, with a lowercase scheme and host (for deduplication)"""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+
+def parse_serpapi(payload: Dict[str, Any], limit: int = 5) -> List[WebResult]:
+    """Normalize a SerpAPI JSON response into ranked `WebResult`s.
+
+    The answer box (if any) comes first, then organic results; entries
+    without a URL or any text are dropped and duplicate URLs are merged.
+    """
+    if payload.get("error"):
+        raise WebSearchError(payload["error"])
+    raw = []
+    box = payload.get("answer_box") or {}
+    if box.get("link") and (box.get("snippet") or box.get("answer")):
+        raw.append({'title': box.get("title"), 'link': box["link"],
+                    'snippet': box.get("snippet") or box.get("answer")})
+    raw.extend(payload.get("organic_results") or [])
+
+    results: List[WebResult] = []
+    seen = set()
+    for item in raw:
+        url = _clean(item.get("link"))
+        title = _clean(item.get("title"))
+        snippet = _clean(item.get("snippet"))[:MAX_SNIPPET_CHARS]
+        key = _canonical_url(url)
+        if not url or not (title or snippet) or key in seen:
+            continue
+        seen.add(key)
+        results.append(WebResult(title=title or url, url=url, snippet=snippet, position=len(results) + 1))
+        if len(results) >= limit:
+            break
+    return results
+
+
+class WebSearchClient:
+    """Async SerpAPI client with a TTL disk cache and request coalescing"""
+
+    def __init__(self, api_key: Optional[str], endpoint: str = SERPAPI_ENDPOINT, num_results: int = 5,
+                 ttl_s: float = 6 * 3600, timeout_s: float = 8.0, cache: Optional[IngestionCache] = None):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.num_results = num_results
+        self.ttl_s = ttl_s
+        self.timeout_s = timeout_s
+        self.cache = cache
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _key(self, normalized: str, num: int) -> str:
+        extra = json.dumps({'endpoint': self.endpoint, 'num': num}, sort_keys=True)
+        return hashlib.sha256(f"{normalized}:{extra}".encode('utf-8')).hexdigest()
+
+    def _cached(self, key: str) -> Optional[List[WebResult]]:
+        if self.cache is None:
+            return None
+        entry = self.cache.get(key)
+        if not entry or time.time() - entry.get('fetched_at', 0) > self.ttl_s:
+            return None
+        with self._lock:
+            self.hits += 1
+        return [WebResult(**r) for r in entry.get('results', [])]
+
+    async def asearch(self, query: str, num: Optional[int] = None) -> List[WebResult]:
+        """Search the web; returns [] when unavailable or on any error"""
+        normalized = normalize_query(query)
+        if not normalized or not self.available:
+            return []
+        num = num or self.num_results
+        key = self._key(normalized, num)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            shared = self._inflight.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return list(await asyncio.wrap_future(shared))
+
+        results: List[WebResult] = []
+        try:
+            with self._lock:
+                self.requests += 1
+            results = parse_serpapi(await self._fetch(normalized, num), limit=num)
+            if self.cache is not None:
+                self.cache.put(key, {'fetched_at': time.time(), 'query': normalized,
+                                     'results': [r.to_dict() for r in results]})
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            try:
+                from logger import logger
+                logger.warning("Web search failed", query=normalized, error=str(e))
+            except Exception:
+                pass
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            shared.set_result(results)
+        return list(results)
+
+    def search(self, query: str, num: Optional[int] = None) -> List[WebResult]:
+        """Blocking wrapper around `asearch` for synchronous callers"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.asearch(query, num))
+        # Already inside an event loop: run on a helper thread with its own loop
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, self.asearch(query, num)).result()
+
+    def start_search(self, query: str, num: Optional[int] = None) -> Future:
+        """Start `asearch` on the background loop; returns a future of the results"""
+        return asyncio.run_coroutine_threadsafe(self.asearch(query, num), _background_loop())
+
+    @staticmethod
+    def collect(pending: Optional[Future], budget_s: Optional[float] = None) -> List[WebResult]:
+        """Results of `start_search`, or [] if they are not ready within `budget_s`.
+
+        A search that misses the budget keeps running and still fills the
+        cache, so a repeated question gets its web results.
+        """
+        if pending is None:
+            return []
+        try:
+            return pending.result(timeout=budget_s)
+        except FutureTimeout:
+            return []
+
+    async def _fetch(self, query: str, num: int) -> Dict[str, Any]:
+        params = {'engine': 'google', 'q': query, 'num': num, 'api_key': self.api_key}
+        if HTTPX_AVAILABLE:
+            async with httpx.AsyncClient(timeout=self.timeout_s) as client:
+                resp = await client.get(self.endpoint, params=params)
+                resp.raise_for_status()
+                return resp.json()
+        url = f"{self.endpoint}?{urlencode(params)}"
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._fetch_blocking, url)
+
+    def _fetch_blocking(self, url: str) -> Dict[str, Any]:
+        with urllib.request.urlopen(url, timeout=self.timeout_s) as resp:
+            return json.loads(resp.read().decode('utf-8'))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'available': self.available,
+            'requests': self.requests,
+            'cache_hits': self.hits,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+        }
+
+
+_web_search: Optional[WebSearchClient] = None
+
+
+def get_web_search() -> WebSearchClient:
+    """Get or create the web search client singleton"""
+    global _web_search
+    if _web_search is None:
+        from config import CONFIG
+        _web_search = WebSearchClient(
+            api_key=os.getenv("SERPAPI_API_KEY"),
+            num_results=CONFIG.web_search_results,
+            ttl_s=CONFIG.web_search_ttl_hours * 3600,
+            timeout_s=CONFIG.web_search_timeout_s,
+            cache=IngestionCache(WEB_CACHE_DIR, max_bytes=CONFIG.max_cache_size_mb * 1024 * 1024),
+        )
+    return _web_search
+
+
+__all__ = [
+    "WebResult",
+    "WebSearchClient",
+    "WebSearchError",
+    "get_web_search",
+    "normalize_query",
+    "parse_serpapi",
+]